@@ -0,0 +1,113 @@
+"""
+Logging overhead per request on /auth_api/v1/me.
+
+Compares the request with logging switched off against
+ - the old setup: DEBUG, text records written synchronously to the console and a rotating file,
+ - the queue pipeline from core.logger: INFO, JSON lines written by the listener thread, sampling.
+The endpoint logs like a service call: one info and several debug lines. Console output goes to /dev/null.
+Usage: python benchmarks/bench_logging.py [requests]
+"""
+import asyncio
+import logging
+import logging.config
+import os
+import sys
+import tempfile
+import time
+
+current = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(os.path.dirname(current), 'src'))
+
+os.environ.setdefault('PG_DB_NAME', 'bench')
+os.environ.setdefault('PG_DB_USER', 'bench')
+os.environ.setdefault('PG_DB_PASSWORD', 'bench')
+os.environ.setdefault('LOG_FILE', '')
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
+
+from core import logger
+from core.config import PREFIX
+from models.limit import RateLimitResult
+from utils import middleware
+
+ALLOWED = RateLimitResult(allowed=True, limit=20, remaining=19, reset=3)
+USER_ID = '00000000-0000-0000-0000-000000000000'
+log = logging.getLogger('bench')
+
+
+async def _check_limit_stub(request: Request) -> RateLimitResult:
+    return ALLOWED
+
+
+async def _me() -> dict:
+    log.debug('CRUD Get User: id=%s', USER_ID)
+    log.debug('user.login=%r, user.uuid=%r, user.is_active=%r', 'bench', USER_ID, True)
+    log.debug('CRUD Get Role by User id: user_id=%s', USER_ID)
+    log.debug('Generate new tokens')
+    log.info('User data requested: %s', USER_ID)
+    return {'uuid': USER_ID, 'login': 'bench'}
+
+
+def build_app() -> FastAPI:
+    middleware.check_limit = _check_limit_stub
+    app = FastAPI(default_response_class=ORJSONResponse)
+    app.get(f'{PREFIX}/v1/me')(_me)
+    app.add_middleware(middleware.RateLimitMiddleware)
+    app.add_middleware(middleware.RequestIdMiddleware)
+    return app
+
+
+def sync_logging(path: str) -> dict:
+    """Configuration before the queue pipeline"""
+    return {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'filters': {'request_id': {'()': logger.RequestIdFilter}},
+        'formatters': {'verbose': {'format': logger.LOG_FORMAT}},
+        'handlers': {
+            'console': {'class': 'logging.StreamHandler', 'formatter': 'verbose', 'filters': ['request_id'],
+                        'stream': 'ext://sys.stdout'},
+            'file': {'class': 'logging.handlers.RotatingFileHandler', 'formatter': 'verbose',
+                     'filters': ['request_id'], 'filename': path, 'maxBytes': 102400, 'backupCount': 30},
+        },
+        'root': {'level': 'DEBUG', 'handlers': ['console', 'file']},
+    }
+
+
+async def measure(app: FastAPI, requests: int) -> float:
+    """Seconds per request"""
+    async with httpx.AsyncClient(app=app, base_url='http://bench') as client:
+        for _ in range(100):  # прогрев
+            await client.get(f'{PREFIX}/v1/me')
+        started = time.perf_counter()
+        for _ in range(requests):
+            await client.get(f'{PREFIX}/v1/me')
+        return (time.perf_counter() - started) / requests
+
+
+async def main(requests: int) -> None:
+    app = build_app()
+    sys.stdout, stdout = open(os.devnull, 'w'), sys.stdout
+    with tempfile.TemporaryDirectory() as tmp:
+        logging.disable(logging.CRITICAL)
+        baseline = await measure(app, requests)
+        logging.disable(logging.NOTSET)
+
+        logging.config.dictConfig(sync_logging(os.path.join(tmp, 'logconfig.log')))
+        sync = await measure(app, requests)
+
+        logging.config.dictConfig(logger.LOGGING)
+        queued = await measure(app, requests)
+        logger.stop_log_listener()
+    sys.stdout = stdout
+
+    print(f'no logging:         {baseline * 1e6:8.1f} us/request')
+    print(f'sync DEBUG to file: {sync * 1e6:8.1f} us/request, logging {(sync - baseline) * 1e6:8.1f} us')
+    print(f'queue JSON INFO:    {queued * 1e6:8.1f} us/request, logging {(queued - baseline) * 1e6:8.1f} us')
+    print(f'dropped records: {logger.QueueLogHandler.dropped}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
@@ -0,0 +1,140 @@
+"""
+Database round trips and latency of AuthService.login and refresh_tokens.
+
+Needs the user database from .env (PG_DB_*); Redis is replaced with an in-memory token db.
+Every login after the first one closes the previous session of the same user agent,
+so the measured path is the hot one: SELECT user, SELECT session, SELECT roles, UPDATE, INSERT, COMMIT.
+Usage: python benchmarks/bench_login_round_trips.py [logins]
+"""
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import Optional
+
+current = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(os.path.dirname(current), 'src'))
+
+# дешевый bcrypt, чтобы в замер попадала работа с БД, а не хеширование
+os.environ.setdefault('HASH_BCRYPT_ROUNDS', '4')
+# Redis в замере не поднимается, роли читаются из БД
+os.environ.setdefault('ROLE_CACHE_ENABLED', 'false')
+
+from pydantic import SecretStr
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from db.session import async_session, init_engine, close_engine
+from db.token import TokenDBBase
+from services.auth import AuthService
+from utils.password_hasher import hash_policy
+from utils.token_manager import TokenManager
+
+PASSWORD = 'bench-password'
+USER_AGENT = 'bench-agent'
+
+
+class MemoryTokenDB(TokenDBBase):
+    def __init__(self) -> None:
+        self.revoked = set()
+
+    async def put(self, token: str, expire_in_sec: int) -> None:
+        self.revoked.add(token)
+
+    async def is_exist(self, token: str) -> bool:
+        return token in self.revoked
+
+    async def revoke_user_before(self, user_id: str, issued_before: datetime, expire_in_sec: int) -> None:
+        pass
+
+    async def get_user_revoked_before(self, user_id: str) -> Optional[int]:
+        return None
+
+
+class RoundTrips:
+    """BEGIN, statements and COMMIT sent by the engine"""
+
+    def __init__(self, engine: AsyncEngine) -> None:
+        self.begins = self.statements = self.commits = 0
+        event.listen(engine.sync_engine, 'begin', self._on_begin)
+        event.listen(engine.sync_engine, 'before_cursor_execute', self._on_statement)
+        event.listen(engine.sync_engine, 'commit', self._on_commit)
+
+    def _on_begin(self, conn) -> None:
+        self.begins += 1
+
+    def _on_statement(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.statements += 1
+
+    def _on_commit(self, conn) -> None:
+        self.commits += 1
+
+    def reset(self) -> None:
+        self.begins = self.statements = self.commits = 0
+
+    @property
+    def total(self) -> int:
+        return self.begins + self.statements + self.commits
+
+
+async def create_user(login: str) -> None:
+    async with async_session() as session:
+        await session.execute(
+            text('INSERT INTO users (uuid, name, surname, login, email, is_active, password) '
+                 'VALUES (:uuid, :login, :login, :login, :email, true, :password)'),
+            {'uuid': uuid.uuid4(), 'login': login, 'email': f'{login}@bench.local',
+             'password': hash_policy.hash(PASSWORD)},
+        )
+        await session.commit()
+
+
+async def delete_user(login: str) -> None:
+    async with async_session() as session:
+        await session.execute(text('DELETE FROM users WHERE login = :login'), {'login': login})
+        await session.commit()
+
+
+async def measure(name: str, round_trips: RoundTrips, calls: int, call) -> None:
+    await call()  # прогрев и подготовка запросов asyncpg
+    round_trips.reset()
+    started = time.perf_counter()
+    for _ in range(calls):
+        await call()
+    elapsed = time.perf_counter() - started
+    print(f'{name:8} {round_trips.begins / calls:5.1f} begin {round_trips.statements / calls:5.1f} statements '
+          f'{round_trips.commits / calls:5.1f} commit = {round_trips.total / calls:5.1f} round trips, '
+          f'{elapsed / calls * 1000:7.2f} ms')
+
+
+async def main(calls: int) -> None:
+    engine = init_engine()
+    login = f'bench_{uuid.uuid4().hex[:8]}'
+    await create_user(login)
+    round_trips = RoundTrips(engine)
+    token_db = MemoryTokenDB()
+    refresh_token = None
+
+    async def login_call() -> None:
+        nonlocal refresh_token
+        async with async_session() as session:
+            service = AuthService(token_db, TokenManager(token_db), session)
+            _, refresh_token = await service.login(login, SecretStr(PASSWORD), USER_AGENT)
+
+    async def refresh_call() -> None:
+        nonlocal refresh_token
+        async with async_session() as session:
+            service = AuthService(token_db, TokenManager(token_db), session)
+            _, refresh_token = await service.refresh_tokens(refresh_token, USER_AGENT)
+
+    try:
+        await measure('login', round_trips, calls, login_call)
+        await measure('refresh', round_trips, calls, refresh_call)
+    finally:
+        await delete_user(login)
+        await close_engine()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
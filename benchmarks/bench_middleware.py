@@ -0,0 +1,86 @@
+"""
+Requests/sec on /auth_api/v1/me: @app.middleware('http') (BaseHTTPMiddleware) vs pure ASGI middleware.
+
+Rate limiting is stubbed out so that only the middleware overhead is measured.
+Usage: python benchmarks/bench_middleware.py [requests]
+"""
+import asyncio
+import os
+import sys
+import time
+
+current = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(os.path.dirname(current), 'src'))
+
+os.environ.setdefault('PG_DB_NAME', 'bench')
+os.environ.setdefault('PG_DB_USER', 'bench')
+os.environ.setdefault('PG_DB_PASSWORD', 'bench')
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
+
+from core.config import PREFIX
+from models.limit import RateLimitResult
+from utils import middleware
+
+ALLOWED = RateLimitResult(allowed=True, limit=20, remaining=19, reset=3)
+
+
+async def _check_limit_stub(request: Request) -> RateLimitResult:
+    return ALLOWED
+
+
+async def _me() -> dict:
+    return {'uuid': '00000000-0000-0000-0000-000000000000', 'login': 'bench'}
+
+
+def build_base_http_app() -> FastAPI:
+    app = FastAPI(default_response_class=ORJSONResponse)
+    app.get(f'{PREFIX}/v1/me')(_me)
+
+    @app.middleware('http')
+    async def check_limit(request: Request, call_next):
+        result = await _check_limit_stub(request)
+        response = await call_next(request)
+        response.headers.update(result.headers())
+        return response
+
+    @app.middleware('http')
+    async def add_request_id(request: Request, call_next):
+        response = await call_next(request)
+        response.headers['X-Request-Id'] = request.headers.get('X-Request-Id', '-')
+        return response
+
+    return app
+
+
+def build_asgi_app() -> FastAPI:
+    middleware.check_limit = _check_limit_stub
+    app = FastAPI(default_response_class=ORJSONResponse)
+    app.get(f'{PREFIX}/v1/me')(_me)
+    app.add_middleware(middleware.ScopedSessionMiddleware, secret_key='bench')
+    app.add_middleware(middleware.RateLimitMiddleware)
+    app.add_middleware(middleware.RequestIdMiddleware)
+    return app
+
+
+async def measure(app: FastAPI, requests: int) -> float:
+    async with httpx.AsyncClient(app=app, base_url='http://bench') as client:
+        for _ in range(100):  # прогрев
+            await client.get(f'{PREFIX}/v1/me')
+        started = time.perf_counter()
+        for _ in range(requests):
+            await client.get(f'{PREFIX}/v1/me')
+        return requests / (time.perf_counter() - started)
+
+
+async def main(requests: int) -> None:
+    before = await measure(build_base_http_app(), requests)
+    after = await measure(build_asgi_app(), requests)
+    print(f'BaseHTTPMiddleware: {before:10.0f} req/s')
+    print(f'pure ASGI:          {after:10.0f} req/s ({after / before:.2f}x)')
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
@@ -1,8 +1,50 @@
+import glob
 import os
-from core.logger import LOGGING
+
+# метрики воркеров пишутся в файлы каталога и суммируются при отдаче /metrics;
+# переменная должна быть выставлена до первого импорта prometheus_client
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus')
+
+from core.logger import LOGGING  # noqa: E402
 
 bind = '0.0.0.0:8081'
 reload = True
 worker_class = 'uvicorn.workers.UvicornWorker'
-loglevel = os.getenv('LOG_LEVEL', 'DEBUG')
+loglevel = os.getenv('LOG_LEVEL', 'INFO')
 logconfig_dict = LOGGING
+
+
+def on_starting(server):
+    """Reset worker metrics left by the previous run, calibrate password hashing once in the master"""
+    multiproc_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(multiproc_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(multiproc_dir, '*.db')):
+        os.remove(path)
+    _calibrate_hashing()
+
+
+def _calibrate_hashing():
+    """
+    All workers share the cost calibrated in the master.
+    Настройки и hash_policy уже импортированы в мастере и достаются воркерам при fork,
+    поэтому меняется сам объект настроек: переменные окружения прочитаны раньше.
+    """
+    from core.config import hash_settings
+    from utils.password_hasher import hash_policy, Argon2Hasher
+
+    if not hash_settings.calibrate:
+        return
+    hash_policy.calibrate(hash_settings.target_ms)
+    if isinstance(hash_policy.current, Argon2Hasher):
+        hash_settings.argon2_time_cost = hash_policy.current.time_cost
+    else:
+        hash_settings.bcrypt_rounds = hash_policy.current.rounds
+    # воркеры не калибруют повторно (core.container)
+    hash_settings.calibrate = False
+
+
+def child_exit(server, worker):
+    """Drop live gauges of the exited worker, its counters and histograms stay in the totals"""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
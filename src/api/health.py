@@ -0,0 +1,57 @@
+import asyncio
+import logging.config
+
+from fastapi import APIRouter, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import text
+
+from core.logger import LOGGING
+from db.redis_pool import get_redis
+from db.session import async_session
+
+logging.config.dictConfig(LOGGING)
+log = logging.getLogger(__name__)
+
+CHECK_TIMEOUT = 2  # sec
+
+router = APIRouter()
+
+
+@router.get('/healthz',
+            summary="Liveness probe",
+            description="Answers without touching any dependency",
+            include_in_schema=False,
+            )
+async def healthz() -> ORJSONResponse:
+    return ORJSONResponse({'status': 'ok'})
+
+
+async def _check_postgres() -> None:
+    async with async_session() as session:
+        await session.execute(text('SELECT 1'))
+
+
+async def _check_redis() -> None:
+    await get_redis().ping()
+
+
+@router.get('/readyz',
+            summary="Readiness probe",
+            description="Checks Postgres and Redis pools",
+            include_in_schema=False,
+            )
+async def readyz() -> ORJSONResponse:
+    checks = {'postgres': _check_postgres, 'redis': _check_redis}
+    results = {}
+    for name, check in checks.items():
+        try:
+            await asyncio.wait_for(check(), timeout=CHECK_TIMEOUT)
+            results[name] = 'ok'
+        except Exception as err:
+            log.warning('Readiness check %s failed: %r', name, err)
+            results[name] = 'fail'
+    ready = all(result == 'ok' for result in results.values())
+    return ORJSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={'status': 'ok' if ready else 'fail', 'checks': results},
+    )
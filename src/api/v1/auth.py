@@ -6,10 +6,11 @@ from fastapi import APIRouter, Depends, Header, Response, Cookie, Query
 from core.logger import LOGGING
 from core.config import token_settings
 from .models import UserCreateRequest, ChangeUserPwdRequest, ChangeUserDataRequest, UserResponse, LoginRequest, \
-    EntryResponse
+    EntryResponse, EntryPageResponse
 from models.user import UserCreate, ChangeUserData, ChangeUserPwd
 from utils.token_manager import verify_access_token, verify_refresh_token
-from services.auth import AuthServiceBase, get_auth_service
+from core.container import get_auth_service
+from services.auth import AuthServiceBase
 
 
 logging.config.dictConfig(LOGGING)
@@ -43,15 +44,12 @@ async def login(user: LoginRequest,
                 auth_service: AuthServiceBase = Depends(get_auth_service),
                 user_agent: str = Header(include_in_schema=False),
                 ) -> str:
-    log_msg = f'Login: {user}, {response=}, {auth_service}, {user_agent=}'
-    log.debug(log_msg)
+    log.debug('Login: %s, user_agent=%s', user.login, user_agent)
     access_token, refresh_token = await auth_service.login(login=user.login,
                                                            pwd=user.password,
                                                            user_agent=user_agent,
                                                            )
-    log_msg = f'{access_token=}, {refresh_token=}'
-    log.debug(log_msg)
-    log.info('Set refresh token cookie')
+    log.debug('Set refresh token cookie')
     response.set_cookie(key=token_settings.refresh_token_cookie_name,
                         value=refresh_token,
                         httponly=True,
@@ -71,8 +69,7 @@ async def refresh(response: Response,
                   refresh_token: str = Depends(verify_refresh_token),
                   user_agent: str = Header(include_in_schema=False),
                   ) -> str:
-    log_msg = f'Refresh: {refresh_token}'
-    log.debug(log_msg)
+    log.debug('Refresh tokens: user_agent=%s', user_agent)
     new_access_token, new_refresh_token = await auth_service.refresh_tokens(refresh_token=refresh_token,
                                                                             user_agent=user_agent)
     log.debug('Set refresh token cookie')
@@ -93,27 +90,29 @@ async def refresh(response: Response,
 async def user_data(token: str = Depends(verify_access_token),
                     auth_service: AuthServiceBase = Depends(get_auth_service),
                     ) -> UserResponse:
-    log.info(f'<<<V1.auth.router.get/me>>>')
+    log.debug('<<<V1.auth.router.get/me>>>')
     user_data = await auth_service.user_data(token)
-    log_msg = f'{user_data=}, {token=}, {auth_service=}'
-    log.debug(log_msg)
+    log.debug('user_data=%r', user_data)
     return UserResponse.from_orm(user_data)
 
 
 @router.get('/entries',
-            response_model=List[EntryResponse],
+            response_model=EntryPageResponse,
             summary="Get request for user entries history",
-            description="Gives user entries by access token",
-            response_description="User entries",
+            description="Gives user entries by access token, newest first. "
+                        "Pass next_cursor from the previous page to get the next one",
+            response_description="User entries and cursor of the next page",
             )
 async def user_entries(unique: bool = True,
                        token: str = Depends(verify_access_token),
                        auth_service: AuthServiceBase = Depends(get_auth_service),
-                       page_size: Annotated[int, Query(description="Pagination page size", ge=1)] = 10,
-                       page_number: Annotated[int, Query(description="Pagination page number", ge=1)] = 1,
-                       ) -> List[EntryResponse]:
-    user_entries = await auth_service.entry_history(token, unique, page_size, page_number)
-    return [EntryResponse.from_orm(entry) for entry in user_entries]
+                       page_size: Annotated[int, Query(description="Pagination page size", ge=1, le=100)] = 10,
+                       cursor: Annotated[str, Query(description="Opaque cursor of the next page")] = None,
+                       ) -> EntryPageResponse:
+    user_entries, next_cursor = await auth_service.entry_history(token, unique, page_size, cursor)
+    return EntryPageResponse(items=[EntryResponse.from_orm(entry) for entry in user_entries],
+                             next_cursor=next_cursor,
+                             )
 
 
 @router.get('/role',
@@ -170,8 +169,7 @@ async def change_pwd(changed_pwd_data: ChangeUserPwdRequest,
                      refresh_token: Annotated[str, Cookie(include_in_schema=False)] = None,
                      auth_service: AuthServiceBase = Depends(get_auth_service),
                      ) -> None:
-    log_msg = f'Cahnge pwd: {changed_pwd_data}'
-    log.debug(log_msg)
+    log.debug('Change password')
     await auth_service.update_user_password(access_token,
                                             refresh_token,
                                             ChangeUserPwd(**changed_pwd_data.dict(exclude={'new_password_repeat'})),
@@ -190,8 +188,7 @@ async def change_user_data(changed_user_data: ChangeUserDataRequest,
                            token: str = Depends(verify_access_token),
                            auth_service: AuthServiceBase = Depends(get_auth_service),
                            ) -> UserResponse:
-    log_msg = f'Change user data: {changed_user_data}'
-    log.debug(log_msg)
+    log.debug('Change user data: %s', changed_user_data)
     updated_user = await auth_service.update_user_data(token, ChangeUserData(**changed_user_data.dict()))
     return UserResponse.from_orm(updated_user)
 
@@ -205,8 +202,7 @@ async def deactivate_user(response: Response,
                           token: str = Depends(verify_access_token),
                           auth_service: AuthServiceBase = Depends(get_auth_service),
                           ) -> None:
-    log_msg = f'Deactivate user: {deactivate_user}'
-    log.debug(log_msg)
+    log.debug('Deactivate user')
     await auth_service.deactivate_user(token)
     log.debug('Delete refresh cookie')
     response.delete_cookie(token_settings.refresh_token_cookie_name)
@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import List, Optional
 import uuid
 
 from pydantic import BaseModel, Field, EmailStr, validator, root_validator, SecretStr
@@ -47,7 +48,6 @@ class ChangeUserPwdRequest(BaseModel):
 
     @root_validator
     def password_match(cls, values):
-        print(values)
         if values['old_password'] == values['new_password']:
             raise ValueError('The new password must not match the old one')
         if values['new_password'] != values['new_password_repeat']:
@@ -105,5 +105,10 @@ class EntryResponse(BaseModel):
         orm_mode = True
 
 
+class EntryPageResponse(BaseModel):
+    items: List[EntryResponse]
+    next_cursor: Optional[str] = None
+
+
 class ResponseRole(UUIDMixIn):
     name: str = Field()
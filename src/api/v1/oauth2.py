@@ -11,7 +11,8 @@ from core.config import token_settings, oauth2_settings
 from core.logger import LOGGING
 from models.user import UserCreate
 from utils.oauth_client import oauth
-from services.auth import AuthServiceBase, get_auth_service
+from core.container import get_auth_service
+from services.auth import AuthServiceBase
 
 router = APIRouter(prefix='/oauth2')
 logging.config.dictConfig(LOGGING)
@@ -51,9 +52,7 @@ async def oauth2(request: Request, response: Response, auth_service: AuthService
     password = SecretStr(login + PASSWORD_SECRET_KEY)
 
     access_token, refresh_token = await auth_service.login(login=login, pwd=password, user_agent="oauth2")
-    log_msg = f'{access_token=}, {refresh_token=}'
-    log.debug(log_msg)
-    log.info('Set refresh token cookie')
+    log.debug('Set refresh token cookie')
     response.set_cookie(key=token_settings.refresh_token_cookie_name,
                         value=refresh_token,
                         httponly=True,
@@ -5,7 +5,8 @@ from typing import List
 from fastapi import APIRouter, Depends, HTTPException
 
 from api.v1.models import ResponseRole, RequestNewRoleToUser, RequestRole
-from services.role import RoleService, get_role_service
+from core.container import get_role_service
+from services.role import RoleService
 
 import logging.config
 from core.logger import LOGGING
@@ -90,11 +91,9 @@ async def delete_existed_role(role_id: uuid.UUID,
 )
 async def get_user_role(user_id: uuid.UUID,
                         role_service: RoleService = Depends(get_role_service)):
-    log_msg = f'{user_id=}, {role_service=}'
-    log.debug(log_msg)
+    log.debug('user_id=%r, role_service=%r', user_id, role_service)
     roles = await role_service.get_user_access_area(user_id)
-    log_msg = f'{roles=}'
-    log.debug(log_msg)
+    log.debug('roles=%r', roles)
     if not roles:
         raise HTTPException(status_code=HTTPStatus.NOT_FOUND, detail='Roles are not found')
     return [ResponseRole(uuid=role.uuid, name=role.name) for role in roles]
@@ -1,17 +1,33 @@
-from logging import config as logging_config
+import os
+from typing import Dict, List, Optional
 
 from pydantic import BaseSettings, AnyUrl, SecretStr
 
-from core.logger import LOGGING
-
-logging_config.dictConfig(LOGGING)
-
-enable_tracer = True
+PREFIX = '/auth_api'
 
 
 class APPSettings(BaseSettings):
     project_name: str = 'Auth API'
-    log_lvl: str = 'DEBUG'
+
+
+class LogSettings(BaseSettings):
+    level: str = 'INFO'  # уровень корневого логгера
+    # уровни отдельных модулей, ex: LOG_LEVELS='{"crud": "WARNING", "services.auth": "DEBUG"}'
+    levels: Dict[str, str] = {}
+    format: str = 'json'  # json - строка JSON на запись, text - LOG_FORMAT
+    socket: Optional[str] = None  # путь unix-сокета сборщика логов вместо stdout
+    # доля записей частых событий, которая попадает в лог, по шаблону сообщения
+    sampling: Dict[str, float] = {
+        '<<<request_id middleware>>>': 0.01,
+        'Rate limit exceeded: %s': 0.1,
+    }
+    file: Optional[str] = None  # дополнительно писать в файл, ex: logconfig.log
+    file_max_bytes: int = 10 * 1024 * 1024
+    file_backup_count: int = 5
+    queue_size: int = 10_000  # записи сверх очереди отбрасываются, запрос не ждет вывода логов
+
+    class Config:
+        env_prefix = 'log_'
 
 
 class UserDBSettings(BaseSettings):
@@ -20,6 +36,13 @@ class UserDBSettings(BaseSettings):
     password: SecretStr
     port: int = 5432
     service_name: str = 'db_users'
+    # пул соединений одного воркера: всего к Postgres до workers * (pool_size + max_overflow)
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30.0  # sec, ожидание свободного соединения
+    pool_recycle: int = 1800  # sec, пересоздание соединения
+    pool_pre_ping: bool = True
+    echo: bool = False
 
     class Config:
         env_prefix = 'pg_db_'
@@ -37,6 +60,19 @@ class UserDBSettings(BaseSettings):
         return cls._url(asyncpg=True)
 
 
+class EntryPartitionSettings(BaseSettings):
+    # таблица entry секционирована по месяцам (date_time)
+    enabled: bool = True  # фоновая задача создания и удаления секций
+    interval: float = 3600.0  # sec, период задачи
+    premake: int = 3  # сколько будущих месяцев держать созданными
+    retention: int = 12  # месяцев истории входов, 0 - хранить все
+    archive: bool = False  # выгружать секцию в CSV перед удалением
+    archive_dir: str = '/var/lib/auth/entry_archive'
+
+    class Config:
+        env_prefix = 'entry_partition_'
+
+
 class TokenSettings(BaseSettings):
     access_expire: int = 10  # min
     access_secret_key: SecretStr = ''
@@ -53,32 +89,122 @@ class RedisSettings(BaseSettings):
     host: str = 'redis_token'
     port: int = 6379
     password: SecretStr = ''
+    max_connections: int = 100  # на воркер
+    health_check_interval: int = 30  # sec
+    socket_timeout: float = 5.0  # sec
+    socket_connect_timeout: float = 5.0  # sec
 
     class Config:
         env_prefix = 'redis_'
 
 
+class RevocationCacheSettings(BaseSettings):
+    enabled: bool = True
+    capacity: int = 100_000  # ожидаемое число отозванных токенов
+    error_rate: float = 0.001  # доля ложных срабатываний bloom-фильтра
+    negative_ttl: float = 5.0  # sec, задержка распространения отзыва без pub/sub
+    negative_size: int = 10_000
+    rebuild_interval: float = 300.0  # sec
+
+    class Config:
+        env_prefix = 'revocation_cache_'
+
+
+class RoleCacheSettings(BaseSettings):
+    # роли пользователей и справочник ролей: локальный LRU воркера + Redis
+    enabled: bool = True
+    local_ttl: float = 60.0  # sec
+    local_size: int = 10_000
+    redis_ttl: int = 3600  # sec
+    version_ttl: float = 1.0  # sec, задержка, с которой другие воркеры увидят изменение ролей
+
+    class Config:
+        env_prefix = 'role_cache_'
+
+
 class JWTSetting(BaseSettings):
     REQUEST_LIMIT_PER_MINUTE: int = 20
 
 
+class RateLimitSettings(BaseSettings):
+    # лимит политики по умолчанию - REQUEST_LIMIT_PER_MINUTE
+    algorithm: str = 'token_bucket'  # token_bucket | sliding_window
+    window: int = 60  # sec
+    identity: str = 'ip'  # ip | user | client
+    # политики по префиксу пути, JSON: {"/auth_api/v1/auth/login": {"limit": 5, "algorithm": "sliding_window"}}
+    routes: Dict[str, dict] = {}
+    local_enabled: bool = True  # отсекать явных нарушителей в воркере без Redis
+    local_max_keys: int = 10_000
+    # обратных прокси перед сервисом, каждый дописывает адрес в X-Forwarded-For; 0 - заголовку не доверять
+    trusted_proxies: int = 0
+
+    class Config:
+        env_prefix = 'rate_limit_'
+
+
+class HashSettings(BaseSettings):
+    executor: str = 'thread'  # thread | process
+    max_workers: int = os.cpu_count() or 1
+    max_pending: int = 64  # задачи в очереди и в работе, сверх лимита - 429
+    algorithm: str = 'bcrypt'  # bcrypt | argon2id
+    bcrypt_rounds: int = 12
+    argon2_time_cost: int = 3
+    argon2_memory_cost: int = 65536  # KiB
+    argon2_parallelism: int = 4
+    calibrate: bool = False  # подобрать параметры при старте под target_ms
+    target_ms: int = 250
+
+    class Config:
+        env_prefix = 'hash_'
+
+
 class JaegerSettings(BaseSettings):
     host: str = 'jaeger'
     port_udp: int = 6831
     port_tcp: int = 16686
+    enabled: bool = True
+    exporter: str = 'jaeger'  # jaeger, otlp, console или none
+    otlp_endpoint: str = 'http://jaeger:4317'
+    # head sampling: доля новых трейсов, решение родителя из traceparent соблюдается
+    sample_ratio: float = 0.1
+    # tail sampling: из остальных трейсов экспортируются медленные и с ошибкой
+    tail_sampling: bool = True
+    tail_slow_ms: float = 500.0
+    tail_max_traces: int = 2048  # незавершенных трейсов в буфере воркера
+    batch_max_queue_size: int = 2048
+    batch_max_export_batch_size: int = 512
+    batch_schedule_delay_ms: int = 5000
 
     class Config:
         env_prefix = 'jaeger_'
 
 
+class MetricsSettings(BaseSettings):
+    # Prometheus; при нескольких воркерах gunicorn нужен PROMETHEUS_MULTIPROC_DIR (см. gunicorn.conf.py)
+    enabled: bool = True
+    path: str = '/metrics'
+    # границы гистограммы латентности запросов, sec: SLO логина считается по ним
+    latency_buckets: List[float] = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0]
+
+    class Config:
+        env_prefix = 'metrics_'
+
+
 class Oauth2Settings(BaseSettings):
     PASSWORD_GEN_SECRET_KEY: str = "123qwe"
 
 
 app_settings = APPSettings()
+log_settings = LogSettings()
 token_settings = TokenSettings()
 redis_settings = RedisSettings()
+revocation_cache_settings = RevocationCacheSettings()
+role_cache_settings = RoleCacheSettings()
 user_db_settings = UserDBSettings()
+entry_partition_settings = EntryPartitionSettings()
 jwt_settings = JWTSetting()
+rate_limit_settings = RateLimitSettings()
+hash_settings = HashSettings()
 jaeger_settings = JaegerSettings()
+metrics_settings = MetricsSettings()
 oauth2_settings = Oauth2Settings()
@@ -0,0 +1,83 @@
+import asyncio
+import logging.config
+from typing import Optional
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from core.config import hash_settings, revocation_cache_settings, entry_partition_settings
+from core.logger import LOGGING
+from db.entry_partitions import entry_partitions
+from db.redis_pool import init_redis, close_redis, get_redis
+from db.revocation_cache import revocation_cache
+from db.role_cache import role_cache
+from db.session import init_engine, close_engine, get_db
+from db.token import token_db
+from services.auth import AuthService
+from services.role import RoleService
+from utils.hash_executor import hash_executor
+from utils.password_hasher import hash_policy
+from utils.token_manager import token_manager
+
+logging.config.dictConfig(LOGGING)
+log = logging.getLogger(__name__)
+
+
+class Container:
+    """
+    Application singletons and their lifecycle.
+    Пулы, кеши, менеджер токенов и хешер создаются один раз на воркер и живут
+    от старта до остановки приложения; на запрос к ним привязывается только сессия БД.
+    """
+
+    def __init__(self) -> None:
+        self.engine: Optional[AsyncEngine] = None
+        self.token_db = token_db
+        self.token_manager = token_manager
+        self.hash_policy = hash_policy
+        self.hash_executor = hash_executor
+        self.revocation_cache = revocation_cache
+        self.role_cache = role_cache
+        self.entry_partitions = entry_partitions
+
+    async def start(self) -> None:
+        # под gunicorn калибрует мастер и выключает calibrate до fork, здесь - только одиночный процесс
+        if hash_settings.calibrate:
+            await asyncio.to_thread(self.hash_policy.calibrate, hash_settings.target_ms)
+        self.engine = init_engine()
+        init_redis()
+        self.token_db.bind(get_redis())
+        if revocation_cache_settings.enabled:
+            self.revocation_cache.start(get_redis())
+        if entry_partition_settings.enabled:
+            self.entry_partitions.start(self.engine)
+        log.info('Container started')
+
+    async def stop(self) -> None:
+        await self.entry_partitions.stop()
+        await self.revocation_cache.stop()
+        self.token_db.bind(None)
+        await close_redis()
+        await close_engine()
+        self.engine = None
+        self.hash_executor.shutdown()
+        log.info('Container stopped')
+
+    def auth_service(self, session: AsyncSession) -> AuthService:
+        return AuthService(self.token_db, self.token_manager, session)
+
+    def role_service(self, session: AsyncSession) -> RoleService:
+        return RoleService(session)
+
+
+container = Container()
+
+
+def get_auth_service(user_db_session: AsyncSession = Depends(get_db)) -> AuthService:
+    """Service bound to the session of the request"""
+    return container.auth_service(user_db_session)
+
+
+def get_role_service(db: AsyncSession = Depends(get_db)) -> RoleService:
+    """Service bound to the session of the request"""
+    return container.role_service(db)
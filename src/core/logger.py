@@ -1,9 +1,226 @@
-LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-LOG_DEFAULT_HANDLERS = ['console', 'file',]
+import atexit
+import copy
+import logging
+import os
+import queue
+import random
+import re
+import socket
+import sys
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import List, Optional
+
+import orjson
+from opentelemetry import trace
+
+from core.config import log_settings
+
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+LOG_DEFAULT_HANDLERS = ['queue', ]
+
+# X-Request-Id текущего запроса, выставляется RequestIdMiddleware
+request_id_var: ContextVar[str] = ContextVar('request_id', default='-')
+# пользователь проверенного токена, выставляется при проверке токена
+user_id_var: ContextVar[Optional[str]] = ContextVar('user_id', default=None)
+
+# учетные данные, которые не должны попадать в логи
+REDACTIONS = [
+    (re.compile(r'eyJ[\w-]+\.[\w-]+\.[\w-]*'), '<jwt>'),
+    (re.compile(r'\$(?:2[aby]|argon2(?:id|i|d))\$[^\s\'",)]+'), '<hash>'),
+    (re.compile(r'(?i)(bearer\s+)\S+'), r'\1***'),
+    (re.compile(r'(?i)((?:password|pwd|secret|token)\w*[\'"]?\s*[=:]\s*)'
+                r'(SecretStr\(\'\*+\'\)|[\'"][^\'"]*[\'"]|[^\s,;)}]+)'),
+     r'\1***'),
+]
+
+
+def redact(message: str) -> str:
+    for pattern, replacement in REDACTIONS:
+        message = pattern.sub(replacement, message)
+    return message
+
+
+class RequestIdFilter(logging.Filter):
+    """Add the current request id, trace id and user id to every record"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        record.user_id = user_id_var.get()
+        span_context = trace.get_current_span().get_span_context()
+        record.trace_id = format(span_context.trace_id, '032x') if span_context.is_valid else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a share of records of noisy events, warnings and errors are always kept"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.rates = log_settings.sampling
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        rate = self.rates.get(record.msg) if record.levelno < logging.WARNING else None
+        return rate is None or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON line per record"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+            'trace_id': getattr(record, 'trace_id', None),
+            'user_id': getattr(record, 'user_id', None),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc_info'] = record.exc_text
+        return orjson.dumps(entry).decode('utf-8')
+
+
+class UnixSocketHandler(logging.Handler):
+    """JSON lines to a local log collector over a unix stream socket, reconnects after errors"""
+
+    RETRY_INTERVAL = 1.0  # sec
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self.path = path
+        self._sock: Optional[socket.socket] = None
+        self._retry_at = 0.0
+
+    def _connect(self) -> Optional[socket.socket]:
+        if self._sock is None and time.monotonic() >= self._retry_at:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.path)
+                self._sock = sock
+            except OSError:
+                sock.close()
+                self._retry_at = time.monotonic() + self.RETRY_INTERVAL
+        return self._sock
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            line = (self.format(record) + '\n').encode('utf-8')
+            sock = self._connect()
+            if sock is not None:
+                sock.sendall(line)
+        except OSError:
+            self._close_socket()
+        except Exception:
+            self.handleError(record)
+
+    def _close_socket(self) -> None:
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def close(self) -> None:
+        self._close_socket()
+        super().close()
+
+
+# записи передаются в поток QueueListener своего процесса: форматирование и вывод не на пути запроса
+log_queue: queue.Queue = queue.Queue(log_settings.queue_size)
+_listener: Optional[QueueListener] = None
+_listener_pid: Optional[int] = None
+
+
+def _output_handlers() -> List[logging.Handler]:
+    formatter = JsonFormatter() if log_settings.format == 'json' else logging.Formatter(LOG_FORMAT)
+    if log_settings.socket:
+        handlers: List[logging.Handler] = [UnixSocketHandler(log_settings.socket)]
+    else:
+        handlers = [logging.StreamHandler(sys.stdout)]
+    if log_settings.file:
+        handlers.append(RotatingFileHandler(log_settings.file,
+                                            maxBytes=log_settings.file_max_bytes,
+                                            backupCount=log_settings.file_backup_count,
+                                            ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+class RedactingQueueListener(QueueListener):
+    """Writer thread: masks tokens and passwords once per record before the output handlers"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # сообщение уже собрано в QueueLogHandler.prepare, регулярные выражения - вне пути запроса
+        record.msg = redact(record.msg)
+        if record.exc_text:
+            record.exc_text = redact(record.exc_text)
+        return record
+
+
+def start_log_listener() -> None:
+    """Start the writer thread of the current process, after fork a worker starts its own"""
+    global _listener, _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    _listener_pid = os.getpid()
+    _listener = RedactingQueueListener(log_queue, *_output_handlers(), respect_handler_level=True)
+    _listener.start()
+
+
+def stop_log_listener() -> None:
+    """Write out the queued records and stop the writer thread"""
+    global _listener, _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+    _listener = _listener_pid = None
+
+
+atexit.register(stop_log_listener)
+
+
+class QueueLogHandler(QueueHandler):
+    """Non-blocking handler: puts records into the queue, drops them when it is full"""
+
+    dropped = 0
+
+    def __init__(self) -> None:
+        super().__init__(log_queue)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # сообщение собирается сразу (аргументы могут измениться), остальное форматирование - в потоке вывода
+        record = copy.copy(record)
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        start_log_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            QueueLogHandler.dropped += 1
+
 
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
+    'filters': {
+        'sampling': {
+            '()': SamplingFilter,
+        },
+        'request_id': {
+            '()': RequestIdFilter,
+        },
+    },
     'formatters': {
         'verbose': {
             'format': LOG_FORMAT
@@ -19,18 +236,9 @@ LOGGING = {
         },
     },
     'handlers': {
-        'console': {
-            'level': 'DEBUG',
-            'class': 'logging.StreamHandler',
-            'formatter': 'verbose',
-        },
-        'file': {
-            'level': 'DEBUG',
-            'class': 'logging.handlers.RotatingFileHandler',
-            'formatter': 'verbose',
-            'filename': 'logconfig.log',
-            'maxBytes': 102400,
-            'backupCount': 30,
+        'queue': {
+            '()': QueueLogHandler,
+            'filters': ['sampling', 'request_id'],
         },
         'default': {
             'formatter': 'default',
@@ -44,10 +252,6 @@ LOGGING = {
         },
     },
     'loggers': {
-        '': {
-            'handlers': LOG_DEFAULT_HANDLERS,
-            'level': 'DEBUG',
-        },
         'uvicorn.error': {
             'level': 'INFO',
         },
@@ -65,10 +269,11 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        # уровни модулей из LOG_LEVELS, ex: crud, services.auth
+        **{name: {'level': level.upper()} for name, level in log_settings.levels.items()},
     },
     'root': {
-        'level': 'DEBUG',
-        'formatter': 'verbose',
+        'level': log_settings.level.upper(),
         'handlers': LOG_DEFAULT_HANDLERS,
     },
 }
@@ -0,0 +1,72 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+##################################
+# BLOCK WITH PROMETHEUS METRICS  #
+##################################
+
+HASH_QUEUE_WAIT = Histogram(
+    'auth_hash_queue_wait_seconds',
+    'Time a password hashing job waits for a free worker',
+    ['operation'],
+)
+HASH_DURATION = Histogram(
+    'auth_hash_duration_seconds',
+    'Time spent hashing or verifying a password in the worker',
+    ['operation'],
+)
+HASH_IN_FLIGHT = Gauge(
+    'auth_hash_in_flight',
+    'Password hashing jobs queued or running',
+    multiprocess_mode='livesum',
+)
+HASH_REJECTED = Counter(
+    'auth_hash_rejected_total',
+    'Password hashing jobs rejected because the pool is saturated',
+)
+RATE_LIMIT_REJECTED = Counter(
+    'auth_rate_limit_rejected_total',
+    'Requests rejected by the rate limiter',
+    ['policy', 'source'],
+)
+ROLE_CACHE_LOOKUPS = Counter(
+    'auth_role_cache_lookups_total',
+    'Role cache lookups by the tier that answered',
+    ['kind', 'tier'],
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    'auth_db_pool_checked_out',
+    'Database connections currently checked out of the pool',
+    multiprocess_mode='livesum',
+)
+DB_POOL_OVERFLOW = Gauge(
+    'auth_db_pool_overflow',
+    'Database connections open above pool_size',
+    multiprocess_mode='livesum',
+)
+DB_POOL_WAIT = Histogram(
+    'auth_db_pool_wait_seconds',
+    'Time to get a database connection from the pool, including opening a new one',
+)
+DB_POOL_TIMEOUTS = Counter(
+    'auth_db_pool_timeouts_total',
+    'Requests that gave up waiting for a database connection',
+)
+REDIS_POOL_IN_USE = Gauge(
+    'auth_redis_pool_in_use',
+    'Redis connections currently taken from the pool',
+    multiprocess_mode='livesum',
+)
+REDIS_POOL_CREATED = Gauge(
+    'auth_redis_pool_created',
+    'Redis connections opened by the pool',
+    multiprocess_mode='livesum',
+)
+REDIS_POOL_EXHAUSTED = Counter(
+    'auth_redis_pool_exhausted_total',
+    'Redis commands that failed because the pool reached max_connections',
+)
+TOKEN_VERIFICATIONS = Counter(
+    'auth_token_verifications_total',
+    'Token checks by token type and outcome: valid, missing, invalid, expired, revoked',
+    ['type', 'outcome'],
+)
@@ -0,0 +1,223 @@
+import functools
+import logging.config
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar
+
+from fastapi import FastAPI, HTTPException
+from opentelemetry import trace
+from opentelemetry.context import Context
+from opentelemetry.exporter.jaeger.thrift import JaegerExporter
+from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+from opentelemetry.instrumentation.redis import RedisInstrumentor
+from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+from opentelemetry.sdk.resources import Resource, SERVICE_NAME
+from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SpanExporter
+from opentelemetry.sdk.trace.sampling import Decision, ParentBased, Sampler, SamplingResult, StaticSampler, \
+    TraceIdRatioBased
+from opentelemetry.trace import Link, SpanContext, SpanKind, Status, StatusCode, TraceFlags
+from opentelemetry.trace.span import TraceState
+from opentelemetry.util.types import Attributes
+
+from core.config import jaeger_settings
+from core.logger import LOGGING, request_id_var
+
+logging.config.dictConfig(LOGGING)
+log = logging.getLogger(__name__)
+
+EXPORTERS = ('jaeger', 'otlp', 'console', 'none')
+
+# прокси-трейсер: до configure_tracer (и при выключенной трассировке) спаны ничего не стоят
+tracer = trace.get_tracer('auth-service')
+
+AsyncFunc = TypeVar('AsyncFunc', bound=Callable[..., Awaitable[Any]])
+
+
+def traced(name: Optional[str] = None, attributes: Optional[Attributes] = None) -> Callable[[AsyncFunc], AsyncFunc]:
+    """
+    Run the coroutine function in a child span of the current one.
+    HTTPException с кодом 4xx - штатный ответ клиенту, ошибкой спана считаются только 5xx и прочие исключения.
+    """
+
+    def decorator(func: AsyncFunc) -> AsyncFunc:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(span_name,
+                                              attributes=attributes,
+                                              record_exception=False,
+                                              set_status_on_exception=False,
+                                              ) as span:
+                try:
+                    return await func(*args, **kwargs)
+                except HTTPException as e:
+                    span.set_attribute('http.status_code', e.status_code)
+                    if e.status_code >= 500:
+                        span.set_status(Status(StatusCode.ERROR, str(e.detail)))
+                    raise
+                except Exception as e:
+                    span.record_exception(e)
+                    span.set_status(Status(StatusCode.ERROR, f'{type(e).__name__}: {e}'))
+                    raise
+
+        return wrapper
+
+    return decorator
+
+
+class RecordingRatioSampler(Sampler):
+    """
+    Trace id ratio sampler that still records the traces it does not sample.
+    Такие трейсы не экспортируются, но их спаны доходят до TailSamplingProcessor,
+    который сохраняет медленные и завершившиеся ошибкой.
+    """
+
+    def __init__(self, ratio: float) -> None:
+        self._ratio = TraceIdRatioBased(ratio)
+
+    def should_sample(self,
+                      parent_context: Optional[Context],
+                      trace_id: int,
+                      name: str,
+                      kind: SpanKind = None,
+                      attributes: Attributes = None,
+                      links: Sequence[Link] = None,
+                      trace_state: TraceState = None,
+                      ) -> SamplingResult:
+        result = self._ratio.should_sample(parent_context, trace_id, name, kind, attributes, links, trace_state)
+        if result.decision is Decision.DROP:
+            return SamplingResult(Decision.RECORD_ONLY, attributes, trace_state)
+        return result
+
+    def get_description(self) -> str:
+        return f'RecordingRatioSampler{{{self._ratio.rate}}}'
+
+
+def _as_sampled(span: ReadableSpan) -> ReadableSpan:
+    """Copy of the span marked as sampled, exporting processors skip unsampled spans"""
+    context = SpanContext(span.context.trace_id,
+                          span.context.span_id,
+                          span.context.is_remote,
+                          TraceFlags(TraceFlags.SAMPLED),
+                          span.context.trace_state,
+                          )
+    return ReadableSpan(name=span.name,
+                        context=context,
+                        parent=span.parent,
+                        resource=span.resource,
+                        attributes=span.attributes,
+                        events=span.events,
+                        links=span.links,
+                        kind=span.kind,
+                        status=span.status,
+                        start_time=span.start_time,
+                        end_time=span.end_time,
+                        instrumentation_scope=span.instrumentation_scope,
+                        )
+
+
+class TailSamplingProcessor(SpanProcessor):
+    """
+    Exports sampled spans as is and keeps unsampled traces that turned out slow or failed.
+    Спаны несэмплированного трейса копятся до завершения его локального корня (запроса),
+    затем трейс целиком экспортируется или отбрасывается.
+    """
+
+    def __init__(self, delegate: SpanProcessor, slow_ms: float, max_traces: int) -> None:
+        self.delegate = delegate
+        self.slow_ns = int(slow_ms * 1_000_000)
+        self.max_traces = max_traces
+        self._traces: 'OrderedDict[int, List[ReadableSpan]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Span, parent_context: Optional[Context] = None) -> None:
+        self.delegate.on_start(span, parent_context)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if span.context.trace_flags.sampled:
+            self.delegate.on_end(span)
+            return
+        trace_id = span.context.trace_id
+        is_local_root = span.parent is None or span.parent.is_remote
+        with self._lock:
+            spans = self._traces.setdefault(trace_id, [])
+            spans.append(span)
+            if not is_local_root:
+                if len(self._traces) > self.max_traces:
+                    self._traces.popitem(last=False)
+                return
+            del self._traces[trace_id]
+        if self._keep(span, spans):
+            for kept in spans:
+                self.delegate.on_end(_as_sampled(kept))
+
+    def _keep(self, root: ReadableSpan, spans: List[ReadableSpan]) -> bool:
+        if root.end_time - root.start_time >= self.slow_ns:
+            return True
+        return any(span.status.status_code is StatusCode.ERROR for span in spans)
+
+    def shutdown(self) -> None:
+        self.delegate.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return self.delegate.force_flush(timeout_millis)
+
+
+def _exporter(name: str) -> Optional[SpanExporter]:
+    if name == 'jaeger':
+        return JaegerExporter(agent_host_name=jaeger_settings.host, agent_port=jaeger_settings.port_udp)
+    if name == 'otlp':
+        return OTLPSpanExporter(endpoint=jaeger_settings.otlp_endpoint, insecure=True)
+    if name == 'console':
+        # для локальной отладки
+        return ConsoleSpanExporter()
+    return None
+
+
+def configure_tracer() -> bool:
+    """Install the tracer provider, False when tracing is switched off"""
+    if jaeger_settings.exporter not in EXPORTERS:
+        raise ValueError(f'Unknown trace exporter {jaeger_settings.exporter}, expected one of {EXPORTERS}')
+    exporter = _exporter(jaeger_settings.exporter) if jaeger_settings.enabled else None
+    if exporter is None:
+        log.info('Tracing is disabled')
+        return False
+
+    processor: SpanProcessor = BatchSpanProcessor(exporter,
+                                                  max_queue_size=jaeger_settings.batch_max_queue_size,
+                                                  max_export_batch_size=jaeger_settings.batch_max_export_batch_size,
+                                                  schedule_delay_millis=jaeger_settings.batch_schedule_delay_ms,
+                                                  )
+    if jaeger_settings.tail_sampling:
+        root = RecordingRatioSampler(jaeger_settings.sample_ratio)
+        # дочерние спаны несэмплированного трейса тоже записываются, решение принимает процессор
+        sampler = ParentBased(root, local_parent_not_sampled=StaticSampler(Decision.RECORD_ONLY))
+        processor = TailSamplingProcessor(processor, jaeger_settings.tail_slow_ms, jaeger_settings.tail_max_traces)
+    else:
+        sampler = ParentBased(TraceIdRatioBased(jaeger_settings.sample_ratio))
+
+    provider = TracerProvider(resource=Resource(attributes={SERVICE_NAME: 'auth-service'}), sampler=sampler)
+    provider.add_span_processor(processor)
+    trace.set_tracer_provider(provider)
+    # спаны запросов к БД (SQL в db.statement) и команд redis, движок и пулы создаются позже в lifespan
+    SQLAlchemyInstrumentor().instrument()
+    RedisInstrumentor().instrument()
+    log.info('Tracing to %s, sample ratio %s, tail sampling %s',
+             jaeger_settings.exporter, jaeger_settings.sample_ratio, jaeger_settings.tail_sampling)
+    return True
+
+
+def _server_request_hook(span, scope: Dict) -> None:
+    if span and span.is_recording():
+        span.set_attribute('http.request_id', request_id_var.get())
+
+
+def instrument_app(app: FastAPI) -> None:
+    # пробы балансировщика и документацию не трейсим
+    FastAPIInstrumentor.instrument_app(app,
+                                       excluded_urls='healthz,readyz,metrics,openapi',
+                                       server_request_hook=_server_request_hook,
+                                       )
@@ -2,8 +2,8 @@ import argparse
 import psycopg2
 from psycopg2 import Error
 import uuid
-import bcrypt
 from core.config import user_db_settings
+from utils.password_hasher import hash_policy
 
 if __name__ == '__main__':
     SUPER_USER = 'super_user'
@@ -27,8 +27,7 @@ if __name__ == '__main__':
 
             cursor = connection.cursor()
 
-            salt = bcrypt.gensalt()
-            pwd_hash = bcrypt.hashpw(args.password.encode('utf-8'), salt)
+            pwd_hash = hash_policy.hash(args.password)
 
             # добавление пользователя в таблицу user
             query = " INSERT INTO users (uuid, name, surname, login, email, is_active, password) " \
@@ -1,11 +1,23 @@
+import inspect
 from abc import ABC, abstractmethod
 from typing import Any
 from uuid import UUID
 from typing import Union
 
+from core.tracer import traced
+
 
 class CrudBase(ABC):
 
+    def __init_subclass__(cls, **kwargs) -> None:
+        """Каждый публичный метод DAL выполняется в своем спане, ex: RoleDAL.get_by_user_id"""
+        super().__init_subclass__(**kwargs)
+        for name, method in list(vars(cls).items()):
+            if name.startswith('_') or not inspect.iscoroutinefunction(method):
+                continue
+            attributes = {'db.system': 'postgresql', 'code.namespace': cls.__name__, 'code.function': name}
+            setattr(cls, name, traced(f'{cls.__name__}.{name}', attributes)(method))
+
     @abstractmethod
     async def create(
             self, name: str) -> Any:
@@ -23,8 +23,7 @@ class UserSocialDAL(CrudBase):
 
     async def create(self, user_id: UUID, sub_id, provider: str) -> Optional[UserSocial]:
         """Create User_socials"""
-        log_message = f'CRUD Create user social: user_id={user_id}, sub_id={sub_id}, provider={provider}'
-        log.debug(log_message)
+        log.debug('CRUD Create user social: user_id=%s, sub_id=%s, provider=%s', user_id, sub_id, provider)
         new_user_social = UserSocial(
             user_id=user_id,
             sub_id=str(sub_id),
@@ -32,12 +31,10 @@ class UserSocialDAL(CrudBase):
         )
         try:
             self.db_session.add(new_user_social)
-            await self.db_session.commit()
+            await self.db_session.flush()
             return new_user_social
         except exc.SQLAlchemyError as err:
-            log_message = f'Create user social error: {new_user_social.__dict__}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Create user social error: %s: %s', new_user_social.__dict__, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='Error creating user social',
@@ -51,21 +48,17 @@ class UserSocialDAL(CrudBase):
 
     async def delete(self, id: Union[str, UUID]) -> Optional[UUID]:
         """Delete User_socials"""
-        log_message = f'CRUD Delete User_socials: id={id}'
-        log.debug(log_message)
+        log.debug('CRUD Delete User_socials: id=%s', id)
         try:
             query = update(UserSocial). \
                 where(UserSocial.uuid == id). \
                 returning(UserSocial.uuid)
             res = await self.db_session.execute(query)
-            await self.db_session.commit()
             deleted_user_social_id_row = res.fetchone()
             if deleted_user_social_id_row is not None:
                 return deleted_user_social_id_row[0]
         except exc.SQLAlchemyError as err:
-            log_message = f'Delete enuser socialtry error: user social uuid = {id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Delete enuser socialtry error: user social uuid = %s: %s', id, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='Error deleting user social',
@@ -79,8 +72,7 @@ class UserSocialDAL(CrudBase):
 
     async def get(self, id: UUID) -> Optional[UserSocial]:
         """Get User_socials"""
-        log_message = f'CRUD Get User_socials: id={id}'
-        log.debug(log_message)
+        log.debug('CRUD Get User_socials: id=%s', id)
         try:
             query = select(UserSocial).where(UserSocial.uuid == id)
             res = await self.db_session.execute(query)
@@ -88,30 +80,24 @@ class UserSocialDAL(CrudBase):
             if user_social_row is not None:
                 return user_social_row[0]
         except exc.SQLAlchemyError as err:
-            log_message = f'Get query error: user social uuid = {id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Get query error: user social uuid = %s: %s', id, err)
         except Exception:
             log.error('CRUD user social Get Unknown Error', exc_info=True)
 
     async def update(self, id: UUID, **kwargs) -> Optional[UUID]:
         """Update User_socials"""
-        log_message = f'CRUD Update User_socials: id={id}'
-        log.debug(log_message)
+        log.debug('CRUD Update User_socials: id=%s', id)
         try:
             query = update(UserSocial). \
                 where(UserSocial.uuid == id). \
                 values(kwargs). \
                 returning(UserSocial.uuid)
             res = await self.db_session.execute(query)
-            await self.db_session.commit()
             update_user_social_id_row = res.fetchone()
             if update_user_social_id_row is not None:
                 return update_user_social_id_row[0]
         except exc.SQLAlchemyError as err:
-            log_message = f'Update user social error: user social uuid = {id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Update user social error: user social uuid = %s: %s', id, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='Error updating user social',
@@ -127,17 +113,14 @@ class UserSocialDAL(CrudBase):
                              user_id: UUID,
                              ) -> Optional[List[UserSocial]]:
         """Get User_socials by id"""
-        log_message = f'CRUD Get User_socials User by id: user_id={user_id}'
-        log.debug(log_message)
+        log.debug('CRUD Get User_socials User by id: user_id=%s', user_id)
         try:
             query = select(UserSocial).where(UserSocial.user_id == user_id)
             res = await self.db_session.execute(query)
             user_socials = res.scalars().fetchall()
             return user_socials
         except exc.SQLAlchemyError as err:
-            log_message = f'Get user social by user uuid error: user uuid = {user_id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Get user social by user uuid error: user uuid = %s: %s', user_id, err)
 
         except Exception:
             log.error('CRUD user social Get by user_id query Unknown Error', exc_info=True)
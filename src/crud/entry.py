@@ -4,6 +4,7 @@ from typing import Union, Optional, List
 from fastapi import status, HTTPException
 from sqlalchemy import update, tuple_, select, exc
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
 import logging.config
 from core.logger import LOGGING
@@ -12,6 +13,7 @@ logging.config.dictConfig(LOGGING)
 log = logging.getLogger(__name__)
 
 from db.models import Entry
+from models.entry import EntryCursor
 from crud.base_classes import CrudBase
 
 
@@ -25,23 +27,27 @@ class EntryDAL(CrudBase):
     def __init__(self, db_session: AsyncSession):
         self.db_session = db_session
 
-    async def create(self, user_id: UUID, user_agent: str, refresh_token: str) -> Optional[Entry]:
-        """Create Entry"""
-        log_message = f'CRUD Create Entry: user_id={user_id}, user_agent={user_agent}, refresh_token={refresh_token}'
-        log.debug(log_message)
+    async def create(self,
+                     user_id: UUID,
+                     user_agent: str,
+                     refresh_token: str,
+                     id: UUID = None,
+                     ) -> Optional[Entry]:
+        """Create Entry, id may be generated by caller to put it into refresh token before insert"""
+        log.debug('CRUD Create Entry: user_id=%s, user_agent=%s', user_id, user_agent)
         new_entry = Entry(
+            uuid=id,
             user_id=user_id,
             user_agent=user_agent,
             refresh_token=refresh_token,
         )
         try:
+            # фиксирует транзакцию сервис, здесь только отправка INSERT
             self.db_session.add(new_entry)
-            await self.db_session.commit()
+            await self.db_session.flush()
             return new_entry
         except exc.SQLAlchemyError as err:
-            log_message = f'Create entry error: {new_entry.__dict__}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Create entry error: user uuid = %s, user agent = %s: %s', user_id, user_agent, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='Error creating entry',
@@ -55,21 +61,17 @@ class EntryDAL(CrudBase):
 
     async def delete(self, id: Union[str, UUID]) -> Optional[UUID]:
         """Delete Entry"""
-        log_message = f'CRUD Delete Entry: id={id}'
-        log.debug(log_message)
+        log.debug('CRUD Delete Entry: id=%s', id)
         try:
             query = update(Entry). \
                 where(Entry.uuid == id). \
                 values(is_active=False).returning(Entry.uuid)
             res = await self.db_session.execute(query)
-            await self.db_session.commit()
             deleted_entry_id_row = res.fetchone()
             if deleted_entry_id_row is not None:
                 return deleted_entry_id_row[0]
         except exc.SQLAlchemyError as err:
-            log_message = f'Delete entry error: entry uuid = {id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Delete entry error: entry uuid = %s: %s', id, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='Error deleting entry',
@@ -81,10 +83,31 @@ class EntryDAL(CrudBase):
                 detail='Error deleting entry',
             )
 
+    async def deactivate_by_user_id(self, user_id: Union[str, UUID]) -> int:
+        """Deactivate all active Entries of User"""
+        log.debug('CRUD Deactivate Entries by user_id: user_id=%s', user_id)
+        try:
+            query = update(Entry). \
+                where(Entry.user_id == user_id, Entry.is_active == True). \
+                values(is_active=False)
+            res = await self.db_session.execute(query)
+            return res.rowcount
+        except exc.SQLAlchemyError as err:
+            log.error('Deactivate entries error: user uuid = %s: %s', user_id, err)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail='Error deleting entry',
+            )
+        except Exception as err:
+            log.error('CRUD Entry Deactivate by user_id Unknown Error', exc_info=True)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail='Error deleting entry',
+            )
+
     async def get(self, id: UUID) -> Optional[Entry]:
         """Get Entry"""
-        log_message = f'CRUD Get Entry: id={id}'
-        log.debug(log_message)
+        log.debug('CRUD Get Entry: id=%s', id)
         try:
             query = select(Entry).where(Entry.uuid == id)
             res = await self.db_session.execute(query)
@@ -92,30 +115,24 @@ class EntryDAL(CrudBase):
             if entry_row is not None:
                 return entry_row[0]
         except exc.SQLAlchemyError as err:
-            log_message = f'Get query error: entry uuid = {id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Get query error: entry uuid = %s: %s', id, err)
         except Exception as err:
             log.error('CRUD Entry Get Unknown Error', exc_info=True)
 
     async def update(self, id: UUID, **kwargs) -> Optional[UUID]:
         """Update Entry"""
-        log_message = f'CRUD Update Entry: id={id}'
-        log.debug(log_message)
+        log.debug('CRUD Update Entry: id=%s', id)
         try:
             query = update(Entry). \
                 where(Entry.uuid == id). \
                 values(kwargs). \
                 returning(Entry.uuid)
             res = await self.db_session.execute(query)
-            await self.db_session.commit()
             update_entry_id_row = res.fetchone()
             if update_entry_id_row is not None:
                 return update_entry_id_row[0]
         except exc.SQLAlchemyError as err:
-            log_message = f'Update entry error: entry uuid = {id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Update entry error: entry uuid = %s: %s', id, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='Error updating entry',
@@ -131,50 +148,55 @@ class EntryDAL(CrudBase):
                              user_id: UUID,
                              unique: bool = False,
                              only_active: bool = False,
-                             page_size: int = None,
-                             page_number: int = None,
+                             limit: int = None,
+                             cursor: EntryCursor = None,
                              ) -> Optional[List[Entry]]:
-        """Get Entry User by id"""
-        log_message = f'CRUD Get Entry User by id: user_id={user_id}, unique={unique}, only_active={only_active}'
-        log.debug(log_message)
+        """Get Entry User by id, newest first, keyset pagination over (date_time, uuid)"""
+        log.debug('CRUD Get Entry User by id: user_id=%s, unique=%s, only_active=%s', user_id, unique, only_active)
         try:
             query = select(Entry).where(Entry.user_id == user_id)
             if only_active:
                 query = query.where(Entry.is_active == True)
+            entry = Entry
             if unique:
-                query = query.distinct(tuple_(Entry.user_agent, Entry.is_active))
-            if page_size:
-                query = query.limit(page_size)
-            if page_number:
-                query = query.offset(page_number * page_size - page_size)
+                # последний вход для каждой пары (user_agent, is_active)
+                latest = query. \
+                    distinct(Entry.user_agent, Entry.is_active). \
+                    order_by(Entry.user_agent, Entry.is_active, Entry.date_time.desc(), Entry.uuid.desc()). \
+                    subquery()
+                entry = aliased(Entry, latest)
+                query = select(entry)
+            if cursor:
+                query = query.where(tuple_(entry.date_time, entry.uuid) < tuple_(cursor.date_time, cursor.uuid))
+            query = query.order_by(entry.date_time.desc(), entry.uuid.desc())
+            if limit:
+                query = query.limit(limit)
             res = await self.db_session.execute(query)
             entries = res.scalars().fetchall()
             return entries
         except exc.SQLAlchemyError as err:
-            log_message = f'Get entry by user uuid error: user uuid = {user_id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Get entry by user uuid error: user uuid = %s: %s', user_id, err)
 
         except Exception as err:
             log.error('CRUD Entry Get by user_id query Unknown Error', exc_info=True)
 
     async def get_by_user_agent(self,
+                                user_id: UUID,
                                 user_agent: str,
                                 only_active: bool = False) -> Optional[Union[Entry, None, Exception]]:
-        """Get Entry by User_agent"""
-        log_message = f'CRUD Get Entry by User_agent: user_agent={user_agent}, only_active={only_active}'
-        log.debug(log_message)
+        """Get Entry of User by User_agent"""
+        log.debug('CRUD Get Entry by User_agent: user_id=%s, user_agent=%s, only_active=%s',
+                  user_id, user_agent, only_active)
         try:
-            query = select(Entry).where(Entry.user_agent == user_agent)
+            query = select(Entry).where(Entry.user_id == user_id, Entry.user_agent == user_agent)
             if only_active:
                 query = query.where(Entry.is_active == True)
+            query = query.limit(1)
             res = await self.db_session.execute(query)
             entry_row = res.fetchone()
             if entry_row is not None:
                 return entry_row[0]
         except exc.SQLAlchemyError as err:
-            log_message = f'Get entry by user agent error: user agent = {user_agent}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Get entry by user agent error: user agent = %s: %s', user_agent, err)
         except Exception as err:
             log.error('CRUD Entry Get by user_agent Unknown Error', exc_info=True)
@@ -2,7 +2,8 @@ from uuid import UUID
 from typing import Union, Optional, List
 
 from fastapi import status, HTTPException
-from sqlalchemy import update, select, exc
+from sqlalchemy import delete, update, select, exc
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import logging.config
@@ -26,21 +27,18 @@ class RoleDAL(CrudBase):
     def __init__(self, db_session: AsyncSession):
         self.db_session = db_session
 
-    async def create(self, name: str) -> Union[Role, Exception]:
-        """Create Role"""
-        log_message = f'CRUD Create Role: name={name}'
-        log.debug(log_message)
+    async def create(self, name: str) -> Union[Role, None, Exception]:
+        """Create Role, None if the name is already taken"""
+        log.debug('CRUD Create Role: name=%s', name)
         try:
-            new_role = Role(
-                name=name,
-            )
-            self.db_session.add(new_role)  # добавление в сессию новой роли
-            await self.db_session.commit()  # добавление в Постгресс новой роли
-            return new_role
+            query = insert(Role). \
+                values(name=name). \
+                on_conflict_do_nothing(index_elements=[Role.name]). \
+                returning(Role)
+            res = await self.db_session.execute(query)
+            return res.scalar_one_or_none()
         except exc.SQLAlchemyError as err:
-            log_message = f'Create role error: {new_role.__dict__}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Create role error: name = %s: %s', name, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='Error creating role',
@@ -53,18 +51,15 @@ class RoleDAL(CrudBase):
             )
 
     async def delete(self, uuid: Union[str, UUID]) -> Union[UUID, None, Exception]:
-        """Delete Role"""
-        log_message = f'CRUD Delete Role: uuid={uuid}'
-        log.debug(log_message)
+        """Delete Role, None if it does not exist"""
+        log.debug('CRUD Delete Role: uuid=%s', uuid)
         try:
-            role = await self.db_session.get(Role, uuid)
-            await self.db_session.delete(role)
-            await self.db_session.commit()
-            return role.uuid
+            # назначения роли удаляются каскадом в БД
+            query = delete(Role).where(Role.uuid == uuid).returning(Role.uuid)
+            res = await self.db_session.execute(query)
+            return res.scalar_one_or_none()
         except exc.SQLAlchemyError as err:
-            log_message = f'Delete role error: role uuid = {id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Delete role error: role uuid = %s: %s', uuid, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='Error deleting role',
@@ -78,8 +73,7 @@ class RoleDAL(CrudBase):
 
     async def get(self, id: UUID) -> Union[Role, None, Exception]:
         """Get Role"""
-        log_message = f'CRUD Get Role: id={id}'
-        log.debug(log_message)
+        log.debug('CRUD Get Role: id=%s', id)
         try:
             query = select(Role).where(Role.uuid == id)
             res = await self.db_session.execute(query)
@@ -87,27 +81,19 @@ class RoleDAL(CrudBase):
             if role_row is not None:
                 return role_row[0]
         except exc.SQLAlchemyError as err:
-            log_message = f'Get role error: role uuid = {id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Get role error: role uuid = %s: %s', id, err)
         except Exception as err:
             log.error('CRUD Role Get Unknown Error', exc_info=True)
 
-    async def update(self, id: UUID, **kwargs) -> Union[UUID, None, Exception]:
-        """Update Role"""
-        log_message = f'CRUD Update Role: id={id}'
-        log.debug(log_message)
+    async def update(self, id: UUID, **kwargs) -> Union[Role, None, Exception]:
+        """Update Role, None if it does not exist"""
+        log.debug('CRUD Update Role: id=%s', id)
         try:
-            query = update(Role).where(Role.uuid == id).values(kwargs).returning(Role.uuid)
+            query = update(Role).where(Role.uuid == id).values(kwargs).returning(Role)
             res = await self.db_session.execute(query)
-            update_role_id_row = res.fetchone()
-            await self.db_session.commit()
-            if update_role_id_row is not None:
-                return update_role_id_row[0]
+            return res.scalar_one_or_none()
         except exc.SQLAlchemyError as err:
-            log_message = f'Update role error: role uuid = {id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Update role error: role uuid = %s: %s', id, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='Error updating role',
@@ -121,27 +107,48 @@ class RoleDAL(CrudBase):
 
     async def get_by_user_id(self, user_id: UUID) -> Optional[Union[List[Role], Exception]]:
         """Get Role by User id"""
-        log_message = f'CRUD Get Role by User id: user_id={user_id}'
-        log.debug(log_message)
+        log.debug('CRUD Get Role by User id: user_id=%s', user_id)
         try:
             query = select(Role). \
                 join(UserRole, Role.uuid == UserRole.role_id). \
-                join(User, UserRole.user_id == User.uuid). \
                 where(UserRole.user_id == user_id)
             res = await self.db_session.execute(query)
             role_rows = res.scalars().fetchall()
             return role_rows
         except exc.SQLAlchemyError as err:
-            log_message = f'Get role by user id error: user uuid = {user_id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Get role by user id error: user uuid = %s: %s', user_id, err)
         except Exception as err:
             log.error('CRUD Role Get by user_id Unknown Error', exc_info=True)
 
+    async def get_by_existing_user_id(self, user_id: UUID) -> Optional[Union[List[Role], Exception]]:
+        """Get Roles of User, None if the User does not exist"""
+        log.debug('CRUD Get Role by existing User id: user_id=%s', user_id)
+        try:
+            # LEFT JOIN: пользователь без ролей дает одну строку с NULL, несуществующий - ни одной
+            query = select(User.uuid, Role). \
+                outerjoin(UserRole, UserRole.user_id == User.uuid). \
+                outerjoin(Role, Role.uuid == UserRole.role_id). \
+                where(User.uuid == user_id)
+            res = await self.db_session.execute(query)
+            rows = res.fetchall()
+            if rows:
+                return [role for _, role in rows if role is not None]
+        except exc.SQLAlchemyError as err:
+            log.error('Get role by existing user id error: user uuid = %s: %s', user_id, err)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail='Error getting user roles',
+            )
+        except Exception as err:
+            log.error('CRUD Role Get by existing user_id Unknown Error', exc_info=True)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail='Error getting user roles',
+            )
+
     async def get_by_name(self, name: str) -> Union[Role, None]:
         """Get Role by Name"""
-        log_message = f'CRUD Get Role by Name: name={name}'
-        log.debug(log_message)
+        log.debug('CRUD Get Role by Name: name=%s', name)
         try:
             query = select(Role).where(Role.name == name)
             res = await self.db_session.execute(query)
@@ -149,9 +156,7 @@ class RoleDAL(CrudBase):
             if role_row is not None:
                 return role_row[0]
         except exc.SQLAlchemyError as err:
-            log_message = f'Get role by name error: name = {name}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Get role by name error: name = %s: %s', name, err)
         except Exception as err:
             log.error('CRUD Role Get by name Unknown Error', exc_info=True)
 
@@ -169,35 +174,3 @@ class RoleDAL(CrudBase):
             log.error(err)
         except Exception as err:
             log.error('CRUD Role Get all Unknown Error', exc_info=True)
-
-    async def delete_by_user_id_and_role_id(self,
-                                            user_id: UUID,
-                                            role_id: UUID) -> Optional[Union[List[Role], Exception]]:
-        """Delete Role by User id and Role id"""
-        log_message = f'CRUD Delete Role by User id and Role id: user_id={user_id} and role_id={role_id}'
-        log.debug(log_message)
-        try:
-            query = select(UserRole). \
-                join(Role, Role.uuid == UserRole.role_id). \
-                join(User, UserRole.user_id == User.uuid). \
-                where(UserRole.user_id == user_id).where(Role.uuid == role_id)
-            res = await self.db_session.execute(query)
-            role_rows = res.fetchone()
-            if role_rows:
-                user_role = await self.db_session.get(UserRole, role_rows[0].uuid)
-                await self.db_session.delete(user_role)
-                await self.db_session.commit()
-        except exc.SQLAlchemyError as err:
-            log_message = f'Delete role by user id and role id error: user uuid = {user_id}; role uuid = {role_id}'
-            log.error(log_message)
-            log.error(err)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail='Error deleting role',
-            )
-        except Exception as err:
-            log.error('CRUD Role Delete by user_id and role_id Unknown Error', exc_info=True)
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail='Error deleting role',
-            )
@@ -2,7 +2,8 @@ from uuid import UUID
 from typing import Union
 
 from fastapi import status, HTTPException
-from sqlalchemy import update, and_, select, exc
+from sqlalchemy import Row, update, and_, select, exc
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import logging.config
@@ -26,26 +27,20 @@ class UserDAL(CrudBase):
         self.db_session = db_session
 
     async def create(
-            self, name: str, surname: str, login: str, email: str, password: str) -> Union[User, Exception]:
-        """Create User"""
-        log_message = f'CRUD Create User: name={name}, surname={surname}, login={login}, email={email}, password={password}'
-        log.debug(log_message)
+            self, name: str, surname: str, login: str, email: str, password: str) -> Union[User, None, Exception]:
+        """Create User, None if login or email is already taken"""
+        log.debug('CRUD Create User: name=%s, surname=%s, login=%s, email=%s', name, surname, login, email)
+        new_user = dict(name=name, surname=surname, login=login, email=email)
         try:
-            """Create User"""
-            new_user = User(
-                name=name,
-                surname=surname,
-                login=login,
-                email=email,
-                password=password
-            )
-            self.db_session.add(new_user)
-            await self.db_session.commit()
-            return new_user
+            # проверка уникальности и вставка одним запросом, без гонки между SELECT и INSERT
+            query = insert(User). \
+                values(**new_user, password=password). \
+                on_conflict_do_nothing(). \
+                returning(User)
+            res = await self.db_session.execute(query)
+            return res.scalar_one_or_none()
         except exc.SQLAlchemyError as err:
-            log_message = f'Create user error: {new_user.__dict__}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Create user error: %s: %s', new_user, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='CRUD User Create query SQLAlchemyError',
@@ -59,21 +54,17 @@ class UserDAL(CrudBase):
 
     async def delete(self, id: Union[str, UUID]) -> Union[UUID, None, Exception]:
         """Delete User"""
-        log_message = f'CRUD Delete User: id={id}'
-        log.debug(log_message)
+        log.debug('CRUD Delete User: id=%s', id)
         try:
             query = update(User). \
                 where(and_(User.uuid == id, User.is_active == True)). \
                 values(is_active=False).returning(User.uuid)
             res = await self.db_session.execute(query)
-            await self.db_session.commit()
             deleted_user_id_row = res.fetchone()
             if deleted_user_id_row is not None:
                 return deleted_user_id_row[0]
         except exc.SQLAlchemyError as err:
-            log_message = f'Delete user error: uuid = {id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Delete user error: uuid = %s: %s', id, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='CRUD User Delete query SQLAlchemyError',
@@ -87,8 +78,7 @@ class UserDAL(CrudBase):
 
     async def get(self, id: UUID) -> Union[User, None, Exception]:
         """Get User"""
-        log_message = f'CRUD Get User: id={id}'
-        log.debug(log_message)
+        log.debug('CRUD Get User: id=%s', id)
         try:
             query = select(User).where(User.uuid == id)
             res = await self.db_session.execute(query)
@@ -96,9 +86,7 @@ class UserDAL(CrudBase):
             if user_row is not None:
                 return user_row[0]
         except exc.SQLAlchemyError as err:
-            log_message = f'Get user error: uuid = {id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Get user error: uuid = %s: %s', id, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='CRUD User Get query SQLAlchemyError',
@@ -110,24 +98,40 @@ class UserDAL(CrudBase):
                 detail='CRUD User Get Unknown Error',
             )
 
+    async def get_login_state(self, id: UUID) -> Union[Row, None, Exception]:
+        """Get only login and is_active of User"""
+        log.debug('CRUD Get User login state: id=%s', id)
+        try:
+            query = select(User.login, User.is_active).where(User.uuid == id)
+            res = await self.db_session.execute(query)
+            return res.fetchone()
+        except exc.SQLAlchemyError as err:
+            log.error('Get user login state error: uuid = %s: %s', id, err)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail='CRUD User Get login state query SQLAlchemyError',
+            )
+        except Exception as err:
+            log.error('CRUD User Get login state Unknown Error', exc_info=True)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail='CRUD User Get login state Unknown Error',
+            )
+
     async def update(self, id: UUID, **kwargs) -> Union[UUID, None, Exception]:
         """Update User"""
-        log_message = f'CRUD Update User: id={id}, {kwargs}'
-        log.debug(log_message)
+        log.debug('CRUD Update User: id=%s, fields=%s', id, sorted(kwargs))
         try:
             query = update(User). \
                 where(User.uuid == id). \
                 values(kwargs). \
                 returning(User.uuid)
             res = await self.db_session.execute(query)
-            await self.db_session.commit()
             update_user_id_row = res.fetchone()
             if update_user_id_row is not None:
                 return update_user_id_row[0]
         except exc.SQLAlchemyError as err:
-            log_message = f'Update user error: uuid = {id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Update user error: uuid = %s: %s', id, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='CRUD User Update query SQLAlchemyError',
@@ -141,8 +145,7 @@ class UserDAL(CrudBase):
 
     async def get_by_email(self, email: str) -> Union[User, None, Exception]:
         """Get User by Email"""
-        log_message = f'CRUD Get User by Email: email={email}'
-        log.debug(log_message)
+        log.debug('CRUD Get User by Email: email=%s', email)
         try:
             query = select(User).where(User.email == email)
             res = await self.db_session.execute(query)
@@ -150,9 +153,7 @@ class UserDAL(CrudBase):
             if user_row is not None:
                 return user_row[0]
         except exc.SQLAlchemyError as err:
-            log_message = f'Get user by email error: email = {email}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Get user by email error: email = %s: %s', email, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='CRUD User Get by email query SQLAlchemyError',
@@ -166,8 +167,7 @@ class UserDAL(CrudBase):
 
     async def get_by_login(self, login: str) -> Union[User, None, Exception]:
         """Get User by Login"""
-        log_message = f'CRUD Get User by Login: login={login}'
-        log.debug(log_message)
+        log.debug('CRUD Get User by Login: login=%s', login)
         try:
             query = select(User).where(User.login == login)
             res = await self.db_session.execute(query)
@@ -175,9 +175,7 @@ class UserDAL(CrudBase):
             if user_row is not None:
                 return user_row[0]
         except exc.SQLAlchemyError as err:
-            log_message = f'Get user by login error: login = {login}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Get user by login error: login = %s: %s', login, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='CRUD User Get by login query SQLAlchemyError',
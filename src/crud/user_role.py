@@ -1,9 +1,10 @@
-from sqlalchemy import update, select, exc
+from sqlalchemy import delete, exists, literal, true, update, select, exc
+from sqlalchemy.dialects.postgresql import UUID as PG_UUID, insert
 from fastapi import status, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from uuid import UUID
-from typing import List, Union
+from uuid import UUID, uuid4
+from typing import List, Tuple, Union
 
 import logging.config
 from core.logger import LOGGING
@@ -11,7 +12,7 @@ from core.logger import LOGGING
 logging.config.dictConfig(LOGGING)
 log = logging.getLogger(__name__)
 
-from db.models import UserRole
+from db.models import Role, User, UserRole
 from crud.base_classes import CrudBase
 
 
@@ -28,20 +29,17 @@ class UserRoleDAL(CrudBase):
     async def create(
             self, user_id: UUID, role_id: UUID) -> Union[UserRole, Exception]:
         """Create UserRole"""
-        log_message = f'CRUD Create UserRole: user_id={user_id}, role_id={role_id}'
-        log.debug(log_message)
+        log.debug('CRUD Create UserRole: user_id=%s, role_id=%s', user_id, role_id)
         try:
             new_user_role = UserRole(
                 user_id=user_id,
                 role_id=role_id
             )
             self.db_session.add(new_user_role)
-            await self.db_session.commit()
+            await self.db_session.flush()
             return new_user_role
         except exc.SQLAlchemyError as err:
-            log_message = f'Create user role error: {new_user_role.__dict__}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Create user role error: %s: %s', new_user_role.__dict__, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='Error creating user',
@@ -56,17 +54,14 @@ class UserRoleDAL(CrudBase):
     # удаление записи по uuid
     async def delete(self, uuid: Union[str, UUID]) -> Union[UUID, None, Exception]:
         """Delete UserRole by id"""
-        log_message = f'CRUD Delete UserRole by id: uuid={uuid}'
-        log.debug(log_message)
+        log.debug('CRUD Delete UserRole by id: uuid=%s', uuid)
         try:
             user_role = await self.db_session.get(UserRole, uuid)
             await self.db_session.delete(user_role)
-            await self.db_session.commit()
+            await self.db_session.flush()
             return user_role.uuid
         except exc.SQLAlchemyError as err:
-            log_message = f'Delete user role error: user role uuid = {uuid}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Delete user role error: user role uuid = %s: %s', uuid, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='Error deleting user',
@@ -81,17 +76,14 @@ class UserRoleDAL(CrudBase):
     # удаление записи по user_id предполагается что эта функция будет вызываться в цикле перебора по user_id
     async def delete_by_user_id(self, user_id: Union[str, UUID]) -> Union[UUID, None, Exception]:
         """Delete UserRole by user_id"""
-        log_message = f'CRUD Delete UserRole by user_id: user_id={user_id}'
-        log.debug(log_message)
+        log.debug('CRUD Delete UserRole by user_id: user_id=%s', user_id)
         try:
             user_role = await self.db_session.get(UserRole, user_id)
             await self.db_session.delete(user_role)
-            await self.db_session.commit()
+            await self.db_session.flush()
             return user_role.uuid
         except exc.SQLAlchemyError as err:
-            log_message = f'Delete user role by user id error: user uuid = {user_id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Delete user role by user id error: user uuid = %s: %s', user_id, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='Error deleting user',
@@ -106,17 +98,14 @@ class UserRoleDAL(CrudBase):
     # удаление записи по role_id предполагается что эта функция будет вызываться в цикле перебора по role_id
     async def delete_by_role_id(self, role_id: Union[str, UUID]) -> Union[UUID, None, Exception]:
         """Delete UserRole by role_id"""
-        log_message = f'CRUD Delete UserRole by role_id: role_id={role_id}'
-        log.debug(log_message)
+        log.debug('CRUD Delete UserRole by role_id: role_id=%s', role_id)
         try:
             user_role = await self.db_session.get(UserRole, role_id)
             await self.db_session.delete(user_role)
-            await self.db_session.commit()
+            await self.db_session.flush()
             return user_role.uuid
         except exc.SQLAlchemyError as err:
-            log_message = f'Delete user role by role id error: role uuid = {role_id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Delete user role by role id error: role uuid = %s: %s', role_id, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='Error deleting user',
@@ -130,8 +119,7 @@ class UserRoleDAL(CrudBase):
 
     async def get(self, uuid: UUID) -> Union[UserRole, None, Exception]:
         """Get UserRole by id"""
-        log_message = f'CRUD Get UserRole by id: uuid={uuid}'
-        log.debug(log_message)
+        log.debug('CRUD Get UserRole by id: uuid=%s', uuid)
         try:
             query = select(UserRole).where(UserRole.uuid == uuid)
             res = await self.db_session.execute(query)
@@ -139,16 +127,13 @@ class UserRoleDAL(CrudBase):
             if user_role_row is not None:
                 return user_role_row[0]
         except exc.SQLAlchemyError as err:
-            log_message = f'Get user role error: uuid = {uuid}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Get user role error: uuid = %s: %s', uuid, err)
         except Exception as err:
             log.error('CRUD User_Role Get Unknown Error', exc_info=True)
 
     async def get_by_user_id(self, user_id: UUID) -> Union[List[UserRole], None, Exception]:
         """Get UserRole by user_id"""
-        log_message = f'CRUD Get UserRole by user_id: user_id={user_id}'
-        log.debug(log_message)
+        log.debug('CRUD Get UserRole by user_id: user_id=%s', user_id)
         try:
             query = select(UserRole).where(UserRole.user_id == user_id)
             res = await self.db_session.execute(query)
@@ -156,16 +141,13 @@ class UserRoleDAL(CrudBase):
             if user_role_rows is not None:
                 return [row[0] for row in user_role_rows]
         except exc.SQLAlchemyError as err:
-            log_message = f'Get user role by user id error: user uuid = {user_id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Get user role by user id error: user uuid = %s: %s', user_id, err)
         except Exception as err:
             log.error('CRUD User_Role Get by user_id Unknown Error', exc_info=True)
 
     async def get_by_role_id(self, role_id: UUID) -> Union[List[UserRole], None, Exception]:
         """Get UserRole by role_id"""
-        log_message = f'CRUD Get UserRole by role_id: role_id={role_id}'
-        log.debug(log_message)
+        log.debug('CRUD Get UserRole by role_id: role_id=%s', role_id)
         try:
             query = select(UserRole).where(UserRole.role_id == role_id)
             res = await self.db_session.execute(query)
@@ -173,16 +155,13 @@ class UserRoleDAL(CrudBase):
             if user_role_rows is not None:
                 return [row[0] for row in user_role_rows]
         except exc.SQLAlchemyError as err:
-            log_message = f'Get user role by role id error: role uuid = {role_id}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Get user role by role id error: role uuid = %s: %s', role_id, err)
         except Exception as err:
             log.error('CRUD User_Role Get by role_id Unknown Error', exc_info=True)
 
     async def update(self, uuid: UUID, **kwargs) -> Union[UUID, None, Exception]:
         """Update UserRole"""
-        log_message = f'CRUD Update UserRole: uuid={uuid}, {kwargs}'
-        log.debug(log_message)
+        log.debug('CRUD Update UserRole: uuid=%s, %s', uuid, kwargs)
         try:
             query = update(UserRole). \
                 where(UserRole.uuid == uuid). \
@@ -193,9 +172,7 @@ class UserRoleDAL(CrudBase):
             if update_user_role_id_row is not None:
                 return update_user_role_id_row[0]
         except exc.SQLAlchemyError as err:
-            log_message = f'Update user role error: uuid = {uuid}'
-            log.error(log_message)
-            log.error(err)
+            log.error('Update user role error: uuid = %s: %s', uuid, err)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='Error updating user',
@@ -206,3 +183,65 @@ class UserRoleDAL(CrudBase):
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail='Error updating user',
             )
+
+    async def _change(self, change, user_id: UUID, role_id: UUID) -> Tuple[bool, bool]:
+        """Run the change of user_role together with User and Role existence checks in one statement"""
+        user = select(User.uuid).where(User.uuid == user_id).cte('target_user')
+        role = select(Role.uuid).where(Role.uuid == role_id).cte('target_role')
+        changed = change(user, role).cte('changed')
+        query = select(exists(user.select()), exists(role.select()), exists(changed.select()))
+        res = await self.db_session.execute(query)
+        user_exists, role_exists, _ = res.one()
+        return user_exists, role_exists
+
+    async def assign(self, user_id: UUID, role_id: UUID) -> Tuple[bool, bool]:
+        """Assign Role to User if both exist, returns (user exists, role exists)"""
+        log.debug('CRUD Assign UserRole: user_id=%s, role_id=%s', user_id, role_id)
+
+        def change(user, role):
+            # повторное назначение ничего не меняет
+            return insert(UserRole). \
+                from_select(['uuid', 'user_id', 'role_id'],
+                            select(literal(uuid4(), PG_UUID(as_uuid=True)), user.c.uuid, role.c.uuid).
+                            select_from(user.join(role, true()))). \
+                on_conflict_do_nothing(index_elements=['user_id', 'role_id']). \
+                returning(UserRole.uuid)
+
+        try:
+            return await self._change(change, user_id, role_id)
+        except exc.SQLAlchemyError as err:
+            log.error('Assign user role error: user uuid = %s; role uuid = %s: %s', user_id, role_id, err)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail='Error creating user role',
+            )
+        except Exception as err:
+            log.error('CRUD User_Role Assign Unknown Error', exc_info=True)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail='Error creating user role',
+            )
+
+    async def unassign(self, user_id: UUID, role_id: UUID) -> Tuple[bool, bool]:
+        """Remove Role from User, returns (user exists, role exists)"""
+        log.debug('CRUD Unassign UserRole: user_id=%s, role_id=%s', user_id, role_id)
+
+        def change(user, role):
+            return delete(UserRole). \
+                where(UserRole.user_id == user_id, UserRole.role_id == role_id). \
+                returning(UserRole.uuid)
+
+        try:
+            return await self._change(change, user_id, role_id)
+        except exc.SQLAlchemyError as err:
+            log.error('Unassign user role error: user uuid = %s; role uuid = %s: %s', user_id, role_id, err)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail='Error deleting user role',
+            )
+        except Exception as err:
+            log.error('CRUD User_Role Unassign Unknown Error', exc_info=True)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail='Error deleting user role',
+            )
@@ -0,0 +1,228 @@
+import asyncio
+import logging.config
+import os
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from core.config import entry_partition_settings
+from core.logger import LOGGING
+
+logging.config.dictConfig(LOGGING)
+log = logging.getLogger(__name__)
+
+PARENT_TABLE = 'entry'
+PARTITION_PREFIX = 'entry_p'
+DEFAULT_PARTITION = 'entry_default'
+# ключ advisory lock: задача запускается в каждом воркере, работает только один
+LOCK_KEY = 0x656E747279  # 'entry'
+
+
+def month_start(moment: datetime) -> datetime:
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(month: datetime, months: int) -> datetime:
+    year, month_index = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return month.replace(year=year, month=month_index + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f'{PARTITION_PREFIX}{month:%Y%m}'
+
+
+def partition_month(name: str) -> Optional[datetime]:
+    """Month of a partition by its name, None for foreign tables"""
+    try:
+        return datetime.strptime(name[len(PARTITION_PREFIX):], '%Y%m')
+    except ValueError:
+        return None
+
+
+class EntryPartitionManager:
+    """
+    Monthly partitions of the login history.
+    Создает секции на premake месяцев вперед, а секции старше retention месяцев
+    отсоединяет, при необходимости выгружает в CSV и удаляет. Отсоединенная, но не
+    удаленная секция (например, выгрузка упала) будет обработана при следующем запуске.
+    """
+
+    def __init__(self,
+                 premake: int,
+                 retention: int,
+                 archive: bool,
+                 archive_dir: str,
+                 interval: float,
+                 ) -> None:
+        self.premake = premake
+        self.retention = retention
+        self.archive = archive
+        self.archive_dir = archive_dir
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def _attached(self, conn: AsyncConnection) -> List[str]:
+        res = await conn.execute(text("""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = CAST(:parent AS regclass)
+        """), {'parent': PARENT_TABLE})
+        return [name for name, in res]
+
+    async def _detached(self, conn: AsyncConnection) -> List[str]:
+        res = await conn.execute(text("""
+            SELECT relname FROM pg_class
+            WHERE relkind = 'r' AND NOT relispartition AND relname LIKE :prefix
+        """), {'prefix': f'{PARTITION_PREFIX}%'})
+        return [name for name, in res]
+
+    async def _has_default_rows(self, conn: AsyncConnection, start: datetime, end: datetime) -> bool:
+        res = await conn.execute(text(
+            f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE date_time >= :start AND date_time < :end)'
+        ), {'start': start, 'end': end})
+        return bool(res.scalar())
+
+    async def _create_partition(self, conn: AsyncConnection, month: datetime, move_default_rows: bool) -> None:
+        name = partition_name(month)
+        bounds = f"FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+        if not move_default_rows:
+            await conn.execute(text(
+                f'CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} FOR VALUES {bounds}'
+            ))
+            return
+        # строки месяца уже попали в секцию по умолчанию, и PostgreSQL не создаст секцию поверх них:
+        # секция по умолчанию отсоединяется, строки переносятся, и она присоединяется обратно.
+        # Один DO-блок - одна транзакция даже на соединении в AUTOCOMMIT
+        condition = f"date_time >= '{month.isoformat()}' AND date_time < '{add_months(month, 1).isoformat()}'"
+        await conn.execute(text(f"""
+            DO $$
+            BEGIN
+                ALTER TABLE {PARENT_TABLE} DETACH PARTITION {DEFAULT_PARTITION};
+                CREATE TABLE {name} PARTITION OF {PARENT_TABLE} FOR VALUES {bounds};
+                INSERT INTO {name} SELECT * FROM {DEFAULT_PARTITION} WHERE {condition};
+                DELETE FROM {DEFAULT_PARTITION} WHERE {condition};
+                ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT;
+            END $$
+        """))
+        log.info('Partition %s created from rows of %s', name, DEFAULT_PARTITION)
+
+    async def ensure_partitions(self, conn: AsyncConnection, now: datetime) -> List[str]:
+        """Create partitions from the current month up to premake months ahead"""
+        attached = set(await self._attached(conn))
+        has_default = DEFAULT_PARTITION in attached
+        created = []
+        current = month_start(now)
+        for offset in range(self.premake + 1):
+            month = add_months(current, offset)
+            name = partition_name(month)
+            if name in attached:
+                continue
+            try:
+                move = has_default and await self._has_default_rows(conn, month, add_months(month, 1))
+                await self._create_partition(conn, month, move)
+            except exc.DBAPIError:
+                # секция будет создана при следующем запуске
+                log.error('Create partition %s error', name, exc_info=True)
+                continue
+            created.append(name)
+        if not has_default:
+            await conn.execute(text(
+                f'CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT'
+            ))
+        return created
+
+    async def _archive(self, conn: AsyncConnection, name: str) -> None:
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f'{name}.csv')
+        raw = await conn.get_raw_connection()
+        # COPY стримит секцию в файл, не загружая строки в память
+        await raw.driver_connection.copy_from_table(name, output=path, format='csv', header=True)
+        log.info('Partition %s archived to %s', name, path)
+
+    async def _expire_default_rows(self, conn: AsyncConnection, cutoff: datetime) -> int:
+        """Rows of the default partition older than retention, monthly partitions never cover them"""
+        if not await self._has_default_rows(conn, datetime.min, cutoff):
+            return 0
+        if self.archive:
+            os.makedirs(self.archive_dir, exist_ok=True)
+            path = os.path.join(self.archive_dir, f'{DEFAULT_PARTITION}_before_{cutoff:%Y%m}.csv')
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.copy_from_query(
+                f'SELECT * FROM {DEFAULT_PARTITION} WHERE date_time < $1', cutoff,
+                output=path, format='csv', header=True,
+            )
+            log.info('Rows of %s before %s archived to %s', DEFAULT_PARTITION, cutoff, path)
+        res = await conn.execute(text(f'DELETE FROM {DEFAULT_PARTITION} WHERE date_time < :cutoff'),
+                                 {'cutoff': cutoff})
+        log.info('Rows of %s before %s deleted: %s', DEFAULT_PARTITION, cutoff, res.rowcount)
+        return res.rowcount
+
+    async def expire_partitions(self, conn: AsyncConnection, now: datetime) -> List[str]:
+        """Detach, archive and drop partitions older than retention"""
+        if self.retention <= 0:
+            return []
+        cutoff = add_months(month_start(now), -self.retention)
+        expired = []
+        attached = await self._attached(conn)
+        if DEFAULT_PARTITION in attached and await self._expire_default_rows(conn, cutoff):
+            expired.append(DEFAULT_PARTITION)
+        for name in attached:
+            month = partition_month(name)
+            if month is not None and add_months(month, 1) <= cutoff:
+                await conn.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}'))
+                log.info('Partition %s detached', name)
+        for name in await self._detached(conn):
+            month = partition_month(name)
+            if month is None or add_months(month, 1) > cutoff:
+                continue
+            if self.archive:
+                await self._archive(conn, name)
+            await conn.execute(text(f'DROP TABLE {name}'))
+            log.info('Partition %s dropped', name)
+            expired.append(name)
+        return expired
+
+    async def run_once(self, engine: AsyncEngine, now: Optional[datetime] = None) -> None:
+        now = now or datetime.utcnow()
+        async with engine.connect() as conn:
+            # DDL каждой секции фиксируется сразу, без долгой общей транзакции
+            await conn.execution_options(isolation_level='AUTOCOMMIT')
+            locked = (await conn.execute(text('SELECT pg_try_advisory_lock(:key)'), {'key': LOCK_KEY})).scalar()
+            if not locked:
+                return
+            try:
+                created = await self.ensure_partitions(conn, now)
+                expired = await self.expire_partitions(conn, now)
+                log.info('Entry partitions maintained: created=%s, expired=%s', created, expired)
+            finally:
+                await conn.execute(text('SELECT pg_advisory_unlock(:key)'), {'key': LOCK_KEY})
+
+    async def _run(self, engine: AsyncEngine) -> None:
+        while True:
+            try:
+                await self.run_once(engine)
+            except Exception:
+                log.error('Entry partitions maintenance error', exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    def start(self, engine: AsyncEngine) -> None:
+        self._task = asyncio.create_task(self._run(engine))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+entry_partitions = EntryPartitionManager(entry_partition_settings.premake,
+                                         entry_partition_settings.retention,
+                                         entry_partition_settings.archive,
+                                         entry_partition_settings.archive_dir,
+                                         entry_partition_settings.interval,
+                                         )
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import Column, Boolean, String, ForeignKey, DateTime
+from sqlalchemy import Column, Boolean, String, ForeignKey, DateTime, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import declarative_base, relationship
 
@@ -47,18 +47,30 @@ class Role(Base):
 
 class Entry(Base):
     __tablename__ = 'entry'
+    __table_args__ = (
+        Index('ix_entry_user_id_is_active', 'user_id', 'is_active'),
+        Index('ix_entry_user_agent_active', 'user_agent', postgresql_where=text('is_active')),
+        Index('ix_entry_user_id_date_time_uuid', 'user_id', text('date_time DESC'), text('uuid DESC')),
+        # секции по месяцам, создаются и удаляются db.entry_partitions
+        {'postgresql_partition_by': 'RANGE (date_time)'},
+    )
 
     uuid = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey(User.uuid, onupdate="CASCADE", ondelete="CASCADE"), nullable=False)
-    user_agent = Column(String(100))
-    date_time = Column(DateTime, default=datetime.utcnow, nullable=False)
-    refresh_token = Column(String(100))
+    user_agent = Column(String())
+    # ключ секционирования должен входить в первичный ключ
+    date_time = Column(DateTime, default=datetime.utcnow, primary_key=True)
+    refresh_token = Column(String())
     is_active = Column(Boolean(), default=True)
     user = relationship("User", back_populates="entries")
 
 
 class UserRole(Base):
     __tablename__ = 'user_role'
+    __table_args__ = (
+        Index('uq_user_role_user_id_role_id', 'user_id', 'role_id', unique=True),
+        Index('ix_user_role_role_id', 'role_id'),
+    )
 
     uuid = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey(User.uuid, onupdate="CASCADE", ondelete="CASCADE"), nullable=False)
@@ -69,6 +81,10 @@ class UserRole(Base):
 
 class UserSocial(Base):
     __tablename__ = 'user_socials'
+    __table_args__ = (
+        Index('uq_user_socials_provider_sub_id', 'provider', 'sub_id', unique=True),
+        Index('ix_user_socials_user_id', 'user_id'),
+    )
 
     uuid = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey(User.uuid), nullable=False)
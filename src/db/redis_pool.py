@@ -0,0 +1,66 @@
+from typing import Optional
+
+from redis.asyncio import ConnectionPool, Redis
+from redis.asyncio.connection import Connection
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from core import metrics
+from core.config import redis_settings
+
+##########################################
+# BLOCK WITH SHARED REDIS CONNECTION POOL #
+##########################################
+
+
+class MeteredConnectionPool(ConnectionPool):
+    """Connection pool that exports connections in use and opened, and failures on exhaustion"""
+
+    def _report(self) -> None:
+        metrics.REDIS_POOL_IN_USE.set(len(self._in_use_connections))
+        metrics.REDIS_POOL_CREATED.set(self._created_connections)
+
+    async def get_connection(self, command_name, *keys, **options) -> Connection:
+        try:
+            connection = await super().get_connection(command_name, *keys, **options)
+        except RedisConnectionError:
+            if not self._available_connections and self._created_connections >= self.max_connections:
+                # пул не ждет свободного соединения, а сразу отказывает
+                metrics.REDIS_POOL_EXHAUSTED.inc()
+            raise
+        finally:
+            self._report()
+        return connection
+
+    async def release(self, connection: Connection) -> None:
+        await super().release(connection)
+        self._report()
+
+
+# один пул на воркер для хранилища токенов и rate limit, создается в lifespan приложения
+redis_pool: Optional[ConnectionPool] = None
+
+
+def init_redis() -> None:
+    global redis_pool
+    redis_pool = MeteredConnectionPool(host=redis_settings.host,
+                                       port=redis_settings.port,
+                                       password=redis_settings.password.get_secret_value(),
+                                       max_connections=redis_settings.max_connections,
+                                       health_check_interval=redis_settings.health_check_interval,
+                                       socket_timeout=redis_settings.socket_timeout,
+                                       socket_connect_timeout=redis_settings.socket_connect_timeout,
+                                       )
+
+
+async def close_redis() -> None:
+    global redis_pool
+    if redis_pool is not None:
+        await redis_pool.disconnect()
+        redis_pool = None
+
+
+def get_redis() -> Redis:
+    """Client bound to the shared pool, cheap to create"""
+    if redis_pool is None:
+        raise RuntimeError('Redis pool is not initialized')
+    return Redis(connection_pool=redis_pool)
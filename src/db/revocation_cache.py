@@ -0,0 +1,198 @@
+import asyncio
+import hashlib
+import logging.config
+import math
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from redis.asyncio import Redis
+
+from core.config import revocation_cache_settings
+from core.logger import LOGGING
+
+logging.config.dictConfig(LOGGING)
+log = logging.getLogger(__name__)
+
+REVOKED_CHANNEL = 'revoked_tokens'
+REVOKED_KEY_PREFIX = 'revoked:'
+REVOKED_USERS_CHANNEL = 'revoked_users'
+# отметка "токены пользователя, выпущенные до этого момента, отозваны"
+REVOKED_BEFORE_KEY_PREFIX = 'revoked_before:'
+
+
+def token_digest(token: str) -> bytes:
+    """Fixed-size fingerprint of a token"""
+    return hashlib.blake2b(token.encode('utf-8'), digest_size=16).digest()
+
+
+class BloomFilter:
+    """Set of digests without false negatives"""
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, digest: bytes):
+        # двойное хеширование: обе половины дайджеста уже равномерно распределены
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:16], 'big') | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, digest: bytes) -> None:
+        for position in self._positions(digest):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, digest: bytes) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(digest))
+
+
+class RevocationCache:
+    """
+    Per-worker view of revoked tokens.
+    Пока подписка на канал отзыва жива, отсутствие дайджеста в bloom-фильтре
+    означает, что токен не отозван, и Redis не спрашиваем. Если подписка упала,
+    используется короткий TTL-кеш проверенных токенов.
+    """
+
+    RETRY_MIN = 1.0  # sec, пауза перед повторной подпиской, растет вдвое до RETRY_MAX
+    RETRY_MAX = 30.0
+
+    def __init__(self,
+                 capacity: int,
+                 error_rate: float,
+                 negative_ttl: float,
+                 negative_size: int,
+                 rebuild_interval: float,
+                 ) -> None:
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.negative_ttl = negative_ttl
+        self.negative_size = negative_size
+        self.rebuild_interval = rebuild_interval
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._negative: OrderedDict[bytes, float] = OrderedDict()
+        self._revoked_before: Dict[str, float] = {}
+        self._live = False
+        self._redis: Optional[Redis] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def live(self) -> bool:
+        return self._live
+
+    def is_known_valid(self, digest: bytes) -> bool:
+        """True when the token is certainly not revoked and Redis can be skipped"""
+        if self._live and digest not in self._bloom:
+            return True
+        expires_at = self._negative.get(digest)
+        if expires_at is None:
+            return False
+        if expires_at < time.monotonic():
+            self._negative.pop(digest, None)
+            return False
+        return True
+
+    def remember_valid(self, digest: bytes) -> None:
+        self._negative[digest] = time.monotonic() + self.negative_ttl
+        self._negative.move_to_end(digest)
+        while len(self._negative) > self.negative_size:
+            self._negative.popitem(last=False)
+
+    def mark_revoked(self, digest: bytes) -> None:
+        self._bloom.add(digest)
+        self._negative.pop(digest, None)
+
+    def user_revoked_before(self, user_id: str) -> Optional[float]:
+        """User revocation timestamp, only meaningful while the cache is live"""
+        return self._revoked_before.get(user_id)
+
+    def mark_user_revoked(self, user_id: str, revoked_before: float) -> None:
+        self._revoked_before[user_id] = max(revoked_before, self._revoked_before.get(user_id, 0))
+
+    def _on_message(self, message: dict) -> None:
+        if message['channel'] == REVOKED_USERS_CHANNEL.encode('utf-8'):
+            user_id, revoked_before = message['data'].decode('utf-8').split(':')
+            self.mark_user_revoked(user_id, float(revoked_before))
+        else:
+            self.mark_revoked(message['data'])
+
+    async def _rebuild(self) -> None:
+        """Bloom filter cannot forget expired tokens, so it is rebuilt from Redis periodically"""
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        prefix_len = len(REVOKED_KEY_PREFIX)
+        async for key in self._redis.scan_iter(match=f'{REVOKED_KEY_PREFIX}*', count=1000):
+            bloom.add(key[prefix_len:])
+
+        revoked_before = {}
+        keys = [key async for key in self._redis.scan_iter(match=f'{REVOKED_BEFORE_KEY_PREFIX}*', count=1000)]
+        for start in range(0, len(keys), 1000):
+            chunk = keys[start:start + 1000]
+            for key, value in zip(chunk, await self._redis.mget(chunk)):
+                if value is not None:
+                    revoked_before[key[len(REVOKED_BEFORE_KEY_PREFIX):].decode('utf-8')] = float(value)
+
+        self._bloom = bloom
+        self._revoked_before = revoked_before
+
+    async def _listen(self) -> None:
+        pubsub = self._redis.pubsub()
+        try:
+            # сначала подписка, потом загрузка: отзывы во время загрузки не потеряются
+            await pubsub.subscribe(REVOKED_CHANNEL, REVOKED_USERS_CHANNEL)
+            await self._rebuild()
+            rebuilt_at = time.monotonic()
+            self._live = True
+            log.info('Revocation cache is live')
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is not None:
+                    try:
+                        self._on_message(message)
+                    except (ValueError, TypeError):
+                        log.warning('Malformed revocation message: %r', message.get('data'))
+                if time.monotonic() - rebuilt_at > self.rebuild_interval:
+                    await self._rebuild()
+                    rebuilt_at = time.monotonic()
+        finally:
+            self._live = False
+            await pubsub.close()
+
+    async def _run(self) -> None:
+        """Keep the subscription alive, any failure only pauses it"""
+        delay = self.RETRY_MIN
+        while True:
+            started = time.monotonic()
+            try:
+                await self._listen()
+            except Exception:
+                # CancelledError не Exception: остановка приложения сюда не попадает
+                log.warning('Revocation cache subscription lost, falling back to Redis', exc_info=True)
+            if time.monotonic() - started > self.RETRY_MAX:
+                # подписка долго работала - это новый сбой, а не серия
+                delay = self.RETRY_MIN
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.RETRY_MAX)
+
+    def start(self, redis: Redis) -> None:
+        self._redis = redis
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+revocation_cache = RevocationCache(revocation_cache_settings.capacity,
+                                   revocation_cache_settings.error_rate,
+                                   revocation_cache_settings.negative_ttl,
+                                   revocation_cache_settings.negative_size,
+                                   revocation_cache_settings.rebuild_interval,
+                                   )
@@ -0,0 +1,166 @@
+import logging.config
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import orjson
+from redis.exceptions import RedisError
+
+from core import metrics
+from core.config import role_cache_settings
+from core.logger import LOGGING
+from db.redis_pool import get_redis
+
+logging.config.dictConfig(LOGGING)
+log = logging.getLogger(__name__)
+
+VERSION_KEY = 'role_cache:version'
+USER_VERSION_KEY = 'role_cache:user:{user_id}:version'
+USER_KIND = 'user'
+CATALOGUE_KIND = 'catalogue'
+
+
+class RoleCache:
+    """
+    Two-tier cache of user role ids and the role catalogue (role id -> name).
+    Ключи содержат версии: изменение справочника ролей увеличивает общую версию,
+    назначение или снятие роли - только версию пользователя, и старые записи
+    в обоих уровнях просто перестают читаться. Версии воркер перечитывает
+    из Redis не чаще раза в version_ttl секунд.
+    """
+
+    def __init__(self,
+                 enabled: bool,
+                 local_ttl: float,
+                 local_size: int,
+                 redis_ttl: int,
+                 version_ttl: float,
+                 ) -> None:
+        self.enabled = enabled
+        self.local_ttl = local_ttl
+        self.local_size = local_size
+        self.redis_ttl = redis_ttl
+        self.version_ttl = version_ttl
+        self._local: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        self._versions: OrderedDict[str, Tuple[float, int]] = OrderedDict()
+
+    async def _get_versions(self, *keys: str) -> List[int]:
+        now = time.monotonic()
+        versions = {}
+        for key in keys:
+            item = self._versions.get(key)
+            if item is not None and item[0] > now:
+                self._versions.move_to_end(key)
+                versions[key] = item[1]
+        stale = [key for key in keys if key not in versions]
+        if stale:
+            # все устаревшие версии одним запросом
+            for key, version in zip(stale, await get_redis().mget(stale)):
+                versions[key] = int(version or 0)
+                self._set_version(key, versions[key], now)
+        return [versions[key] for key in keys]
+
+    def _set_version(self, key: str, version: int, now: float) -> None:
+        self._versions[key] = (now + self.version_ttl, version)
+        self._versions.move_to_end(key)
+        while len(self._versions) > self.local_size:
+            self._versions.popitem(last=False)
+
+    def _get_local(self, key: str) -> Optional[Any]:
+        item = self._local.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            self._local.pop(key, None)
+            return None
+        self._local.move_to_end(key)
+        return value
+
+    def _put_local(self, key: str, value: Any) -> None:
+        self._local[key] = (time.monotonic() + self.local_ttl, value)
+        self._local.move_to_end(key)
+        while len(self._local) > self.local_size:
+            self._local.popitem(last=False)
+
+    async def _get(self,
+                   kind: str,
+                   name: str,
+                   version_keys: List[str],
+                   loader: Callable[[], Awaitable[Any]],
+                   ) -> Any:
+        if not self.enabled:
+            return await loader()
+        try:
+            versions = await self._get_versions(*version_keys)
+        except RedisError:
+            log.warning('Role cache version is unavailable, reading roles from db', exc_info=True)
+            metrics.ROLE_CACHE_LOOKUPS.labels(kind, 'db').inc()
+            return await loader()
+
+        redis_key = 'role_cache:{}:{}'.format(name, ':'.join(map(str, versions)))
+        value = self._get_local(redis_key)
+        if value is not None:
+            metrics.ROLE_CACHE_LOOKUPS.labels(kind, 'local').inc()
+            return value
+
+        try:
+            cached = await get_redis().get(redis_key)
+        except RedisError:
+            log.warning('Role cache get error: %s', redis_key, exc_info=True)
+            cached = None
+        if cached is not None:
+            value = orjson.loads(cached)
+            metrics.ROLE_CACHE_LOOKUPS.labels(kind, 'redis').inc()
+        else:
+            value = await loader()
+            if value is None:
+                # отсутствие (например, несуществующий пользователь) не кешируется
+                return None
+            metrics.ROLE_CACHE_LOOKUPS.labels(kind, 'db').inc()
+            try:
+                await get_redis().set(redis_key, orjson.dumps(value), ex=self.redis_ttl)
+            except RedisError:
+                log.warning('Role cache set error: %s', redis_key, exc_info=True)
+        self._put_local(redis_key, value)
+        return value
+
+    async def get_user_role_ids(self,
+                                user_id: str,
+                                loader: Callable[[], Awaitable[Optional[List[str]]]],
+                                ) -> Optional[List[str]]:
+        """Role ids of the user, loader is called on a miss in both tiers"""
+        # общая версия тоже входит в ключ: удаление роли снимает ее со всех пользователей
+        version_keys = [VERSION_KEY, USER_VERSION_KEY.format(user_id=user_id)]
+        return await self._get(USER_KIND, f'{USER_KIND}:{user_id}', version_keys, loader)
+
+    async def get_catalogue(self, loader: Callable[[], Awaitable[Dict[str, str]]]) -> Dict[str, str]:
+        """All roles as role id -> name"""
+        return await self._get(CATALOGUE_KIND, CATALOGUE_KIND, [VERSION_KEY], loader)
+
+    async def _bump(self, version_key: str) -> None:
+        if not self.enabled:
+            return
+        try:
+            version = await get_redis().incr(version_key)
+            self._set_version(version_key, version, time.monotonic())
+        except RedisError:
+            # старые записи доживут до local_ttl / redis_ttl
+            log.error('Role cache invalidation error: %s', version_key, exc_info=True)
+
+    async def invalidate(self) -> None:
+        """Bump the common version, called after a change of the role catalogue is committed"""
+        self._local.clear()
+        await self._bump(VERSION_KEY)
+
+    async def invalidate_user(self, user_id: str) -> None:
+        """Bump the version of one user, called after a role is assigned to or removed from the user"""
+        await self._bump(USER_VERSION_KEY.format(user_id=user_id))
+
+
+role_cache = RoleCache(role_cache_settings.enabled,
+                       role_cache_settings.local_ttl,
+                       role_cache_settings.local_size,
+                       role_cache_settings.redis_ttl,
+                       role_cache_settings.version_ttl,
+                       )
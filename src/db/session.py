@@ -1,19 +1,78 @@
-from typing import AsyncGenerator
+import time
+from typing import AsyncGenerator, Optional
 
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+import sqlalchemy.ext.asyncio
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
 
+from core import metrics
 from core.config import user_db_settings
 
 #############################################
 # BLOCK FOR COMMON INTERATION WITH DATABASE #
 #############################################
 
-# create async engine for interaction with database
-engine = create_async_engine(user_db_settings.async_url, future=True, echo=False)
 
-# create session for interaction with database
-async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+class MeteredPool(AsyncAdaptedQueuePool):
+    """Queue pool that exports checked out and overflow connections and the wait for a connection"""
+
+    def _report(self) -> None:
+        metrics.DB_POOL_CHECKED_OUT.set(self.checkedout())
+        metrics.DB_POOL_OVERFLOW.set(max(self.overflow(), 0))
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        started = time.monotonic()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            metrics.DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            metrics.DB_POOL_WAIT.observe(time.monotonic() - started)
+        self._report()
+        return record
+
+    def _do_return_conn(self, record: ConnectionPoolEntry) -> None:
+        super()._do_return_conn(record)
+        self._report()
+
+
+# один engine на воркер, создается и закрывается в lifespan приложения (core.container)
+engine: Optional[AsyncEngine] = None
+
+# create session for interaction with database, bound to the engine in init_engine
+async_session = sessionmaker(expire_on_commit=False, class_=AsyncSession)
+
+
+def init_engine() -> AsyncEngine:
+    global engine
+    # через модуль: SQLAlchemyInstrumentor (core.tracer) подменяет create_async_engine после импорта
+    engine = sqlalchemy.ext.asyncio.create_async_engine(user_db_settings.async_url,
+                                                        poolclass=MeteredPool,
+                                                        pool_size=user_db_settings.pool_size,
+                                                        max_overflow=user_db_settings.max_overflow,
+                                                        pool_timeout=user_db_settings.pool_timeout,
+                                                        pool_recycle=user_db_settings.pool_recycle,
+                                                        pool_pre_ping=user_db_settings.pool_pre_ping,
+                                                        echo=user_db_settings.echo,
+                                                        )
+    async_session.configure(bind=engine)
+    return engine
+
+
+async def close_engine() -> None:
+    global engine
+    if engine is not None:
+        await engine.dispose()
+        engine = None
+
+
+def get_engine() -> AsyncEngine:
+    if engine is None:
+        raise RuntimeError('Database engine is not initialized')
+    return engine
 
 
 async def get_db() -> AsyncGenerator:
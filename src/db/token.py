@@ -1,16 +1,22 @@
 from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Optional
 
 import backoff
+from opentelemetry import trace
 from redis.asyncio import Redis
 from redis.exceptions import ConnectionError as RedisConnectionError
 
-from core.config import redis_settings
+from core.tracer import traced
+from models.token import ms_timestamp
+from db.revocation_cache import REVOKED_CHANNEL, REVOKED_KEY_PREFIX, REVOKED_USERS_CHANNEL, \
+    REVOKED_BEFORE_KEY_PREFIX, revocation_cache, token_digest
 
 
 class TokenDBBase(ABC):
 
     @abstractmethod
-    async def put(self, token: str, user_id: str, expire_in_sec: int) -> None:
+    async def put(self, token: str, expire_in_sec: int) -> None:
         """Add token to token db"""
         pass
 
@@ -19,34 +25,100 @@ class TokenDBBase(ABC):
         """Check token is exists"""
         pass
 
+    @abstractmethod
+    async def revoke_user_before(self, user_id: str, issued_before: datetime, expire_in_sec: int) -> None:
+        """Revoke all user tokens issued before the timestamp"""
+        pass
+
+    @abstractmethod
+    async def get_user_revoked_before(self, user_id: str) -> Optional[float]:
+        """Get the user revocation timestamp"""
+        pass
+
 
 class TokenDB(TokenDBBase):
-    def __init__(self, host: str, port: int, password: str) -> None:
-        self.redis = Redis(host=host, port=port, password=password)
+    def __init__(self, redis: Optional[Redis] = None) -> None:
+        self._redis = redis
 
+    def bind(self, redis: Optional[Redis]) -> None:
+        """Attach the client of the shared pool, done once at startup"""
+        self._redis = redis
+
+    @property
+    def redis(self) -> Redis:
+        if self._redis is None:
+            raise RuntimeError('Token db is not bound to redis')
+        return self._redis
+
+    @traced(attributes={'db.system': 'redis', 'db.redis.commands': 'SET PUBLISH'})
     @backoff.on_exception(backoff.expo,
                           (RedisConnectionError),
                           max_tries=5,
                           raise_on_giveup=True,
                           )
-    async def put(self, token: str, user_id: str, expire_in_sec: int) -> None:
-        print(token, user_id, expire_in_sec)
-        await self.redis.set(token, user_id, expire_in_sec)
+    async def put(self, token: str, expire_in_sec: int) -> None:
+        if expire_in_sec <= 0:
+            # токен уже истек сам, хранить его незачем
+            return
+        digest = token_digest(token)
+        # ключ - 16-байтовый дайджест вместо полного JWT, значение не нужно
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.set(REVOKED_KEY_PREFIX.encode('utf-8') + digest, b'', ex=expire_in_sec)
+        pipe.publish(REVOKED_CHANNEL, digest)
+        await pipe.execute()
+        revocation_cache.mark_revoked(digest)
 
+    @traced(attributes={'db.system': 'redis', 'db.redis.commands': 'EXISTS'})
     @backoff.on_exception(backoff.expo,
                           (RedisConnectionError),
                           max_tries=5,
                           raise_on_giveup=True,
                           )
     async def is_exist(self, token: str) -> bool:
-        is_exist = await self.redis.exists(token)
-        return is_exist
+        digest = token_digest(token)
+        if revocation_cache.is_known_valid(digest):
+            # ответ из локального кеша, запроса в redis нет
+            trace.get_current_span().set_attribute('revocation_cache.hit', True)
+            return False
+        is_exist = await self.redis.exists(REVOKED_KEY_PREFIX.encode('utf-8') + digest)
+        if not is_exist:
+            revocation_cache.remember_valid(digest)
+        return bool(is_exist)
+
+    @traced(attributes={'db.system': 'redis', 'db.redis.commands': 'SET PUBLISH'})
+    @backoff.on_exception(backoff.expo,
+                          (RedisConnectionError),
+                          max_tries=5,
+                          raise_on_giveup=True,
+                          )
+    async def revoke_user_before(self, user_id: str, issued_before: datetime, expire_in_sec: int) -> None:
+        # с точностью до мс: токен, выпущенный в ту же секунду после отзыва, остается действительным
+        revoked_before = ms_timestamp(issued_before)
+        pipe = self.redis.pipeline(transaction=False)
+        # отметка живет не дольше самого долгоживущего токена
+        pipe.set(f'{REVOKED_BEFORE_KEY_PREFIX}{user_id}', revoked_before, ex=expire_in_sec)
+        pipe.publish(REVOKED_USERS_CHANNEL, f'{user_id}:{revoked_before}')
+        await pipe.execute()
+        revocation_cache.mark_user_revoked(user_id, revoked_before)
+
+    @traced(attributes={'db.system': 'redis', 'db.redis.commands': 'GET'})
+    @backoff.on_exception(backoff.expo,
+                          (RedisConnectionError),
+                          max_tries=5,
+                          raise_on_giveup=True,
+                          )
+    async def get_user_revoked_before(self, user_id: str) -> Optional[float]:
+        if revocation_cache.live:
+            trace.get_current_span().set_attribute('revocation_cache.hit', True)
+            return revocation_cache.user_revoked_before(user_id)
+        revoked_before = await self.redis.get(f'{REVOKED_BEFORE_KEY_PREFIX}{user_id}')
+        if revoked_before is not None:
+            return float(revoked_before)
+
+
+# один на воркер, клиент общего пула привязывается в lifespan приложения (core.container)
+token_db = TokenDB()
 
 
-@backoff.on_exception(backoff.expo,
-                      (RedisConnectionError),
-                      max_tries=5,
-                      raise_on_giveup=True,
-                      )
-async def get_token_db() -> TokenDBBase:
-    return TokenDB(redis_settings.host, redis_settings.port, redis_settings.password.get_secret_value())
+def get_token_db() -> TokenDBBase:
+    return token_db
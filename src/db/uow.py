@@ -0,0 +1,45 @@
+import logging.config
+from typing import Awaitable, Callable, List
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.logger import LOGGING
+
+logging.config.dictConfig(LOGGING)
+log = logging.getLogger(__name__)
+
+
+class UnitOfWork:
+    """
+    One transaction per service call.
+    DAL только отправляют запросы (flush), фиксирует транзакцию единица работы
+    при выходе из блока, при исключении - откатывает. Вложенные блоки (например,
+    logout внутри смены пароля) работают в транзакции внешнего, фиксирует самый внешний.
+    Побочные эффекты вне БД (отметки в Redis) откладываются до успешного commit через after_commit.
+    """
+
+    def __init__(self, session: AsyncSession) -> None:
+        self.session = session
+        self._depth = 0
+        self._after_commit: List[Callable[[], Awaitable[None]]] = []
+
+    def after_commit(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """Run the callback once the outermost block has committed, drop it on rollback"""
+        self._after_commit.append(callback)
+
+    async def __aenter__(self) -> AsyncSession:
+        self._depth += 1
+        return self.session
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self._depth -= 1
+        if self._depth:
+            return
+        callbacks, self._after_commit = self._after_commit, []
+        if exc_type is None:
+            await self.session.commit()
+            for callback in callbacks:
+                await callback()
+        else:
+            log.debug('Rollback unit of work: %s', exc_type.__name__)
+            await self.session.rollback()
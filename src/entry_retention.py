@@ -0,0 +1,24 @@
+import argparse
+import asyncio
+from datetime import datetime
+
+from db.entry_partitions import entry_partitions
+from db.session import init_engine, close_engine
+
+
+async def main(now: datetime) -> None:
+    engine = init_engine()
+    try:
+        await entry_partitions.run_once(engine, now)
+    finally:
+        await close_engine()
+
+
+if __name__ == '__main__':
+    # разовый запуск обслуживания секций entry, например из cron при ENTRY_PARTITION_ENABLED=false
+    parser = argparse.ArgumentParser(description="Create upcoming and drop expired partitions of entry table")
+    parser.add_argument('--now', type=datetime.fromisoformat, default=None,
+                        help="Reference moment in UTC, ex: 2023-09-01T00:00:00")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.now or datetime.utcnow()))
@@ -1,55 +1,37 @@
 import json
 import logging.config
+from contextlib import asynccontextmanager
 
 import uvicorn
-from fastapi import FastAPI, Request, status
+from fastapi import FastAPI, Request
 from fastapi.responses import ORJSONResponse
-from starlette.middleware.sessions import SessionMiddleware
 from starlette.responses import HTMLResponse
+from starlette_exporter import PrometheusMiddleware, handle_metrics
 
-from opentelemetry import trace
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
-from opentelemetry.exporter.jaeger.thrift import JaegerExporter
-from opentelemetry.sdk.resources import Resource, SERVICE_NAME
-
+from api.health import router as health_router
 from api.v1.roles import router as role_router
 from api.v1.auth import router as auth_router
 from api.v1.oauth2 import router as oauth2_router
 from core.logger import LOGGING
-from utils.limits import check_limit
-from core.config import app_settings, jaeger_settings, enable_tracer
+from core.tracer import configure_tracer, instrument_app
+from utils.middleware import HEALTH_PATHS, RateLimitMiddleware, RequestIdMiddleware, ScopedSessionMiddleware
+from core.container import container
+from core.config import app_settings, log_settings, metrics_settings, PREFIX
 
 logging.config.dictConfig(LOGGING)
 log = logging.getLogger(__name__)
 
-PREFIX = "/auth_api"
-
-
-def configure_tracer() -> None:
-    """
-    Трейсер - константный сэмплер, для трейсинга всех запросов.
-    По умолчанию Jaeger сэмплирует только порядка 5%.
-    """
-    resource = Resource(attributes={
-        SERVICE_NAME: 'auth-service'
-    })
-    provider = TracerProvider(resource=resource)
-    trace.set_tracer_provider(provider)
-    trace.get_tracer_provider().add_span_processor(
-        BatchSpanProcessor(
-            JaegerExporter(
-                agent_host_name=jaeger_settings.host,
-                agent_port=jaeger_settings.port_udp,
-            )
-        )
-    )
-    # Чтобы видеть трейсы в консоли
-    trace.get_tracer_provider().add_span_processor(BatchSpanProcessor(ConsoleSpanExporter()))
 
-if enable_tracer:
-    configure_tracer()  # Jaeger instrument for tracer, must be before app = FastAPI
+# Jaeger instrument for tracer, must be before app = FastAPI
+tracing = configure_tracer()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await container.start()
+    yield
+    await container.stop()
+
 
 app = FastAPI(
     title=app_settings.project_name,
@@ -59,11 +41,31 @@ app = FastAPI(
     docs_url=f'{PREFIX}/openapi',
     openapi_url=f'{PREFIX}/openapi.json',
     default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
-FastAPIInstrumentor.instrument_app(app)  # Jaeger instrument for tracer, must be after app = FastAPI
 
-app.add_middleware(SessionMiddleware, secret_key="secret-string")
+# Jaeger instrument for tracer, must be after app = FastAPI
+if tracing:
+    instrument_app(app)
+
+# pure ASGI middleware; добавленный позже оборачивает ранее добавленные
+app.add_middleware(ScopedSessionMiddleware, secret_key="secret-string")
+app.add_middleware(RateLimitMiddleware)
+app.add_middleware(RequestIdMiddleware)
+
+if metrics_settings.enabled:
+    # снаружи остальных: в латентность входят rate limit и ответы 429
+    app.add_middleware(PrometheusMiddleware,
+                       app_name='auth',
+                       prefix='auth_http',
+                       group_paths=True,  # шаблон пути, ex: /auth_api/v1/roles/{role_id}
+                       filter_unhandled_paths=True,  # 404 на случайные пути не плодят серии
+                       skip_paths=[metrics_settings.path, *HEALTH_PATHS],
+                       buckets=metrics_settings.latency_buckets,
+                       )
+    # в multiprocess режиме собирает метрики всех воркеров из PROMETHEUS_MULTIPROC_DIR
+    app.add_route(metrics_settings.path, handle_metrics, include_in_schema=False)
 
 
 @app.get(f'{PREFIX}/homepage')
@@ -81,31 +83,7 @@ async def homepage(request: Request):
         + f'<a href="{PREFIX}/v1/oauth2/register_oauth2">register oauth2</a>')
 
 
-@app.middleware("http")
-async def before_request_check_limit(request: Request, call_next):
-    user_id = request.headers.get("X-Forwarded-For")
-    result = await check_limit(user_id=user_id)
-    if result:
-        return ORJSONResponse(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            content={'detail': 'Too many requests'}
-        )
-    return await call_next(request)
-
-
-@app.middleware('http')
-async def before_request_add_headers(request: Request, call_next):
-    """
-    Обработчик заголовка X-Request-Id.
-    """
-    response = await call_next(request)
-    log.info('<<<request_id middleware>>>')
-    request_id = request.headers.get('X-Request-Id', None)
-    log_msg = f'{request_id=}'
-    log.debug(log_msg)
-    return response
-
-
+app.include_router(health_router, tags=['health'])
 app.include_router(auth_router, prefix=f'{PREFIX}/v1', tags=['auth'])
 app.include_router(role_router, prefix=f'{PREFIX}/v1', tags=['role'])
 app.include_router(oauth2_router, prefix=f'{PREFIX}/v1', tags=['oauth2'])
@@ -116,5 +94,5 @@ if __name__ == '__main__':
         host='0.0.0.0',
         port=8081,
         log_config=LOGGING,
-        log_level=logging.getLevelName(app_settings.log_lvl),
+        log_level=log_settings.level.lower(),
     )
@@ -0,0 +1,52 @@
+"""add lookup indexes for entry, user_role, user_socials
+
+Revision ID: c3f1a9d2e7b4
+Revises: 68111ec498a3
+Create Date: 2026-10-17 10:12:31.418209
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f1a9d2e7b4'
+down_revision = '68111ec498a3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # дубликаты мешают построить уникальные индексы, оставляем по одной записи
+    op.execute("""
+        DELETE FROM user_role a USING user_role b
+        WHERE a.user_id = b.user_id AND a.role_id = b.role_id AND a.uuid > b.uuid
+    """)
+    op.execute("""
+        DELETE FROM user_socials a USING user_socials b
+        WHERE a.provider = b.provider AND a.sub_id = b.sub_id AND a.uuid > b.uuid
+    """)
+    # CONCURRENTLY не блокирует запись в таблицы, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index('ix_entry_user_id_is_active', 'entry', ['user_id', 'is_active'],
+                        postgresql_concurrently=True)
+        op.create_index('ix_entry_user_agent_active', 'entry', ['user_agent'],
+                        postgresql_where=sa.text('is_active'), postgresql_concurrently=True)
+        op.create_index('uq_user_role_user_id_role_id', 'user_role', ['user_id', 'role_id'],
+                        unique=True, postgresql_concurrently=True)
+        op.create_index('ix_user_role_role_id', 'user_role', ['role_id'],
+                        postgresql_concurrently=True)
+        op.create_index('uq_user_socials_provider_sub_id', 'user_socials', ['provider', 'sub_id'],
+                        unique=True, postgresql_concurrently=True)
+        op.create_index('ix_user_socials_user_id', 'user_socials', ['user_id'],
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_user_socials_user_id', table_name='user_socials', postgresql_concurrently=True)
+        op.drop_index('uq_user_socials_provider_sub_id', table_name='user_socials', postgresql_concurrently=True)
+        op.drop_index('ix_user_role_role_id', table_name='user_role', postgresql_concurrently=True)
+        op.drop_index('uq_user_role_user_id_role_id', table_name='user_role', postgresql_concurrently=True)
+        op.drop_index('ix_entry_user_agent_active', table_name='entry', postgresql_concurrently=True)
+        op.drop_index('ix_entry_user_id_is_active', table_name='entry', postgresql_concurrently=True)
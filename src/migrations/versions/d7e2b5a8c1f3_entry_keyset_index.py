@@ -0,0 +1,29 @@
+"""add entry index for keyset pagination of login history
+
+Revision ID: d7e2b5a8c1f3
+Revises: c3f1a9d2e7b4
+Create Date: 2026-10-17 11:04:52.730118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7e2b5a8c1f3'
+down_revision = 'c3f1a9d2e7b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # порядок индекса совпадает с ORDER BY date_time DESC, uuid DESC в истории входов
+    with op.get_context().autocommit_block():
+        op.create_index('ix_entry_user_id_date_time_uuid', 'entry',
+                        ['user_id', sa.text('date_time DESC'), sa.text('uuid DESC')],
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_entry_user_id_date_time_uuid', table_name='entry', postgresql_concurrently=True)
@@ -0,0 +1,86 @@
+"""partition entry by month of date_time
+
+Revision ID: e4a9c6f0b2d8
+Revises: d7e2b5a8c1f3
+Create Date: 2026-10-17 11:48:06.215407
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a9c6f0b2d8'
+down_revision = 'd7e2b5a8c1f3'
+branch_labels = None
+depends_on = None
+
+COLUMNS = 'uuid, user_id, user_agent, date_time, refresh_token, is_active'
+PREMAKE = 3
+
+
+def _add_months(month: datetime, months: int) -> datetime:
+    year, month_index = divmod(month.year * 12 + month.month - 1 + months, 12)
+    return month.replace(year=year, month=month_index + 1)
+
+
+def _create_indexes() -> None:
+    # на секционированной таблице CONCURRENTLY недоступен, индексы строятся на каждой секции
+    op.create_index('ix_entry_user_id_is_active', 'entry', ['user_id', 'is_active'])
+    op.create_index('ix_entry_user_agent_active', 'entry', ['user_agent'], postgresql_where=sa.text('is_active'))
+    op.create_index('ix_entry_user_id_date_time_uuid', 'entry',
+                    ['user_id', sa.text('date_time DESC'), sa.text('uuid DESC')])
+
+
+def upgrade() -> None:
+    # таблица пересоздается целиком, запись в entry блокируется на время копирования
+    op.execute("""
+        CREATE TABLE entry_partitioned (
+            uuid UUID NOT NULL,
+            user_id UUID NOT NULL,
+            user_agent VARCHAR,
+            date_time TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            refresh_token VARCHAR,
+            is_active BOOLEAN
+        ) PARTITION BY RANGE (date_time)
+    """)
+    first = op.get_bind().execute(sa.text('SELECT min(date_time) FROM entry')).scalar()
+    now = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month = (first or now).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while month <= _add_months(now, PREMAKE):
+        next_month = _add_months(month, 1)
+        op.execute(f"CREATE TABLE entry_p{month:%Y%m} PARTITION OF entry_partitioned "
+                   f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month.isoformat()}')")
+        month = next_month
+    op.execute('CREATE TABLE entry_default PARTITION OF entry_partitioned DEFAULT')
+
+    op.execute(f'INSERT INTO entry_partitioned ({COLUMNS}) SELECT {COLUMNS} FROM entry')
+    op.drop_table('entry')
+    op.rename_table('entry_partitioned', 'entry')
+    op.create_primary_key('entry_pkey', 'entry', ['uuid', 'date_time'])
+    op.create_foreign_key('entry_user_id_fkey', 'entry', 'users', ['user_id'], ['uuid'],
+                          onupdate='CASCADE', ondelete='CASCADE')
+    _create_indexes()
+
+
+def downgrade() -> None:
+    op.execute("""
+        CREATE TABLE entry_plain (
+            uuid UUID NOT NULL,
+            user_id UUID NOT NULL,
+            user_agent VARCHAR,
+            date_time TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            refresh_token VARCHAR,
+            is_active BOOLEAN
+        )
+    """)
+    op.execute(f'INSERT INTO entry_plain ({COLUMNS}) SELECT {COLUMNS} FROM entry')
+    # секции удаляются вместе с родительской таблицей
+    op.drop_table('entry')
+    op.rename_table('entry_plain', 'entry')
+    op.create_primary_key('entry_pkey', 'entry', ['uuid'])
+    op.create_foreign_key('entry_user_id_fkey', 'entry', 'users', ['user_id'], ['uuid'],
+                          onupdate='CASCADE', ondelete='CASCADE')
+    _create_indexes()
@@ -1,5 +1,8 @@
+import base64
+from datetime import datetime
 from uuid import UUID
 
+import orjson
 from pydantic import BaseModel
 
 
@@ -7,3 +10,22 @@ class EntryCreate(BaseModel):
     user_id: UUID
     user_agent: str = None
     refresh_token: str = None
+
+
+class EntryCursor(BaseModel):
+    """Position after the last entry of a page, keyset (date_time, uuid)"""
+    date_time: datetime
+    uuid: UUID
+
+    def encode(self) -> str:
+        raw = orjson.dumps([self.date_time.isoformat(), str(self.uuid)])
+        return base64.urlsafe_b64encode(raw).decode('ascii')
+
+    @classmethod
+    def decode(cls, cursor: str) -> 'EntryCursor':
+        """Raises ValueError on a malformed cursor"""
+        try:
+            date_time, uuid = orjson.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        except (TypeError, ValueError, orjson.JSONDecodeError) as err:
+            raise ValueError('Invalid cursor') from err
+        return cls(date_time=date_time, uuid=uuid)
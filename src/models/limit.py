@@ -0,0 +1,40 @@
+from enum import Enum
+from typing import Dict
+
+from pydantic import BaseModel
+
+
+class LimitAlgorithm(str, Enum):
+    token_bucket = 'token_bucket'
+    sliding_window = 'sliding_window'
+
+
+class LimitIdentity(str, Enum):
+    ip = 'ip'
+    user = 'user'
+    client = 'client'
+
+
+class RateLimitPolicy(BaseModel):
+    algorithm: LimitAlgorithm = LimitAlgorithm.token_bucket
+    limit: int  # запросов за окно (емкость корзины)
+    window: int = 60  # sec
+    identity: LimitIdentity = LimitIdentity.ip
+
+
+class RateLimitResult(BaseModel):
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: int  # sec, до полного восстановления квоты
+    retry_after: int = 0  # sec
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            'RateLimit-Limit': str(self.limit),
+            'RateLimit-Remaining': str(self.remaining),
+            'RateLimit-Reset': str(self.reset),
+        }
+        if not self.allowed:
+            headers['Retry-After'] = str(self.retry_after)
+        return headers
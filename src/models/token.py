@@ -1,10 +1,16 @@
+import math
 from datetime import datetime, timezone
 from enum import Enum
-from typing import List
+from typing import List, Optional
 
 from pydantic import BaseModel
 
 
+def ms_timestamp(moment: datetime) -> float:
+    """Unix time truncated to milliseconds: precision of iat and of user revocation timestamps"""
+    return math.floor(moment.timestamp() * 1000) / 1000
+
+
 class TokenType(str, Enum):
     access = 'access'
     refresh = 'refresh'
@@ -15,11 +21,17 @@ class TokenPayloadBase(BaseModel):
     login: str
     role: List[str]
     exp: datetime
+    iat: Optional[datetime] = None  # у токенов, выпущенных до появления поля, его нет
+
+    def is_issued_before(self, timestamp: float) -> bool:
+        """Check the token is covered by a user revocation timestamp, iat and timestamp are precise to ms"""
+        # сравнение в целых мс: float после разбора iat в datetime теряет доли микросекунды
+        return self.iat is None or round(self.iat.timestamp() * 1000) < round(timestamp * 1000)
 
     @property
-    def left_time(self):
-        delta = datetime.now(timezone.utc) - self.exp
-        return delta.seconds  # sec
+    def left_time(self) -> int:
+        delta = self.exp - datetime.now(timezone.utc)
+        return max(math.ceil(delta.total_seconds()), 0)  # sec
 
 
 class AccessTokenPayload(TokenPayloadBase):
@@ -1,21 +1,28 @@
 from abc import ABC, abstractmethod
-import bcrypt
-from typing import List, Tuple
-from functools import lru_cache
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
 import logging
+import uuid
 
-from fastapi import status, HTTPException, Depends
+from fastapi import status, HTTPException
+from opentelemetry import trace
 from pydantic import SecretStr
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import logging.config
+from core.config import token_settings
 from core.logger import LOGGING
-from db.token import TokenDBBase, get_token_db
+from core.tracer import traced
+from db.token import TokenDBBase
 from db.models import User as DBUser, Entry as DBEntry
 from models import user as user_models
+from models.entry import EntryCursor
 from crud import user as user_dal, role as role_dal, entry as entry_dal, crud_social as user_socials_dal
-from utils.token_manager import TokenManagerBase, get_token_manager
-from db.session import get_db
+from utils.token_manager import TokenManagerBase
+from utils.hash_executor import hash_executor
+from utils.password_hasher import hash_policy
+from db.role_cache import role_cache
+from db.uow import UnitOfWork
 
 logging.config.dictConfig(LOGGING)
 log = logging.getLogger(__name__)
@@ -25,12 +32,12 @@ class HashManagerBase(ABC):
     """Hashing and verifying passwords"""
 
     @abstractmethod
-    def hash_pwd(self, pwd: str) -> str:
+    async def hash_pwd(self, pwd: str) -> str:
         """Get a hashed password"""
         pass
 
     @abstractmethod
-    def verify_pwd(self, pwd_in: str, pwd_hash: str) -> bool:
+    async def verify_pwd(self, pwd_in: str, pwd_hash: str) -> bool:
         """Password match check"""
         pass
 
@@ -84,7 +91,7 @@ class AuthServiceBase(ABC):
         pass
 
     @abstractmethod
-    async def entry_history(self) -> List[DBEntry]:
+    async def entry_history(self) -> Tuple[List[DBEntry], Optional[str]]:
         """Get user login history"""
         pass
 
@@ -103,207 +110,258 @@ class AuthService(AuthServiceBase, HashManagerBase):
         self.token_db = token_db
         self.token_manager = token_manager
         self.user_db_session = user_db_session
-
-    def hash_pwd(self, pwd: str) -> str:
-        salt = bcrypt.gensalt()
-        pwd_hash = bcrypt.hashpw(pwd.encode('utf-8'), salt)
-        return pwd_hash.decode('utf-8')
-
-    def verify_pwd(self, pwd_in: str, pwd_hash: str) -> bool:
-        return bcrypt.checkpw(pwd_in.encode('utf-8'), pwd_hash.encode('utf-8'))
-
-    async def register(self, user: user_models.UserCreate, provider: str = None) -> DBUser:
+        self.uow = UnitOfWork(user_db_session)
+
+    @traced()
+    async def hash_pwd(self, pwd: str) -> str:
+        trace.get_current_span().set_attribute('hash.scheme', repr(hash_policy.current))
+        # хеширование занимает сотни миллисекунд CPU, поэтому выполняется в пуле, а не в event loop
+        return await hash_executor.run('hash', hash_policy.hash, pwd)
+
+    @traced()
+    async def verify_pwd(self, pwd_in: str, pwd_hash: str) -> bool:
+        # стоимость проверки задает сохраненный хеш, а не текущие настройки
+        trace.get_current_span().set_attribute('hash.cost', hash_policy.cost(pwd_hash))
+        return await hash_executor.run('verify', hash_policy.verify, pwd_in, pwd_hash)
+
+    @traced()
+    async def _rehash_if_needed(self, user: DBUser, pwd: str) -> None:
+        """Upgrade a stored hash made with outdated parameters"""
+        if not hash_policy.needs_rehash(user.password):
+            return
+        log.info('Rehash password of user %s', user.uuid)
         user_crud = user_dal.UserDAL(self.user_db_session)
-        # проверка на существование пользователя
-        email_is_exist = await user_crud.get_by_email(user.email)
-        login_is_exist = await user_crud.get_by_login(user.login)
-        log.debug(f'User already exist: email={user.email}'
-                  f' (exists = {email_is_exist});'
-                  f' login={user.login} (exists = {login_is_exist})')
-        if email_is_exist or login_is_exist:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail='User already exist',
-            )
-        # добавление пользователя с хешированием пароля
-        log.debug(f'Create new user: {user.login}')
-        new_user = await user_crud.create(**user.dict(exclude={'password', }),
-                                          password=self.hash_pwd(user.password.get_secret_value()),
-                                          )
-        if provider:
-            user_social_crud = user_socials_dal.UserSocialDAL(self.user_db_session)
-            new_user_social = await user_social_crud.create(new_user.uuid, user.login, provider=provider)
-            log.debug(f'Create new user social: {new_user_social.user_id}, {provider=}')
-        return new_user
-
+        password = await self.hash_pwd(pwd)
+        try:
+            # точка сохранения: ошибка обновления хеша не должна откатить вход
+            async with self.user_db_session.begin_nested():
+                await user_crud.update(user.uuid, password=password)
+        except HTTPException:
+            # не мешаем входу, хеш обновится при следующем логине
+            log.warning('Rehash password of user %s failed', user.uuid)
+
+    @traced()
+    async def register(self, user: user_models.UserCreate, provider: str = None) -> DBUser:
+        async with self.uow:
+            user_crud = user_dal.UserDAL(self.user_db_session)
+            # добавление пользователя с хешированием пароля
+            log.debug('Create new user: %s', user.login)
+            new_user = await user_crud.create(**user.dict(exclude={'password', }),
+                                              password=await self.hash_pwd(user.password.get_secret_value()),
+                                              )
+            if new_user is None:
+                # сработало ограничение уникальности login или email
+                log.debug('User already exist: email=%s, login=%s', user.email, user.login)
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail='User already exist',
+                )
+            if provider:
+                user_social_crud = user_socials_dal.UserSocialDAL(self.user_db_session)
+                new_user_social = await user_social_crud.create(new_user.uuid, user.login, provider=provider)
+                log.debug('Create new user social: %s, provider=%r', new_user_social.user_id, provider)
+            return new_user
+
+    @traced()
     async def _generate_tokens(self,
-                               user: DBUser,
-                               entry: DBEntry,
+                               user_id: str,
+                               login: str,
+                               session_id: uuid.UUID,
                                ) -> Tuple[str, str]:
         role_crud = role_dal.RoleDAL(self.user_db_session)
-        roles = await role_crud.get_by_user_id(user.uuid)
+
+        async def load_role_ids() -> List[str]:
+            return [str(role.uuid) for role in await role_crud.get_by_user_id(user_id)]
+
+        role_ids = await role_cache.get_user_role_ids(str(user_id), load_role_ids)
         token_payload = {
-            'sub': str(user.uuid),
-            'login': user.login,
-            'role': [str(role.uuid) for role in roles],
+            'sub': str(user_id),
+            'login': login,
+            'role': role_ids,
         }
         access_token = await self.token_manager.generate_access_token(token_payload)
-        token_payload.update({'session_id': str(entry.uuid)})
+        token_payload.update({'session_id': str(session_id)})
         refresh_token = await self.token_manager.generate_refresh_token(token_payload)
         return access_token, refresh_token
 
+    @traced()
     async def login(self, login: str, pwd: SecretStr, user_agent: str) -> Tuple[str, str]:
-        log_message = f'Login: {login}, pwd:{pwd}, user_agent:{user_agent}'
-        log.debug(log_message)
-        user_crud = user_dal.UserDAL(self.user_db_session)
-        entry_crud = entry_dal.EntryDAL(self.user_db_session)
-        # проверка наличия пользователя и совпадения пароля
-        user = await user_crud.get_by_login(login)
-        log_message = f'{user.login=}, {user.password=}, {user.uuid=}, {user.is_active=}'
-        log.debug(log_message)
-        if not user or not self.verify_pwd(pwd.get_secret_value(), user.password):
-            log_message = f'Login {user.login}: ' \
-                          f'user is exist = {bool(user)}, ' \
-                          f'{pwd.get_secret_value()=}, {user.password=},' \
-                          f' {self.verify_pwd(pwd.get_secret_value(), user.password)=}'
-            log.debug(log_message)
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail='Incorrect login or password',
-            )
-
-        if not user.is_active:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail='Account is not active',
-            )
-
-        exist_session = await entry_crud.get_by_user_agent(user_agent, only_active=True)
-
-        if exist_session:
-            log_msg = f'Login {user.login}: close session (refresh = {exist_session.refresh_token})'
-            log.debug(log_msg)
-            await self._close_session(exist_session.refresh_token)
-
-        access_token, refresh_token = await self._open_session(user, user_agent)
-        log_msg = f'{access_token=}, {refresh_token=}'
-        log.debug(log_msg)
-        return access_token, refresh_token
-
-    async def _open_session(self, user: DBUser, user_agent: str) -> Tuple[str, str]:
-        log_msg = f'Open session (user = {user})'
-        log.debug(log_msg)
+        log.debug('Login: %s, user_agent: %s', login, user_agent)
+        async with self.uow:
+            user_crud = user_dal.UserDAL(self.user_db_session)
+            entry_crud = entry_dal.EntryDAL(self.user_db_session)
+            # проверка наличия пользователя и совпадения пароля
+            user = await user_crud.get_by_login(login)
+            if not user or not await self.verify_pwd(pwd.get_secret_value(), user.password):
+                log.debug('Login %s: user is exist = %s, password is incorrect', login, bool(user))
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail='Incorrect login or password',
+                )
+            log.debug('user.login=%r, user.uuid=%r, user.is_active=%r', user.login, user.uuid, user.is_active)
+
+            if not user.is_active:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail='Account is not active',
+                )
+
+            await self._rehash_if_needed(user, pwd.get_secret_value())
+
+            exist_session = await entry_crud.get_by_user_agent(user.uuid, user_agent, only_active=True)
+
+            if exist_session:
+                log.debug('Login %s: close session %s', user.login, exist_session.uuid)
+                await self._close_session(exist_session.refresh_token)
+
+            access_token, refresh_token = await self._open_session(user.uuid, user.login, user_agent)
+            return access_token, refresh_token
+
+    @traced()
+    async def _open_session(self, user_id: str, login: str, user_agent: str) -> Tuple[str, str]:
+        log.debug('Open session (user = %s)', login)
         entry_crud = entry_dal.EntryDAL(self.user_db_session)
-        # записать сессию в БД
-        session = await entry_crud.create(user.uuid, user_agent, None)
-        log.info('Generate new tokens')
-        access_token, refresh_token = await self._generate_tokens(user, session)
-        # записать токен в БД
-        await entry_crud.update(session.uuid, refresh_token=refresh_token)
+        # id сессии генерируется заранее, чтобы выпустить refresh токен до INSERT
+        session_id = uuid.uuid4()
+        log.debug('Generate new tokens')
+        access_token, refresh_token = await self._generate_tokens(user_id, login, session_id)
+        # записать сессию с токеном в БД одним запросом
+        await entry_crud.create(user_id, user_agent, refresh_token, id=session_id)
         return access_token, refresh_token
 
+    @traced()
     async def _close_session(self, refresh_token: str) -> None:
         if refresh_token is None:
             return
         entry_crud = entry_dal.EntryDAL(self.user_db_session)
         refresh_token_data = await self.token_manager.get_data_from_refresh_token(refresh_token)
         await entry_crud.delete(refresh_token_data.session_id)
-        await self.token_db.put(refresh_token, refresh_token_data.sub, refresh_token_data.left_time)
+        await self.token_db.put(refresh_token, refresh_token_data.left_time)
 
+    @traced()
     async def logout(self, access_token: str, refresh_token: str, user_agent: str = None):
-        entry_crud = entry_dal.EntryDAL(self.user_db_session)
-        access_token_data = await self.token_manager.get_data_from_access_token(access_token)
-        user_id = access_token_data.sub
-        # добавить в redis истекшие токены
-        await self.token_db.put(access_token, user_id, access_token_data.left_time)
-
-        if refresh_token is None:
-            session = await entry_crud.get_by_user_agent(user_agent, only_active=True)
-            await self._close_session(session.refresh_token)
-        else:
-            await self._close_session(refresh_token)
-
+        async with self.uow:
+            entry_crud = entry_dal.EntryDAL(self.user_db_session)
+            access_token_data = await self.token_manager.get_data_from_access_token(access_token)
+            # добавить в redis истекшие токены
+            await self.token_db.put(access_token, access_token_data.left_time)
+
+            if refresh_token is None:
+                session = await entry_crud.get_by_user_agent(access_token_data.sub, user_agent, only_active=True)
+                if session is not None:
+                    await self._close_session(session.refresh_token)
+            else:
+                await self._close_session(refresh_token)
+
+    @traced()
     async def logout_all(self, access_token: str) -> None:
-        entry_crud = entry_dal.EntryDAL(self.user_db_session)
-        access_token_data = await self.token_manager.get_data_from_access_token(access_token)
-        user_id = access_token_data.sub
-        await self.token_db.put(access_token, user_id, access_token_data.left_time)
-        active_sessions = await entry_crud.get_by_user_id(user_id, only_active=True)
-        for session in active_sessions:
-            if session.refresh_token:
-                await self._close_session(session.refresh_token)
-
+        async with self.uow:
+            entry_crud = entry_dal.EntryDAL(self.user_db_session)
+            access_token_data = await self.token_manager.get_data_from_access_token(access_token)
+            user_id = access_token_data.sub
+            await entry_crud.deactivate_by_user_id(user_id)
+            # одна отметка в redis отзывает все выпущенные токены, включая текущий access;
+            # ставится после commit, чтобы откат не оставил отзыв без закрытых сессий
+            revoked_at = datetime.now(timezone.utc)
+            expire_in_sec = max(token_settings.access_expire, token_settings.refresh_expire) * 60
+            self.uow.after_commit(lambda: self.token_db.revoke_user_before(user_id, revoked_at, expire_in_sec))
+
+    @traced()
     async def user_role(self, access_token: str) -> str:
         token_data = await self.token_manager.get_data_from_access_token(access_token)
         return token_data.role
 
-    async def entry_history(self, access_token: str, unique: bool, page_size: int, page_number: int) -> List[DBEntry]:
+    @traced()
+    async def entry_history(self,
+                            access_token: str,
+                            unique: bool,
+                            page_size: int,
+                            cursor: Optional[str] = None,
+                            ) -> Tuple[List[DBEntry], Optional[str]]:
         entry_crud = entry_dal.EntryDAL(self.user_db_session)
         token_data = await self.token_manager.get_data_from_access_token(access_token)
-        entry_history = await entry_crud.get_by_user_id(token_data.sub, unique=unique, page_size=page_size,
-                                                        page_number=page_number)
-        return entry_history
-
+        try:
+            after = EntryCursor.decode(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail='Invalid cursor',
+            )
+        # на одну запись больше, чтобы узнать, есть ли следующая страница
+        entries = await entry_crud.get_by_user_id(token_data.sub,
+                                                  unique=unique,
+                                                  limit=page_size + 1,
+                                                  cursor=after,
+                                                  ) or []
+        next_cursor = None
+        if len(entries) > page_size:
+            entries = entries[:page_size]
+            next_cursor = EntryCursor(date_time=entries[-1].date_time, uuid=entries[-1].uuid).encode()
+        return entries, next_cursor
+
+    @traced()
     async def user_data(self, access_token: str) -> DBUser:
         user_crud = user_dal.UserDAL(self.user_db_session)
         token_data = await self.token_manager.get_data_from_access_token(access_token)
         user = await user_crud.get(token_data.sub)
         return user
 
+    @traced()
     async def update_user_data(self, access_token: str, changed_data: user_models.ChangeUserData) -> DBUser:
-        user_crud = user_dal.UserDAL(self.user_db_session)
-        token_data = await self.token_manager.get_data_from_access_token(access_token)
-        updated_user_id = await user_crud.update(token_data.sub, **changed_data.dict(exclude_none=True))
-        updated_user = await user_crud.get(updated_user_id)
-        return updated_user
-
+        async with self.uow:
+            user_crud = user_dal.UserDAL(self.user_db_session)
+            token_data = await self.token_manager.get_data_from_access_token(access_token)
+            updated_user_id = await user_crud.update(token_data.sub, **changed_data.dict(exclude_none=True))
+            updated_user = await user_crud.get(updated_user_id)
+            return updated_user
+
+    @traced()
     async def update_user_password(self, access_token: str, refresh_token: str,
                                    changed_data: user_models.ChangeUserPwd) -> None:
-        user_crud = user_dal.UserDAL(self.user_db_session)
-        token_data = await self.token_manager.get_data_from_access_token(access_token)
-        # проверка старого пароля
-        user = await user_crud.get(token_data.sub)
-        if not self.verify_pwd(changed_data.old_password.get_secret_value(), user.password):
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail='Incorrect old password',
+        async with self.uow:
+            user_crud = user_dal.UserDAL(self.user_db_session)
+            token_data = await self.token_manager.get_data_from_access_token(access_token)
+            # проверка старого пароля
+            user = await user_crud.get(token_data.sub)
+            if not await self.verify_pwd(changed_data.old_password.get_secret_value(), user.password):
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail='Incorrect old password',
+                )
+            # добавление нового пароля
+            await user_crud.update(
+                token_data.sub,
+                password=await self.hash_pwd(changed_data.new_password.get_secret_value())
             )
-        # добавление нового пароля
-        await user_crud.update(
-            token_data.sub,
-            password=self.hash_pwd(changed_data.new_password.get_secret_value())
-        )
-        log.info('Logout after changing password')
-        await self.logout(access_token, refresh_token)
+            log.info('Logout after changing password')
+            await self.logout(access_token, refresh_token)
 
+    @traced()
     async def refresh_tokens(self, refresh_token: str, user_agent: str) -> Tuple[str, str]:
-        user_crud = user_dal.UserDAL(self.user_db_session)
-        entry_crud = entry_dal.EntryDAL(self.user_db_session)
-        token_data = await self.token_manager.get_data_from_refresh_token(refresh_token)
-        log.info('Close old session after refresh tokens')
-        await self._close_session(refresh_token)
-        # получить пользователя по айди
-        user = await user_crud.get(token_data.sub)
-        # записать сессию в БД
-        session = await entry_crud.create(user.uuid, user_agent, None)
-        log.info('Generate new tokens')
-        access_token, refresh_token = await self._generate_tokens(user, session)
-        # записать токен в БД
-        await entry_crud.update(session.uuid, refresh_token=refresh_token)
-        return access_token, refresh_token
+        async with self.uow:
+            user_crud = user_dal.UserDAL(self.user_db_session)
+            token_data = await self.token_manager.get_data_from_refresh_token(refresh_token)
+            # логин мог измениться после выпуска refresh токена: берется из БД, а не из токена
+            user = await user_crud.get_login_state(token_data.sub)
+            if user is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail='User does not exist',
+                )
+            if not user.is_active:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail='Account is not active',
+                )
+            log.debug('Close old session after refresh tokens')
+            await self._close_session(refresh_token)
+            access_token, refresh_token = await self._open_session(token_data.sub, user.login, user_agent)
+            return access_token, refresh_token
 
+    @traced()
     async def deactivate_user(self, access_token: str):
-        user_crud = user_dal.UserDAL(self.user_db_session)
-        token_data = await self.token_manager.get_data_from_access_token(access_token)
-        await self.logout_all(access_token)
-        await user_crud.delete(token_data.sub)
-
-
-@lru_cache()
-def get_auth_service(token_db: TokenDBBase = Depends(get_token_db),
-                     token_manager: TokenManagerBase = Depends(get_token_manager),
-                     user_db_session=Depends(get_db),
-                     ) -> AuthService:
-    log_msg = f'{token_db=}, {token_manager=}, {user_db_session=}'
-    log.debug(log_msg)
-    return AuthService(token_db, token_manager, user_db_session)
+        async with self.uow:
+            user_crud = user_dal.UserDAL(self.user_db_session)
+            token_data = await self.token_manager.get_data_from_access_token(access_token)
+            await self.logout_all(access_token)
+            await user_crud.delete(token_data.sub)
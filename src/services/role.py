@@ -1,17 +1,16 @@
 import logging
 import uuid
 from abc import ABC, abstractmethod
-from functools import lru_cache
-from typing import List, Optional
+from typing import Dict, List, Optional
 
-from fastapi import status, HTTPException, Depends
+from fastapi import status, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from core.logger import LOGGING
 from crud.role import RoleDAL
 from crud.user_role import UserRoleDAL
-from crud.user import UserDAL
-from db.session import get_db
+from db.role_cache import role_cache
+from db.uow import UnitOfWork
 from models.role import RoleResponse
 
 logging.config.dictConfig(LOGGING)
@@ -55,158 +54,108 @@ class RoleServiceBase(ABC):
 class RoleService(RoleServiceBase):
 
     def __init__(self, db: AsyncSession):
-        log.info("Init role service")
+        log.debug("Init role service")
         self.db = db
+        self.uow = UnitOfWork(db)
 
     async def create_role(self, role_name: str) -> Optional[RoleResponse]:
-        async with self.db as session:
-            async with session.begin():
-                log.debug("Create new role")
-                role_dal = RoleDAL(session)
-                role_exists = await role_dal.get_by_name(role_name)
-                if role_exists:
-                    log.error(f"{status.HTTP_400_BAD_REQUEST}: Role already exists")
-                    raise HTTPException(
-                        status_code=status.HTTP_400_BAD_REQUEST,
-                        detail='Role already exist',
-                    )
-                role = await role_dal.create(name=role_name)
-                return RoleResponse(uuid=role.uuid, name=role.name)
+        async with self.uow as session:
+            log.debug("Create new role")
+            role = await RoleDAL(session).create(name=role_name)
+            if role is None:
+                log.error('%s: Role already exists', status.HTTP_400_BAD_REQUEST)
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail='Role already exist',
+                )
+        await role_cache.invalidate()
+        return RoleResponse(uuid=role.uuid, name=role.name)
 
     async def read_role(self, role_id: uuid.UUID) -> Optional[RoleResponse]:
-        async with self.db as session:
-            async with session.begin():
-                log.debug(f"Read role {role_id}")
-                role_dal = RoleDAL(session)
-                role_exists = await role_dal.get(role_id)
-                if not role_exists:
-                    log.error(f"{status.HTTP_404_NOT_FOUND}: Role not found {role_id}")
-                    raise HTTPException(
-                        status_code=status.HTTP_404_NOT_FOUND,
-                        detail='Role does not exist',
-                    )
-                role = await role_dal.get(id=role_id)
-                return RoleResponse(uuid=role.uuid, name=role.name)
+        log.debug('Read role %s', role_id)
+        role = await RoleDAL(self.db).get(role_id)
+        if not role:
+            log.error('%s: Role not found %s', status.HTTP_404_NOT_FOUND, role_id)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='Role does not exist',
+            )
+        return RoleResponse(uuid=role.uuid, name=role.name)
 
     async def read_roles(self) -> Optional[List[RoleResponse]]:
-        async with self.db as session:
-            async with session.begin():
-                log.debug("Read all roles")
-                role_dal = RoleDAL(session)
-                roles = await role_dal.get_all()
-                return [RoleResponse(uuid=role.uuid, name=role.name) for role in roles]
+        log.debug("Read all roles")
+
+        async def load_catalogue() -> Dict[str, str]:
+            roles = await RoleDAL(self.db).get_all()
+            return {str(role.uuid): role.name for role in roles or []}
+
+        catalogue = await role_cache.get_catalogue(load_catalogue)
+        return [RoleResponse(uuid=role_id, name=name) for role_id, name in catalogue.items()]
 
     async def update_role(self, role_id: uuid.UUID, name: str) -> Optional[RoleResponse]:
-        async with self.db as session:
-            async with session.begin():
-                log.debug(f"Update role: {role_id}; new name: {name}")
-                role_dal = RoleDAL(session)
-                role_exists = await role_dal.get(role_id)
-                if not role_exists:
-                    log.error(f"{status.HTTP_404_NOT_FOUND}: Role not found {role_id}")
-                    raise HTTPException(
-                        status_code=status.HTTP_404_NOT_FOUND,
-                        detail='Role does not exist',
-                    )
-                updated_role_id = await role_dal.update(id=role_id, name=name)
-
-        updated_role = await self.read_role(updated_role_id)
-        return updated_role
+        async with self.uow as session:
+            log.debug('Update role: %s; new name: %s', role_id, name)
+            # UPDATE ... RETURNING: проверка существования и новое состояние одним запросом
+            role = await RoleDAL(session).update(id=role_id, name=name)
+            if role is None:
+                log.error('%s: Role not found %s', status.HTTP_404_NOT_FOUND, role_id)
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail='Role does not exist',
+                )
+        await role_cache.invalidate()
+        return RoleResponse(uuid=role.uuid, name=role.name)
 
     async def delete_role(self, role_id: uuid.UUID) -> bool:
-        async with self.db as session:
-            async with session.begin():
-                role_dal = RoleDAL(session)
-                role_exists = await role_dal.get(role_id)
-                if not role_exists:
-                    log.error(f"{status.HTTP_404_NOT_FOUND}: Role not found {role_id}")
-                    raise HTTPException(
-                        status_code=status.HTTP_404_NOT_FOUND,
-                        detail='Role does not exist',
-                    )
-                deleted_role_id = await role_dal.delete(uuid=role_id)
-                return bool(deleted_role_id)
+        async with self.uow as session:
+            deleted_role_id = await RoleDAL(session).delete(uuid=role_id)
+            if deleted_role_id is None:
+                log.error('%s: Role not found %s', status.HTTP_404_NOT_FOUND, role_id)
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail='Role does not exist',
+                )
+        await role_cache.invalidate()
+        return True
 
     async def get_user_access_area(self, user_id: uuid.UUID) -> List[RoleResponse]:
-        log_msg = f'{user_id=}'
-        log.debug(log_msg)
-        async with self.db as session:
-            async with session.begin():
-                log_msg = f"Get user's access area: {user_id=}"
-                log.debug(log_msg)
-                role_dal = RoleDAL(session)
-                user_dal = UserDAL(session)
-                user_exists = await user_dal.get(user_id)
-                log_msg = f"{user_id=}, {role_dal=}, {user_dal=}, {user_exists=}"
-                log.debug(log_msg)
-                if not user_exists:
-                    log.error(f"{status.HTTP_404_NOT_FOUND}: User not found {user_id}")
-                    raise HTTPException(
-                        status_code=status.HTTP_404_NOT_FOUND,
-                        detail='User does not exist',
-                    )
-                user_roles = await role_dal.get_by_user_id(user_id)
-                log_msg = f"{user_roles=}"
-                log.debug(log_msg)
-                return [RoleResponse(uuid=role.uuid, name=role.name) for role in user_roles]
+        log.debug("Get user's access area: user_id=%r", user_id)
+        user_roles = await RoleDAL(self.db).get_by_existing_user_id(user_id)
+        if user_roles is None:
+            log.error('%s: User not found %s', status.HTTP_404_NOT_FOUND, user_id)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='User does not exist',
+            )
+        log.debug('user_roles=%r', user_roles)
+        return [RoleResponse(uuid=role.uuid, name=role.name) for role in user_roles]
+
+    def _check_exists(self, user_id: uuid.UUID, role_id: uuid.UUID, user_exists: bool, role_exists: bool) -> None:
+        if not user_exists:
+            log.error('%s: User not found %s', status.HTTP_404_NOT_FOUND, user_id)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='User does not exist',
+            )
+        if not role_exists:
+            log.error('%s: Role not found %s', status.HTTP_404_NOT_FOUND, role_id)
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='Role does not exist',
+            )
 
     async def set_role_to_user(self, user_id: uuid.UUID, role_id: uuid.UUID) -> bool:
-        async with self.db as session:
-            async with session.begin():
-                log.debug(f"Assign new role to user: user - {user_id}; role_id - {role_id}")
-                user_role_dal = UserRoleDAL(session)
-                role_dal = RoleDAL(session)
-                user_dal = UserDAL(session)
-
-                user_exists = await user_dal.get(user_id)
-                if not user_exists:
-                    log.error(f"{status.HTTP_404_NOT_FOUND}: User not found {user_id}")
-                    raise HTTPException(
-                        status_code=status.HTTP_404_NOT_FOUND,
-                        detail='User does not exist',
-                    )
-
-                role_exists = await role_dal.get(role_id)
-                if not role_exists:
-                    log.error(f"{status.HTTP_404_NOT_FOUND}: Role not found {role_id}")
-                    raise HTTPException(
-                        status_code=status.HTTP_404_NOT_FOUND,
-                        detail='Role does not exist',
-                    )
-
-                new_user_role = await user_role_dal.create(user_id, role_id)
-                return bool(new_user_role)
+        async with self.uow as session:
+            log.debug('Assign new role to user: user - %s; role_id - %s', user_id, role_id)
+            user_exists, role_exists = await UserRoleDAL(session).assign(user_id, role_id)
+            self._check_exists(user_id, role_id, user_exists, role_exists)
+        await role_cache.invalidate_user(str(user_id))
+        return True
 
     async def remove_role_from_user(self, user_id: uuid.UUID, role_id: uuid.UUID) -> bool:
-        async with self.db as session:
-            async with session.begin():
-                log.debug(f"Remove role from user: user - {user_id}; role_id - {role_id}")
-
-                role_dal = RoleDAL(session)
-                user_dal = UserDAL(session)
-
-                user_exists = await user_dal.get(user_id)
-                if not user_exists:
-                    log.error(f"{status.HTTP_404_NOT_FOUND}: User not found {user_id}")
-                    raise HTTPException(
-                        status_code=status.HTTP_404_NOT_FOUND,
-                        detail='User does not exist',
-                    )
-
-                role_exists = await role_dal.get(role_id)
-                if not role_exists:
-                    log.error(f"{status.HTTP_404_NOT_FOUND}: Role not found {role_id}")
-                    raise HTTPException(
-                        status_code=status.HTTP_404_NOT_FOUND,
-                        detail='Role does not exist',
-                    )
-
-                await role_dal.delete_by_user_id_and_role_id(user_id, role_id)
-                return True
-
-
-@lru_cache()
-def get_role_service(db: AsyncSession = Depends(get_db)) -> RoleService:
-    log_msg = f'{db=}, {get_db=}'
-    log.debug(log_msg)
-    return RoleService(db=db)
+        async with self.uow as session:
+            log.debug('Remove role from user: user - %s; role_id - %s', user_id, role_id)
+            user_exists, role_exists = await UserRoleDAL(session).unassign(user_id, role_id)
+            self._check_exists(user_id, role_id, user_exists, role_exists)
+        await role_cache.invalidate_user(str(user_id))
+        return True
@@ -0,0 +1,83 @@
+import asyncio
+import logging.config
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple
+
+from fastapi import status, HTTPException
+from opentelemetry import trace
+
+from core import metrics
+from core.config import hash_settings
+from core.logger import LOGGING
+
+logging.config.dictConfig(LOGGING)
+log = logging.getLogger(__name__)
+
+
+def _timed_call(func: Callable, *args) -> Tuple[float, float, Any]:
+    """Run func in the worker and report when it actually started and finished"""
+    started = time.monotonic()
+    result = func(*args)
+    return started, time.monotonic(), result
+
+
+class HashExecutor:
+    """Bounded worker pool for CPU-bound password hashing"""
+
+    def __init__(self, kind: str, max_workers: int, max_pending: int) -> None:
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._pending = 0
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='hash')
+        return self._executor
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def run(self, operation: str, func: Callable, *args) -> Any:
+        """Run func in the pool, reject with 429 when the queue is full"""
+        if self._pending >= self.max_pending:
+            metrics.HASH_REJECTED.inc()
+            log.warning('Hash executor saturated: pending=%s, max_pending=%s', self._pending, self.max_pending)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail='Too many requests',
+                headers={'Retry-After': '1'},
+            )
+
+        self._pending += 1
+        metrics.HASH_IN_FLIGHT.inc()
+        submitted = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+            started, finished, result = await loop.run_in_executor(self._get_executor(), _timed_call, func, *args)
+        finally:
+            self._pending -= 1
+            metrics.HASH_IN_FLIGHT.dec()
+        metrics.HASH_QUEUE_WAIT.labels(operation).observe(max(started - submitted, 0))
+        metrics.HASH_DURATION.labels(operation).observe(finished - started)
+        # спан вызывающего (AuthService.hash_pwd/verify_pwd): сколько ждали воркер и сколько считали
+        trace.get_current_span().set_attributes({
+            'hash.operation': operation,
+            'hash.queue_wait_ms': max(started - submitted, 0) * 1000,
+            'hash.duration_ms': (finished - started) * 1000,
+        })
+        return result
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+hash_executor = HashExecutor(hash_settings.executor, hash_settings.max_workers, hash_settings.max_pending)
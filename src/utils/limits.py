@@ -1,16 +1,272 @@
-import datetime
+import logging.config
+import math
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple
+
+from fastapi import Request
+from jose import jwt
+from opentelemetry import trace
 from redis.asyncio import Redis
+from redis.commands.core import AsyncScript
+
+from core import metrics
+from core.config import jwt_settings, rate_limit_settings, token_settings
+from core.logger import LOGGING
+from core.tracer import traced
+from db.redis_pool import get_redis
+from models.limit import LimitAlgorithm, LimitIdentity, RateLimitPolicy, RateLimitResult
+
+logging.config.dictConfig(LOGGING)
+log = logging.getLogger(__name__)
+
+# Скрипты выполняются в Redis атомарно за один round trip.
+# Время берется из Redis, чтобы воркеры с разными часами считали одинаково.
+# Возвращают {allowed, remaining, retry_after_ms, reset_ms}.
+
+TOKEN_BUCKET_LUA = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1])
+local ts = tonumber(bucket[2])
+if tokens == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = math.ceil((1 - tokens) / rate)
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate))
+return {allowed, math.floor(tokens), retry_after, math.ceil((capacity - tokens) / rate)}
+"""
+
+SLIDING_WINDOW_LUA = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local t = redis.call('TIME')
+local now = t[1] * 1000 + math.floor(t[2] / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+local count = redis.call('ZCARD', KEYS[1])
+local allowed = 0
+if count < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], window)
+    count = count + 1
+    allowed = 1
+end
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+local reset = tonumber(oldest[2]) + window - now
+local retry_after = 0
+if allowed == 0 then
+    retry_after = reset
+end
+return {allowed, limit - count, retry_after, reset}
+"""
+
+_SCRIPTS = {
+    LimitAlgorithm.token_bucket: TOKEN_BUCKET_LUA,
+    LimitAlgorithm.sliding_window: SLIDING_WINDOW_LUA,
+}
+_registered: Dict[LimitAlgorithm, AsyncScript] = {}
+
+DEFAULT_POLICY_NAME = 'default'
+
+
+def _build_policies() -> Dict[str, RateLimitPolicy]:
+    policies = {
+        DEFAULT_POLICY_NAME: RateLimitPolicy(algorithm=rate_limit_settings.algorithm,
+                                             limit=jwt_settings.REQUEST_LIMIT_PER_MINUTE,
+                                             window=rate_limit_settings.window,
+                                             identity=rate_limit_settings.identity,
+                                             ),
+    }
+    for route, policy in rate_limit_settings.routes.items():
+        policies[route] = RateLimitPolicy(**policy)
+    return policies
+
+
+policies = _build_policies()
+# самый длинный префикс маршрута должен проверяться первым
+_route_prefixes = sorted((route for route in policies if route != DEFAULT_POLICY_NAME), key=len, reverse=True)
+
+
+def get_policy(path: str) -> Tuple[str, RateLimitPolicy]:
+    for route in _route_prefixes:
+        if path.startswith(route):
+            return route, policies[route]
+    return DEFAULT_POLICY_NAME, policies[DEFAULT_POLICY_NAME]
+
+
+def _client_ip(request: Request) -> str:
+    """
+    Address of the client as seen by the outermost trusted proxy.
+    Левые адреса X-Forwarded-For присылает сам клиент, доверять можно только
+    добавленным нашими прокси: адрес клиента - trusted_proxies-й справа.
+    """
+    trusted_proxies = rate_limit_settings.trusted_proxies
+    forwarded_for = request.headers.get('X-Forwarded-For')
+    if trusted_proxies > 0 and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(',')]
+        if len(hops) >= trusted_proxies:
+            return hops[-trusted_proxies]
+    if request.client is not None:
+        return request.client.host
+    return 'unknown'
+
+
+def _user_id(request: Request) -> Optional[str]:
+    authorization = request.headers.get('Authorization', '')
+    if not authorization.startswith('Bearer '):
+        return None
+    try:
+        payload = jwt.decode(authorization[len('Bearer '):],
+                             token_settings.access_secret_key.get_secret_value(),
+                             algorithms=[token_settings.algorithm],
+                             options={'verify_exp': False, },
+                             )
+    except jwt.JWTError:
+        return None
+    return payload.get('sub')
+
+
+def get_identity(request: Request, policy: RateLimitPolicy) -> str:
+    """Limit key subject, falls back to the client ip"""
+    identity = None
+    if policy.identity == LimitIdentity.user:
+        identity = _user_id(request)
+    elif policy.identity == LimitIdentity.client:
+        identity = request.headers.get('X-Client-Id')
+    if identity:
+        return f'{policy.identity.value}:{identity}'
+    return f'{LimitIdentity.ip.value}:{_client_ip(request)}'
+
+
+class _LocalState:
+    __slots__ = ('tokens', 'ts', 'log', 'blocked_until')
+
+    def __init__(self, capacity: int, now: float) -> None:
+        self.tokens = float(capacity)
+        self.ts = now
+        self.log: Deque[float] = deque()
+        self.blocked_until = 0.0
+
+
+class LocalPreLimiter:
+    """
+    Per-worker limiter in front of Redis.
+    Учитывает только запросы, которые Redis пропустил через этот воркер, то есть
+    подмножество глобального счетчика. Поэтому если локальная квота исчерпана,
+    глобальная исчерпана тем более, и отказать можно без похода в Redis.
+    После отказа Redis ключ блокируется локально до Retry-After.
+    """
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys = max_keys
+        self._states: OrderedDict[str, _LocalState] = OrderedDict()
+
+    def _get_state(self, key: str, policy: RateLimitPolicy, now: float) -> _LocalState:
+        state = self._states.get(key)
+        if state is None:
+            state = _LocalState(policy.limit, now)
+            self._states[key] = state
+            if len(self._states) > self.max_keys:
+                self._states.popitem(last=False)
+        else:
+            self._states.move_to_end(key)
+        return state
+
+    def check(self, key: str, policy: RateLimitPolicy) -> Optional[RateLimitResult]:
+        """Denied result when the key is certainly over the limit, None when Redis must decide"""
+        now = time.monotonic()
+        state = self._get_state(key, policy, now)
+        retry_after = 0.0
+        if state.blocked_until > now:
+            retry_after = state.blocked_until - now
+        elif policy.algorithm == LimitAlgorithm.token_bucket:
+            rate = policy.limit / policy.window
+            state.tokens = min(policy.limit, state.tokens + (now - state.ts) * rate)
+            state.ts = now
+            if state.tokens < 1:
+                retry_after = (1 - state.tokens) / rate
+        else:
+            while state.log and state.log[0] <= now - policy.window:
+                state.log.popleft()
+            if len(state.log) >= policy.limit:
+                retry_after = state.log[0] + policy.window - now
+        if not retry_after:
+            return None
+        return RateLimitResult(allowed=False,
+                               limit=policy.limit,
+                               remaining=0,
+                               reset=math.ceil(retry_after),
+                               retry_after=math.ceil(retry_after),
+                               )
+
+    def record(self, key: str, policy: RateLimitPolicy, result: RateLimitResult) -> None:
+        now = time.monotonic()
+        state = self._get_state(key, policy, now)
+        if not result.allowed:
+            state.blocked_until = now + result.retry_after
+        elif policy.algorithm == LimitAlgorithm.token_bucket:
+            state.tokens -= 1
+        else:
+            state.log.append(now)
+
+
+pre_limiter = LocalPreLimiter(rate_limit_settings.local_max_keys)
+
+
+def _get_script(redis: Redis, algorithm: LimitAlgorithm) -> AsyncScript:
+    if algorithm not in _registered:
+        _registered[algorithm] = redis.register_script(_SCRIPTS[algorithm])
+    return _registered[algorithm]
+
+
+@traced()
+async def check_limit(request: Request) -> RateLimitResult:
+    policy_name, policy = get_policy(request.url.path)
+    key = f'rate_limit:{policy_name}:{get_identity(request, policy)}'
+    span = trace.get_current_span()
+    span.set_attributes({'rate_limit.policy': policy_name, 'rate_limit.algorithm': policy.algorithm.value})
+
+    if rate_limit_settings.local_enabled:
+        result = pre_limiter.check(key, policy)
+        if result is not None:
+            metrics.RATE_LIMIT_REJECTED.labels(policy_name, 'local').inc()
+            span.set_attributes({'rate_limit.tier': 'local', 'rate_limit.allowed': result.allowed})
+            return result
 
-from core.config import redis_settings, jwt_settings
+    window_ms = policy.window * 1000
 
-redis_conn = Redis(host=redis_settings.host, port=redis_settings.port, password=redis_settings.password.get_secret_value(), db=1)
+    redis = get_redis()
+    script = _get_script(redis, policy.algorithm)
+    if policy.algorithm == LimitAlgorithm.token_bucket:
+        args = [policy.limit, policy.limit / window_ms]
+    else:
+        args = [policy.limit, window_ms, uuid.uuid4().hex]
+    allowed, remaining, retry_after_ms, reset_ms = await script(keys=[key], args=args, client=redis)
 
-async def check_limit(user_id: str) -> bool:
-    pipe = redis_conn.pipeline()
-    now = datetime.datetime.now()
-    key = f'{user_id}:{now.minute}'
-    await pipe.incr(key, 1)
-    await pipe.expire(key, 59)
-    result = await pipe.execute()
-    request_number = result[0]
-    return request_number > jwt_settings.REQUEST_LIMIT_PER_MINUTE
+    result = RateLimitResult(allowed=bool(allowed),
+                             limit=policy.limit,
+                             remaining=max(remaining, 0),
+                             reset=math.ceil(reset_ms / 1000),
+                             retry_after=math.ceil(retry_after_ms / 1000),
+                             )
+    if rate_limit_settings.local_enabled:
+        pre_limiter.record(key, policy, result)
+    span.set_attributes({'rate_limit.tier': 'redis', 'rate_limit.allowed': result.allowed})
+    if not result.allowed:
+        metrics.RATE_LIMIT_REJECTED.labels(policy_name, 'redis').inc()
+        log.info('Rate limit exceeded: %s', key)
+    return result
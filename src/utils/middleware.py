@@ -0,0 +1,139 @@
+import logging.config
+import uuid
+from abc import ABC, abstractmethod
+from enum import Enum
+from typing import Set
+
+from fastapi import Request, status
+from fastapi.responses import ORJSONResponse
+from starlette.datastructures import MutableHeaders
+from starlette.middleware.sessions import SessionMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import PREFIX, metrics_settings
+from core.logger import LOGGING, request_id_var
+from utils.limits import check_limit
+
+logging.config.dictConfig(LOGGING)
+log = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = 'X-Request-Id'
+
+
+class PathClass(str, Enum):
+    api = 'api'
+    oauth2 = 'oauth2'
+    docs = 'docs'
+    health = 'health'
+    metrics = 'metrics'
+    static = 'static'
+
+
+DOCS_PATHS = {f'{PREFIX}/openapi', f'{PREFIX}/openapi.json', f'{PREFIX}/openapi/oauth2-redirect'}
+HEALTH_PATHS = {'/healthz', '/readyz'}
+STATIC_PATHS = {f'{PREFIX}/homepage'}
+OAUTH2_PREFIX = f'{PREFIX}/v1/oauth2/'
+
+
+def classify_path(path: str) -> PathClass:
+    if path in HEALTH_PATHS:
+        return PathClass.health
+    if path == metrics_settings.path:
+        return PathClass.metrics
+    if path in DOCS_PATHS:
+        return PathClass.docs
+    if path in STATIC_PATHS:
+        return PathClass.static
+    if path.startswith(OAUTH2_PREFIX):
+        return PathClass.oauth2
+    return PathClass.api
+
+
+class RouteAwareMiddleware(ABC):
+    """
+    Pure ASGI middleware applied only to the declared path classes.
+    Остальные запросы проходят напрямую, без лишней задачи и копирования тела,
+    как это делает BaseHTTPMiddleware.
+    """
+
+    path_classes: Set[PathClass] = set()
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or classify_path(scope['path']) not in self.path_classes:
+            await self.app(scope, receive, send)
+            return
+        await self.handle(scope, receive, send)
+
+    @abstractmethod
+    async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Process a request of the declared path classes"""
+        pass
+
+
+class RateLimitMiddleware(RouteAwareMiddleware):
+    path_classes = {PathClass.api, PathClass.oauth2}
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        result = await check_limit(Request(scope))
+        headers = result.headers()
+        if not result.allowed:
+            response = ORJSONResponse(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                content={'detail': 'Too many requests'},
+                headers=headers,
+            )
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                MutableHeaders(scope=message).update(headers)
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class RequestIdMiddleware(RouteAwareMiddleware):
+    """
+    Обработчик заголовка X-Request-Id.
+    Id берется из запроса или генерируется, попадает в записи логов и возвращается в ответе.
+    """
+
+    path_classes = {PathClass.api, PathClass.oauth2, PathClass.docs, PathClass.static}
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        request_id = None
+        for name, value in scope['headers']:
+            if name == b'x-request-id':
+                request_id = value.decode('latin-1')
+                break
+        if not request_id:
+            request_id = uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_request_id(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                MutableHeaders(scope=message)[REQUEST_ID_HEADER] = request_id
+            await send(message)
+
+        try:
+            log.info('<<<request_id middleware>>>')
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
+
+
+class ScopedSessionMiddleware(RouteAwareMiddleware):
+    """Cookie session only where it is used: oauth2 flow and homepage"""
+
+    path_classes = {PathClass.oauth2, PathClass.static}
+
+    def __init__(self, app: ASGIApp, **session_kwargs) -> None:
+        super().__init__(app)
+        self.session = SessionMiddleware(app, **session_kwargs)
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.session(scope, receive, send)
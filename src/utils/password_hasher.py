@@ -0,0 +1,194 @@
+import logging.config
+import time
+from abc import ABC, abstractmethod
+from typing import List
+
+import bcrypt
+from argon2 import PasswordHasher, Type, extract_parameters
+from argon2.exceptions import InvalidHash, VerificationError
+
+from core.config import hash_settings
+from core.logger import LOGGING
+
+logging.config.dictConfig(LOGGING)
+log = logging.getLogger(__name__)
+
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 16
+ARGON2_MAX_TIME_COST = 16
+
+
+class PasswordHasherBase(ABC):
+    """One password hashing scheme with fixed parameters"""
+
+    @abstractmethod
+    def hash(self, pwd: str) -> str:
+        """Get a hashed password"""
+
+    @abstractmethod
+    def verify(self, pwd_in: str, pwd_hash: str) -> bool:
+        """Password match check"""
+
+    @abstractmethod
+    def identify(self, pwd_hash: str) -> bool:
+        """Check the hash was produced by this scheme"""
+
+    @abstractmethod
+    def needs_rehash(self, pwd_hash: str) -> bool:
+        """Check the hash was made with a lower cost than the current one"""
+
+
+class BcryptHasher(PasswordHasherBase):
+    def __init__(self, rounds: int) -> None:
+        self.rounds = rounds
+
+    def __repr__(self) -> str:
+        return f'BcryptHasher(rounds={self.rounds})'
+
+    def hash(self, pwd: str) -> str:
+        salt = bcrypt.gensalt(self.rounds)
+        return bcrypt.hashpw(pwd.encode('utf-8'), salt).decode('utf-8')
+
+    def verify(self, pwd_in: str, pwd_hash: str) -> bool:
+        return bcrypt.checkpw(pwd_in.encode('utf-8'), pwd_hash.encode('utf-8'))
+
+    def identify(self, pwd_hash: str) -> bool:
+        return pwd_hash.startswith(('$2a$', '$2b$', '$2y$'))
+
+    def needs_rehash(self, pwd_hash: str) -> bool:
+        # $2b$12$<salt+hash>; только повышение: хеш дороже текущего не понижается
+        return int(pwd_hash.split('$')[2]) < self.rounds
+
+
+class Argon2Hasher(PasswordHasherBase):
+    def __init__(self, time_cost: int, memory_cost: int, parallelism: int) -> None:
+        self.time_cost = time_cost
+        self.memory_cost = memory_cost
+        self.parallelism = parallelism
+
+    def __repr__(self) -> str:
+        return f'Argon2Hasher(time_cost={self.time_cost}, memory_cost={self.memory_cost}, ' \
+               f'parallelism={self.parallelism})'
+
+    def _hasher(self) -> PasswordHasher:
+        return PasswordHasher(time_cost=self.time_cost,
+                              memory_cost=self.memory_cost,
+                              parallelism=self.parallelism,
+                              type=Type.ID,
+                              )
+
+    def hash(self, pwd: str) -> str:
+        return self._hasher().hash(pwd)
+
+    def verify(self, pwd_in: str, pwd_hash: str) -> bool:
+        try:
+            return self._hasher().verify(pwd_hash, pwd_in)
+        except (VerificationError, InvalidHash):
+            return False
+
+    def identify(self, pwd_hash: str) -> bool:
+        return pwd_hash.startswith('$argon2id$')
+
+    def needs_rehash(self, pwd_hash: str) -> bool:
+        try:
+            params = extract_parameters(pwd_hash)
+        except InvalidHash:
+            return True
+        # parallelism не делает хеш стойче, сравниваются только время и память
+        return params.time_cost < self.time_cost or params.memory_cost < self.memory_cost
+
+
+def _measure_ms(hasher: PasswordHasherBase) -> float:
+    started = time.perf_counter()
+    hasher.hash('calibration-password')
+    return (time.perf_counter() - started) * 1000
+
+
+def calibrate_bcrypt(target_ms: int, min_rounds: int = BCRYPT_MIN_ROUNDS) -> BcryptHasher:
+    """Pick the largest bcrypt cost that still hashes within target_ms, but not below min_rounds"""
+    hasher = BcryptHasher(max(min_rounds, BCRYPT_MIN_ROUNDS))
+    elapsed = _measure_ms(hasher)
+    # каждый следующий раунд удваивает время хеширования
+    while hasher.rounds < BCRYPT_MAX_ROUNDS and elapsed * 2 <= target_ms:
+        hasher.rounds += 1
+        elapsed *= 2
+    return hasher
+
+
+def calibrate_argon2(target_ms: int, memory_cost: int, parallelism: int, min_time_cost: int = 1) -> Argon2Hasher:
+    """Pick the largest argon2id time cost that still hashes within target_ms, but not below min_time_cost"""
+    hasher = Argon2Hasher(max(min_time_cost, 1), memory_cost, parallelism)
+    while hasher.time_cost < ARGON2_MAX_TIME_COST:
+        hasher.time_cost += 1
+        if _measure_ms(hasher) > target_ms:
+            hasher.time_cost -= 1
+            break
+    return hasher
+
+
+class HashPolicy:
+    """Current hashing scheme plus legacy schemes still accepted for verification"""
+
+    def __init__(self, current: PasswordHasherBase, legacy: List[PasswordHasherBase]) -> None:
+        self.current = current
+        self.legacy = legacy
+
+    def _identify(self, pwd_hash: str) -> PasswordHasherBase:
+        for hasher in [self.current, *self.legacy]:
+            if hasher.identify(pwd_hash):
+                return hasher
+        raise ValueError('Unknown password hash scheme')
+
+    def hash(self, pwd: str) -> str:
+        return self.current.hash(pwd)
+
+    def verify(self, pwd_in: str, pwd_hash: str) -> bool:
+        try:
+            hasher = self._identify(pwd_hash)
+        except ValueError:
+            return False
+        return hasher.verify(pwd_in, pwd_hash)
+
+    def needs_rehash(self, pwd_hash: str) -> bool:
+        return not self.current.identify(pwd_hash) or self.current.needs_rehash(pwd_hash)
+
+    @staticmethod
+    def cost(pwd_hash: str) -> str:
+        """Scheme and cost parameters of a stored hash without salt and digest, ex: $2b$12"""
+        parts = pwd_hash.split('$')
+        if len(parts) == 4:
+            # bcrypt: $2b$<rounds>$<salt+digest>
+            return '$'.join(parts[:3])
+        if len(parts) == 6:
+            # argon2: $argon2id$v=19$m=..,t=..,p=..$<salt>$<digest>
+            return '$'.join(parts[:4])
+        return 'unknown'
+
+    def calibrate(self, target_ms: int) -> None:
+        """
+        Raise the current scheme parameters to fit the latency budget.
+        Настроенная стоимость - нижняя граница: медленный старт не должен ослабить хеши.
+        """
+        if isinstance(self.current, Argon2Hasher):
+            self.current = calibrate_argon2(target_ms,
+                                            self.current.memory_cost,
+                                            self.current.parallelism,
+                                            self.current.time_cost,
+                                            )
+        else:
+            self.current = calibrate_bcrypt(target_ms, self.current.rounds)
+        log.info('Password hashing calibrated for %s ms: %s', target_ms, self.current)
+
+
+def _build_hash_policy() -> HashPolicy:
+    bcrypt_hasher = BcryptHasher(hash_settings.bcrypt_rounds)
+    argon2_hasher = Argon2Hasher(hash_settings.argon2_time_cost,
+                                 hash_settings.argon2_memory_cost,
+                                 hash_settings.argon2_parallelism,
+                                 )
+    if hash_settings.algorithm == 'argon2id':
+        return HashPolicy(argon2_hasher, [bcrypt_hasher])
+    return HashPolicy(bcrypt_hasher, [argon2_hasher])
+
+
+hash_policy = _build_hash_policy()
@@ -5,15 +5,22 @@ from typing import Any, Dict
 from fastapi import status, HTTPException, Depends, Cookie
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import jwt
+from opentelemetry import trace
 from pydantic import ValidationError
 
+from core import metrics
 from core.config import token_settings
+from core.logger import user_id_var
+from core.tracer import traced
 from models import token as token_models
-from db.token import TokenDBBase, get_token_db
+from db.token import TokenDBBase, get_token_db, token_db
 
 
+@traced('verify_token')
 async def _verify_token(token: str, token_db: TokenDBBase, type: token_models.TokenType) -> str:
+    trace.get_current_span().set_attribute('token.type', type)
     if token is None:
+        metrics.TOKEN_VERIFICATIONS.labels(type, 'missing').inc()
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail='Could not validate credentials',
@@ -36,9 +43,15 @@ async def _verify_token(token: str, token_db: TokenDBBase, type: token_models.To
         )
 
         token_data = payload_model(**payload)
+        user_id_var.set(str(token_data.sub))
 
         expired = await token_db.is_exist(token)
+        if not expired:
+            # отметка logout_all/деактивации отзывает все ранее выпущенные токены пользователя
+            revoked_before = await token_db.get_user_revoked_before(token_data.sub)
+            expired = revoked_before is not None and token_data.is_issued_before(revoked_before)
         if token_data.exp < datetime.now(timezone.utc) or expired:
+            metrics.TOKEN_VERIFICATIONS.labels(type, 'revoked' if expired else 'expired').inc()
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail='Token expired',
@@ -46,11 +59,13 @@ async def _verify_token(token: str, token_db: TokenDBBase, type: token_models.To
             )
 
     except(jwt.JWTError, ValidationError):
+        metrics.TOKEN_VERIFICATIONS.labels(type, 'invalid').inc()
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail='Could not validate credentials',
             headers={'WWW-Authenticate': 'Bearer'},
         )
+    metrics.TOKEN_VERIFICATIONS.labels(type, 'valid').inc()
     return token
 
 
@@ -102,12 +117,17 @@ class TokenManager(TokenManagerBase):
                               algorithm: str,
                               payload_model: token_models.TokenPayloadBase,
                               ) -> str:
-        expires_delta = datetime.utcnow() + timedelta(minutes=expires_delta)
-
-        token_payload = payload_model(**data, exp=expires_delta)
-        encoded_jwt = jwt.encode(token_payload.dict(), secret_key, algorithm)
+        issued_at = datetime.now(timezone.utc)
+        expires_delta = issued_at + timedelta(minutes=expires_delta)
+
+        token_payload = payload_model(**data, exp=expires_delta, iat=issued_at)
+        claims = token_payload.dict()
+        # jose округляет datetime до секунд, а отзыв всех токенов пользователя (revoke_user_before) сравнивает по мс
+        claims['iat'] = token_models.ms_timestamp(issued_at)
+        encoded_jwt = jwt.encode(claims, secret_key, algorithm)
         return encoded_jwt
 
+    @traced(attributes={'token.type': token_models.TokenType.access.value})
     async def generate_access_token(self, data: Dict[str, Any]) -> str:
         access_token = await self._generate_token(data,
                                                   expires_delta=token_settings.access_expire,
@@ -117,6 +137,7 @@ class TokenManager(TokenManagerBase):
                                                   )
         return access_token
 
+    @traced(attributes={'token.type': token_models.TokenType.refresh.value})
     async def generate_refresh_token(self, data: Dict[str, Any]) -> str:
         refresh_token = await self._generate_token(data,
                                                    expires_delta=token_settings.refresh_expire,
@@ -137,6 +158,7 @@ class TokenManager(TokenManagerBase):
         )
         return payload_model(**payload)
 
+    @traced(attributes={'token.type': token_models.TokenType.access.value})
     async def get_data_from_access_token(self, token: str) -> token_models.AccessTokenPayload:
         token_data = await self._get_data_from_token(token,
                                                      secret_key=token_settings.access_secret_key.get_secret_value(),
@@ -145,6 +167,7 @@ class TokenManager(TokenManagerBase):
                                                      )
         return token_data
 
+    @traced(attributes={'token.type': token_models.TokenType.refresh.value})
     async def get_data_from_refresh_token(self, token: str) -> token_models.RefreshTokenPayload:
         return await self._get_data_from_token(token,
                                                secret_key=token_settings.refresh_secret_key.get_secret_value(),
@@ -153,5 +176,9 @@ class TokenManager(TokenManagerBase):
                                                )
 
 
-async def get_token_manager(token_db: TokenDBBase = Depends(get_token_db)) -> TokenManagerBase:
-    return TokenManager(token_db)
+# ключи и алгоритм берутся из настроек, состояния запроса нет - один экземпляр на воркер
+token_manager = TokenManager(token_db)
+
+
+def get_token_manager() -> TokenManagerBase:
+    return token_manager
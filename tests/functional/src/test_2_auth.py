@@ -35,6 +35,42 @@ async def test_register(make_post_request, query_data, expected_answer):
     assert body == expected_answer['body']
 
 
+@pytest.mark.parametrize(
+    'query_data, expected_answer',
+    [
+        (
+                # тот же login
+                {
+                    "login": "new_user_",
+                    "name": "John",
+                    "surname": "Doe",
+                    "email": "other@example.com",
+                    "password": "123qwe"
+                },
+                {'status': HTTPStatus.BAD_REQUEST, 'body': {'detail': 'User already exist'}}
+        ),
+        (
+                # тот же email
+                {
+                    "login": "other_user_",
+                    "name": "John",
+                    "surname": "Doe",
+                    "email": "johndoe@example.com",
+                    "password": "123qwe"
+                },
+                {'status': HTTPStatus.BAD_REQUEST, 'body': {'detail': 'User already exist'}}
+        ),
+    ]
+)
+@pytest.mark.asyncio
+async def test_register_existing(make_post_request, query_data, expected_answer):
+    status, body, _ = await make_post_request(api_postfix="/api/v1/auth",
+                                              endpoint="/register",
+                                              query_data=query_data)
+    assert status == expected_answer['status']
+    assert body == expected_answer['body']
+
+
 @pytest.mark.parametrize(
     'query_data, expected_answer',
     [
@@ -110,7 +146,18 @@ async def test_entries(make_get_request, query_data, expected_answer, request):
                                           endpoint="/entries",
                                           token=token)
     assert status == expected_answer['status']
-    assert len(body) == expected_answer['len_body']
+    assert len(body['items']) == expected_answer['len_body']
+    assert body['next_cursor'] is None
+
+
+@pytest.mark.asyncio
+async def test_entries_invalid_cursor(make_get_request, request):
+    token = request.config.cache.get('access_token', None)
+    status, body = await make_get_request(api_postfix="/api/v1/auth",
+                                          endpoint="/entries",
+                                          query_data={'cursor': 'not-a-cursor'},
+                                          token=token)
+    assert status == HTTPStatus.BAD_REQUEST
 
 
 @pytest.mark.parametrize(
@@ -0,0 +1,25 @@
+from http import HTTPStatus
+
+import pytest
+
+
+@pytest.mark.parametrize(
+    'endpoint, expected_answer',
+    [
+        ('/healthz', {'status': HTTPStatus.OK, 'body': {'status': 'ok'}}),
+        ('/readyz', {'status': HTTPStatus.OK, 'body': {'status': 'ok', 'checks': {'postgres': 'ok', 'redis': 'ok'}}}),
+    ]
+)
+@pytest.mark.asyncio
+async def test_health(make_get_request, endpoint, expected_answer):
+    status, body = await make_get_request(api_postfix=endpoint)
+    assert status == expected_answer['status']
+    assert body == expected_answer['body']
+
+
+@pytest.mark.asyncio
+async def test_health_is_not_rate_limited(make_get_request):
+    """Пробы балансировщика не расходуют лимит запросов"""
+    for _ in range(100):
+        status, _ = await make_get_request(api_postfix='/healthz')
+        assert status == HTTPStatus.OK
@@ -0,0 +1,70 @@
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import text
+
+
+def _index_names(plan: dict) -> set:
+    """Собрать имена индексов из всех узлов плана"""
+    names = set()
+    if 'Index Name' in plan:
+        names.add(plan['Index Name'])
+    for child in plan.get('Plans', []):
+        names |= _index_names(child)
+    return names
+
+
+def _parent_indexes(db_session, names: set) -> set:
+    """Индексы секций entry имеют сгенерированные имена, заменяем их индексом родительской таблицы"""
+    parents = db_session.execute(
+        text('SELECT child.relname, parent.relname FROM pg_inherits '
+             'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+             'JOIN pg_class parent ON parent.oid = pg_inherits.inhparent '
+             'WHERE child.relname = ANY(:names)'),
+        {'names': list(names)},
+    ).all()
+    resolved = dict(parents)
+    return {resolved.get(name, name) for name in names}
+
+
+@pytest.mark.parametrize(
+    'query, expected_index',
+    [
+        # EntryDAL.get_by_user_id(only_active=True)
+        (
+                'SELECT * FROM entry WHERE user_id = :id AND is_active = true',
+                'ix_entry_user_id_is_active',
+        ),
+        # EntryDAL.get_by_user_agent(only_active=True)
+        (
+                "SELECT * FROM entry WHERE user_agent = 'agent' AND is_active = true",
+                'ix_entry_user_agent_active',
+        ),
+        # UserRoleDAL.get_by_user_id, RoleDAL.get_by_user_id
+        (
+                'SELECT * FROM user_role WHERE user_id = :id',
+                'uq_user_role_user_id_role_id',
+        ),
+        # UserRoleDAL.get_by_role_id
+        (
+                'SELECT * FROM user_role WHERE role_id = :id',
+                'ix_user_role_role_id',
+        ),
+        # UserSocialDAL.get_by_user_id
+        (
+                'SELECT * FROM user_socials WHERE user_id = :id',
+                'ix_user_socials_user_id',
+        ),
+        # поиск соцсети по провайдеру и sub
+        (
+                "SELECT * FROM user_socials WHERE provider = 'google' AND sub_id = 'sub'",
+                'uq_user_socials_provider_sub_id',
+        ),
+    ]
+)
+def test_lookup_uses_index(db_session, query: str, expected_index: str):
+    """Горячие выборки не должны сканировать таблицы целиком"""
+    # на маленькой тестовой таблице seq scan дешевле, запрещаем его, чтобы проверить наличие индекса
+    db_session.execute(text('SET LOCAL enable_seqscan = off'))
+    plan = db_session.execute(text(f'EXPLAIN (FORMAT JSON) {query}'), {'id': uuid4()}).scalar()
+    assert expected_index in _parent_indexes(db_session, _index_names(plan[0]['Plan']))
@@ -0,0 +1,23 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+
+def test_entry_is_partitioned(db_session):
+    """История входов секционирована по date_time"""
+    strategy = db_session.execute(text("""
+        SELECT p.partstrat FROM pg_partitioned_table p
+        WHERE p.partrelid = CAST('entry' AS regclass)
+    """)).scalar()
+    assert strategy == 'r'
+
+
+def test_current_month_partition_exists(db_session):
+    """Вход в текущем месяце попадает в свою секцию, а не в секцию по умолчанию"""
+    partitions = set(db_session.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST('entry' AS regclass)
+    """)).scalars())
+    assert f'entry_p{datetime.utcnow():%Y%m}' in partitions
+    assert 'entry_default' in partitions
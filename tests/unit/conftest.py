@@ -0,0 +1,16 @@
+import os
+import sys
+
+current = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(current)), 'src'))
+
+# модули сервиса читают настройки при импорте, соединения с БД не открываются
+os.environ.setdefault('PG_DB_NAME', 'unit')
+os.environ.setdefault('PG_DB_USER', 'unit')
+os.environ.setdefault('PG_DB_PASSWORD', 'unit')
+os.environ.setdefault('LOG_FILE', '')
+os.environ.setdefault('TOKEN_ACCESS_SECRET_KEY', 'unit-access')
+os.environ.setdefault('TOKEN_REFRESH_SECRET_KEY', 'unit-refresh')
+os.environ.setdefault('JAEGER_ENABLED', 'false')
+
+pytest_plugins = "unit.fixtures"
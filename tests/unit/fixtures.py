@@ -0,0 +1,178 @@
+import asyncio
+import fnmatch
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+
+class FakeScalars:
+    def __init__(self, values: List[Any]) -> None:
+        self._values = values
+
+    def all(self) -> List[Any]:
+        return list(self._values)
+
+    fetchall = all
+
+
+class FakeResult:
+    def __init__(self, rows: List[tuple]) -> None:
+        self._rows = rows
+        self.rowcount = len(rows)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self) -> List[tuple]:
+        return list(self._rows)
+
+    def one(self) -> tuple:
+        return self._rows[0]
+
+    def scalar_one_or_none(self):
+        return self._rows[0][0] if self._rows else None
+
+    def scalars(self) -> FakeScalars:
+        return FakeScalars([row[0] for row in self._rows])
+
+
+class CountingSession:
+    """AsyncSession stand-in: counts round trips, answers statements with prepared rows"""
+
+    def __init__(self, *results: List[tuple]) -> None:
+        self._results = list(results)
+        self.statements = []
+        self.added = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    async def execute(self, statement, *args, **kwargs) -> FakeResult:
+        self.statements.append(statement)
+        return FakeResult(self._results.pop(0) if self._results else [])
+
+    def add(self, instance: Any) -> None:
+        self.added.append(instance)
+
+    async def flush(self) -> None:
+        # INSERT добавленных объектов - тоже запрос к БД
+        self.statements.extend(self.added)
+        self.added = []
+
+    async def commit(self) -> None:
+        self.commits += 1
+
+    async def rollback(self) -> None:
+        self.rollbacks += 1
+
+
+@pytest.fixture
+def counting_session():
+    return CountingSession
+
+
+class FakePipeline:
+    """Queues commands and runs them on execute, like a non-transactional pipeline"""
+
+    def __init__(self, redis: 'FakeRedis') -> None:
+        self._redis = redis
+        self._commands = []
+
+    def __getattr__(self, name: str):
+        def queue(*args, **kwargs) -> 'FakePipeline':
+            self._commands.append((getattr(self._redis, name), args, kwargs))
+            return self
+        return queue
+
+    async def execute(self) -> List[Any]:
+        return [await command(*args, **kwargs) for command, args, kwargs in self._commands]
+
+
+class FakePubSub:
+    """Receives messages published to the fake redis after subscribe"""
+
+    def __init__(self, redis: 'FakeRedis') -> None:
+        self._redis = redis
+        self.channels: List[bytes] = []
+        self.messages: List[dict] = []
+        self.closed = False
+
+    async def subscribe(self, *channels: str) -> None:
+        self.channels.extend(channel.encode('utf-8') for channel in channels)
+        self._redis.pubsubs.append(self)
+
+    async def get_message(self, ignore_subscribe_messages: bool = False, timeout: float = 0.0) -> Optional[dict]:
+        if self.messages:
+            return self.messages.pop(0)
+        await asyncio.sleep(0)
+        return None
+
+    async def close(self) -> None:
+        self.closed = True
+        self._redis.pubsubs.remove(self)
+
+
+class FakeRedis:
+    """In-memory redis for caches and the token store: key commands and publish, counts reads"""
+
+    def __init__(self) -> None:
+        self.data: Dict[bytes, Any] = {}
+        self.published: List[tuple] = []
+        self.pubsubs: List[FakePubSub] = []
+        self.gets = 0
+
+    @staticmethod
+    def _key(key: Any) -> bytes:
+        # str и bytes - один и тот же ключ, как в настоящем redis
+        return key if isinstance(key, bytes) else str(key).encode('utf-8')
+
+    async def get(self, key: Any) -> Optional[Any]:
+        self.gets += 1
+        return self.data.get(self._key(key))
+
+    async def mget(self, keys: List[Any]) -> List[Any]:
+        return [self.data.get(self._key(key)) for key in keys]
+
+    async def set(self, key: Any, value: Any, ex: Optional[int] = None) -> None:
+        self.data[self._key(key)] = value
+
+    async def exists(self, key: Any) -> int:
+        return int(self._key(key) in self.data)
+
+    async def incr(self, key: Any) -> int:
+        key = self._key(key)
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    async def publish(self, channel: str, message: Any) -> int:
+        self.published.append((channel, message))
+        channel = channel.encode('utf-8')
+        data = message if isinstance(message, bytes) else str(message).encode('utf-8')
+        receivers = [pubsub for pubsub in self.pubsubs if channel in pubsub.channels]
+        for pubsub in receivers:
+            pubsub.messages.append({'type': 'message', 'channel': channel, 'data': data})
+        return len(receivers)
+
+    def pubsub(self) -> FakePubSub:
+        return FakePubSub(self)
+
+    def pipeline(self, transaction: bool = True) -> FakePipeline:
+        return FakePipeline(self)
+
+    async def scan_iter(self, match: str, count: Optional[int] = None):
+        for key in list(self.data):
+            if fnmatch.fnmatchcase(key.decode('latin-1'), match):
+                yield key
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Role cache on an in-memory redis, fresh for every test"""
+    from db import role_cache as role_cache_module
+    from services import auth, role
+
+    redis = FakeRedis()
+    cache = role_cache_module.RoleCache(enabled=True, local_ttl=60, local_size=100, redis_ttl=60, version_ttl=60)
+    monkeypatch.setattr(role_cache_module, 'get_redis', lambda: redis)
+    monkeypatch.setattr(role, 'role_cache', cache)
+    monkeypatch.setattr(auth, 'role_cache', cache)
+    return redis
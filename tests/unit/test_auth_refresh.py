@@ -0,0 +1,48 @@
+from collections import namedtuple
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from db.token import TokenDB
+from services.auth import AuthService
+from utils.token_manager import TokenManager
+
+USER_ID = str(uuid4())
+LoginState = namedtuple('LoginState', 'login is_active')
+
+
+async def refresh_token(login: str) -> str:
+    payload = {'sub': USER_ID, 'login': login, 'role': [], 'session_id': str(uuid4())}
+    return await TokenManager(None).generate_refresh_token(payload)
+
+
+@pytest.mark.asyncio
+async def test_refresh_takes_login_from_db(counting_session, fake_redis):
+    """После смены логина через /update обновленные токены содержат новый логин"""
+    session = counting_session([LoginState('renamed', True)])
+    service = AuthService(TokenDB(fake_redis), TokenManager(None), session)
+    access_token, new_refresh_token = await service.refresh_tokens(await refresh_token('old'), 'agent')
+    assert jwt.get_unverified_claims(access_token)['login'] == 'renamed'
+    assert jwt.get_unverified_claims(new_refresh_token)['login'] == 'renamed'
+    assert session.commits == 1
+
+
+@pytest.mark.parametrize(
+    'state, detail',
+    [
+        (None, 'User does not exist'),
+        (LoginState('old', False), 'Account is not active'),
+    ]
+)
+@pytest.mark.asyncio
+async def test_refresh_rejects_missing_or_inactive_user(counting_session, fake_redis, state, detail: str):
+    session = counting_session([state] if state else [])
+    service = AuthService(TokenDB(fake_redis), TokenManager(None), session)
+    with pytest.raises(HTTPException) as error:
+        await service.refresh_tokens(await refresh_token('old'), 'agent')
+    assert error.value.detail == detail
+    # старая сессия не закрыта
+    assert len(session.statements) == 1
+    assert session.commits == 0
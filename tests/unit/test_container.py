@@ -0,0 +1,18 @@
+from core.container import container, get_auth_service, get_role_service
+
+
+def test_services_share_singletons_and_bind_the_session(counting_session):
+    """На запрос создается только сервис с сессией, менеджер токенов и хранилище - общие"""
+    first, second = counting_session(), counting_session()
+    first_service, second_service = get_auth_service(first), get_auth_service(second)
+    assert first_service is not second_service
+    assert first_service.user_db_session is first
+    assert second_service.user_db_session is second
+    assert first_service.token_manager is second_service.token_manager is container.token_manager
+    assert first_service.token_db is second_service.token_db is container.token_db
+
+
+def test_role_service_is_bound_to_the_session(counting_session):
+    first, second = counting_session(), counting_session()
+    assert get_role_service(first).db is first
+    assert get_role_service(second).db is second
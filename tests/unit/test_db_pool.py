@@ -0,0 +1,28 @@
+from core import metrics
+from db.session import MeteredPool
+
+
+def pool_waits() -> float:
+    return next(sample.value for sample in metrics.DB_POOL_WAIT.collect()[0].samples if sample.name.endswith('_count'))
+
+
+class FakeConnection:
+    def rollback(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def test_pool_gauges_follow_checkouts():
+    pool = MeteredPool(FakeConnection, pool_size=1, max_overflow=1, timeout=0)
+    waits = pool_waits()
+    first, second = pool.connect(), pool.connect()
+    assert metrics.DB_POOL_CHECKED_OUT._value.get() == 2
+    assert metrics.DB_POOL_OVERFLOW._value.get() == 1
+    assert pool_waits() == waits + 2
+
+    second.close()
+    first.close()
+    assert metrics.DB_POOL_CHECKED_OUT._value.get() == 0
+    assert metrics.DB_POOL_OVERFLOW._value.get() == 0
@@ -0,0 +1,105 @@
+from datetime import datetime
+from typing import Dict, List, Set
+
+import pytest
+
+from db.entry_partitions import DEFAULT_PARTITION, EntryPartitionManager
+
+
+class FakeResult:
+    def __init__(self, rows: List[tuple] = (), rowcount: int = 0) -> None:
+        self._rows = list(rows)
+        self.rowcount = rowcount
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def scalar(self):
+        return self._rows[0][0] if self._rows else None
+
+
+class FakeConnection:
+    """Answers the catalogue queries of the partition manager and records the rest of the SQL"""
+
+    def __init__(self, attached: Set[str], detached: Set[str] = (), default_rows: List[datetime] = ()) -> None:
+        self.attached = set(attached)
+        self.detached = set(detached)
+        self.default_rows = list(default_rows)
+        self.statements: List[str] = []
+
+    async def execute(self, statement, params: Dict = None) -> FakeResult:
+        sql = ' '.join(str(statement).split())
+        params = params or {}
+        if 'FROM pg_inherits' in sql:
+            return FakeResult([(name,) for name in sorted(self.attached)])
+        if 'FROM pg_class' in sql:
+            return FakeResult([(name,) for name in sorted(self.detached)])
+        if sql.startswith('SELECT EXISTS'):
+            found = any(params['start'] <= row < params['end'] for row in self.default_rows)
+            return FakeResult([(found,)])
+        self.statements.append(sql)
+        if sql.startswith(f'DELETE FROM {DEFAULT_PARTITION}'):
+            deleted = [row for row in self.default_rows if row < params['cutoff']]
+            self.default_rows = [row for row in self.default_rows if row >= params['cutoff']]
+            return FakeResult(rowcount=len(deleted))
+        return FakeResult()
+
+
+def manager(retention: int = 12) -> EntryPartitionManager:
+    return EntryPartitionManager(premake=1, retention=retention, archive=False, archive_dir='', interval=60)
+
+
+NOW = datetime(2023, 10, 17)
+
+
+@pytest.mark.asyncio
+async def test_missing_months_are_created():
+    conn = FakeConnection({'entry_p202310', DEFAULT_PARTITION})
+    assert await manager().ensure_partitions(conn, NOW) == ['entry_p202311']
+    assert conn.statements == [
+        "CREATE TABLE IF NOT EXISTS entry_p202311 PARTITION OF entry "
+        "FOR VALUES FROM ('2023-11-01T00:00:00') TO ('2023-12-01T00:00:00')"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_rows_in_default_partition_are_moved():
+    """Месяц, строки которого уже в секции по умолчанию, получает секцию вместе с этими строками"""
+    conn = FakeConnection({DEFAULT_PARTITION}, default_rows=[datetime(2023, 10, 3)])
+    assert await manager().ensure_partitions(conn, NOW) == ['entry_p202310', 'entry_p202311']
+    moved, plain = conn.statements
+    assert moved.startswith('DO $$ BEGIN ALTER TABLE entry DETACH PARTITION entry_default;')
+    assert 'CREATE TABLE entry_p202310 PARTITION OF entry' in moved
+    assert "INSERT INTO entry_p202310 SELECT * FROM entry_default WHERE date_time >= '2023-10-01T00:00:00'" in moved
+    assert "DELETE FROM entry_default WHERE date_time >= '2023-10-01T00:00:00'" in moved
+    assert moved.endswith('ALTER TABLE entry ATTACH PARTITION entry_default DEFAULT; END $$')
+    assert plain.startswith('CREATE TABLE IF NOT EXISTS entry_p202311')
+
+
+@pytest.mark.asyncio
+async def test_default_partition_is_created_once():
+    conn = FakeConnection({'entry_p202310', 'entry_p202311'})
+    await manager().ensure_partitions(conn, NOW)
+    assert conn.statements == ['CREATE TABLE IF NOT EXISTS entry_default PARTITION OF entry DEFAULT']
+
+
+@pytest.mark.asyncio
+async def test_old_partitions_are_detached_and_dropped():
+    conn = FakeConnection({'entry_p202209', 'entry_p202210', DEFAULT_PARTITION}, detached={'entry_p202208'})
+    assert await manager().expire_partitions(conn, NOW) == ['entry_p202208']
+    assert conn.statements == ['ALTER TABLE entry DETACH PARTITION entry_p202209', 'DROP TABLE entry_p202208']
+
+
+@pytest.mark.asyncio
+async def test_retention_covers_default_partition():
+    conn = FakeConnection({DEFAULT_PARTITION}, default_rows=[datetime(2022, 1, 5), datetime(2023, 9, 1)])
+    assert await manager().expire_partitions(conn, NOW) == [DEFAULT_PARTITION]
+    assert conn.statements == ['DELETE FROM entry_default WHERE date_time < :cutoff']
+    assert conn.default_rows == [datetime(2023, 9, 1)]
+
+
+@pytest.mark.asyncio
+async def test_zero_retention_keeps_everything():
+    conn = FakeConnection({'entry_p200001', DEFAULT_PARTITION}, default_rows=[datetime(2000, 1, 1)])
+    assert await manager(retention=0).expire_partitions(conn, NOW) == []
+    assert conn.statements == []
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from core import metrics
+from utils.hash_executor import HashExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = HashExecutor('thread', max_workers=1, max_pending=2)
+    yield executor
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_result_is_returned(executor):
+    assert await executor.run('hash', pow, 2, 10) == 1024
+    assert executor.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_rejected_with_429(executor):
+    """Сверх max_pending запрос сразу получает 429, а не ждет в очереди"""
+    release = threading.Event()
+    rejected = metrics.HASH_REJECTED._value.get()
+    running = [asyncio.create_task(executor.run('hash', release.wait)) for _ in range(2)]
+    await asyncio.sleep(0)
+    assert executor.pending == 2
+
+    with pytest.raises(HTTPException) as error:
+        await executor.run('hash', release.wait)
+    assert error.value.status_code == 429
+    assert error.value.headers == {'Retry-After': '1'}
+    assert metrics.HASH_REJECTED._value.get() == rejected + 1
+
+    release.set()
+    assert await asyncio.gather(*running) == [True, True]
+    assert executor.pending == 0
+    assert await executor.run('hash', pow, 2, 3) == 8
+
+
+@pytest.mark.asyncio
+async def test_pending_is_released_on_error(executor):
+    with pytest.raises(ZeroDivisionError):
+        await executor.run('verify', divmod, 1, 0)
+    assert executor.pending == 0
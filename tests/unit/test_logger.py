@@ -0,0 +1,86 @@
+import logging
+import queue
+import sys
+
+import orjson
+import pytest
+from pydantic import SecretStr
+
+from core import logger
+from core.logger import JsonFormatter, QueueLogHandler, RedactingQueueListener, RequestIdFilter, SamplingFilter, \
+    redact
+
+
+@pytest.mark.parametrize(
+    'message, secret',
+    [
+        ('Login: bob, pwd:{}, user_agent:ua'.format(SecretStr('x')), None),
+        ("password='hunter2' other=1", 'hunter2'),
+        ('Authorization: Bearer abc.def', 'abc.def'),
+        ('refresh eyJhbGciOi.eyJzdWIi.c2ln issued', 'eyJhbGciOi.eyJzdWIi.c2ln'),
+        ("{'refresh_token': 'zzz', 'login': 'bob'}", 'zzz'),
+        ("parameters: ('bob', '$2b$12$abcdefghijklmnopqrstuv')", '$2b$12$abcdefghijklmnopqrstuv'),
+    ]
+)
+def test_redact(message: str, secret: str):
+    redacted = redact(message)
+    if secret:
+        assert secret not in redacted
+    assert '***' in redacted or '<' in redacted
+
+
+def test_redact_keeps_plain_messages():
+    assert redact('CRUD Get User by Login: login=bob') == 'CRUD Get User by Login: login=bob'
+
+
+def test_records_are_redacted_in_writer_thread():
+    """На пути запроса сообщение только собирается, маскирование - в потоке вывода"""
+    try:
+        raise ValueError("password='hunter2'")
+    except ValueError:
+        record = logging.LogRecord('x', logging.INFO, __file__, 1, 'token=%s', ('abc',), sys.exc_info())
+    prepared = QueueLogHandler().prepare(record)
+    assert (prepared.msg, prepared.args) == ('token=abc', None)
+
+    written = RedactingQueueListener(queue.Queue()).prepare(prepared)
+    assert written.getMessage() == 'token=***'
+    assert 'hunter2' not in written.exc_text
+
+
+def test_full_queue_drops_records(monkeypatch):
+    """Переполненная очередь не блокирует запрос, запись отбрасывается"""
+    monkeypatch.setattr(logger, 'start_log_listener', lambda: None)
+    handler = QueueLogHandler()
+    handler.queue = queue.Queue(1)
+    dropped = QueueLogHandler.dropped
+    record = logging.LogRecord('x', logging.INFO, __file__, 1, 'message', None, None)
+    handler.enqueue(record)
+    handler.enqueue(record)
+    assert QueueLogHandler.dropped == dropped + 1
+
+
+def test_json_line_has_request_context():
+    record = logging.LogRecord('x', logging.INFO, __file__, 1, 'hello %s', ('world',), None)
+    token = logger.request_id_var.set('req-1')
+    user_token = logger.user_id_var.set('user-1')
+    try:
+        RequestIdFilter().filter(record)
+    finally:
+        logger.request_id_var.reset(token)
+        logger.user_id_var.reset(user_token)
+    entry = orjson.loads(JsonFormatter().format(record))
+    assert entry['message'] == 'hello world'
+    assert entry['request_id'] == 'req-1'
+    assert entry['user_id'] == 'user-1'
+    assert entry['trace_id'] is None
+
+
+def test_noisy_events_are_sampled(monkeypatch):
+    sampling = SamplingFilter()
+    monkeypatch.setattr(sampling, 'rates', {'noisy': 0.0})
+    noisy = logging.LogRecord('x', logging.INFO, __file__, 1, 'noisy', None, None)
+    failed = logging.LogRecord('x', logging.ERROR, __file__, 1, 'noisy', None, None)
+    other = logging.LogRecord('x', logging.INFO, __file__, 1, 'other', None, None)
+    assert not sampling.filter(noisy)
+    assert sampling.filter(failed)
+    assert sampling.filter(other)
@@ -0,0 +1,35 @@
+import httpx
+import pytest
+from fastapi import HTTPException
+from prometheus_client import REGISTRY
+
+from core.config import PREFIX
+from utils.token_manager import _verify_token
+
+
+def verifications(outcome: str) -> float:
+    return REGISTRY.get_sample_value('auth_token_verifications_total', {'type': 'access', 'outcome': outcome}) or 0
+
+
+@pytest.mark.parametrize('token, outcome', [(None, 'missing'), ('not-a-jwt', 'invalid')])
+@pytest.mark.asyncio
+async def test_token_verification_outcome_is_counted(token, outcome: str):
+    before = verifications(outcome)
+    with pytest.raises(HTTPException):
+        await _verify_token(token, None, 'access')
+    assert verifications(outcome) == before + 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_exposes_route_latency():
+    from main import app
+
+    async with httpx.AsyncClient(app=app, base_url='http://unit') as client:
+        await client.get(f'{PREFIX}/homepage')
+        response = await client.get('/metrics')
+    assert response.status_code == 200
+    assert f'auth_http_request_duration_seconds_bucket{{app_name="auth",le="0.25",method="GET",' \
+           f'path="{PREFIX}/homepage",status_code="200"}}' in response.text
+    assert 'auth_http_requests_in_progress' in response.text
+    # служебные пути в метрики запросов не попадают
+    assert 'path="/metrics"' not in response.text
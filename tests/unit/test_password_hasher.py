@@ -0,0 +1,135 @@
+from contextlib import asynccontextmanager
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import exc
+
+from db.models import User
+from services import auth
+from services.auth import AuthService
+from unit.fixtures import CountingSession
+from utils import password_hasher
+from utils.password_hasher import Argon2Hasher, BcryptHasher, HashPolicy, calibrate_argon2, calibrate_bcrypt
+
+PASSWORD = 'secret-password'
+
+# минимальная стоимость, чтобы тесты не тратили время на хеширование
+bcrypt_hasher = BcryptHasher(4)
+argon2_hasher = Argon2Hasher(time_cost=1, memory_cost=8, parallelism=1)
+BCRYPT_HASH = bcrypt_hasher.hash(PASSWORD)
+ARGON2_HASH = argon2_hasher.hash(PASSWORD)
+
+
+@pytest.mark.parametrize('current, legacy', [(bcrypt_hasher, argon2_hasher), (argon2_hasher, bcrypt_hasher)])
+def test_verify_accepts_current_and_legacy_schemes(current, legacy):
+    policy = HashPolicy(current, [legacy])
+    assert policy.verify(PASSWORD, BCRYPT_HASH)
+    assert policy.verify(PASSWORD, ARGON2_HASH)
+    assert not policy.verify('wrong', BCRYPT_HASH)
+    assert not policy.verify('wrong', ARGON2_HASH)
+
+
+@pytest.mark.parametrize('pwd_hash', ['$1$salt$digest', 'plain-text', ''])
+def test_unknown_scheme_is_not_verified(pwd_hash: str):
+    assert not HashPolicy(bcrypt_hasher, [argon2_hasher]).verify(PASSWORD, pwd_hash)
+
+
+def test_identify():
+    assert bcrypt_hasher.identify(BCRYPT_HASH) and not bcrypt_hasher.identify(ARGON2_HASH)
+    assert argon2_hasher.identify(ARGON2_HASH) and not argon2_hasher.identify(BCRYPT_HASH)
+
+
+@pytest.mark.parametrize(
+    'current, pwd_hash, expected',
+    [
+        (bcrypt_hasher, ARGON2_HASH, True),  # устаревшая схема
+        (argon2_hasher, BCRYPT_HASH, True),
+        (BcryptHasher(5), BCRYPT_HASH, True),  # устаревшая стоимость
+        (bcrypt_hasher, BCRYPT_HASH, False),
+        (Argon2Hasher(time_cost=2, memory_cost=8, parallelism=1), ARGON2_HASH, True),
+        (Argon2Hasher(time_cost=1, memory_cost=16, parallelism=1), ARGON2_HASH, True),
+        (argon2_hasher, ARGON2_HASH, False),
+    ]
+)
+def test_needs_rehash(current, pwd_hash: str, expected: bool):
+    assert HashPolicy(current, [bcrypt_hasher, argon2_hasher]).needs_rehash(pwd_hash) is expected
+
+
+@pytest.mark.parametrize(
+    'current, pwd_hash',
+    [
+        (BcryptHasher(4), BcryptHasher(5).hash(PASSWORD)),
+        (argon2_hasher, Argon2Hasher(time_cost=2, memory_cost=16, parallelism=2).hash(PASSWORD)),
+    ]
+)
+def test_stronger_hash_is_not_downgraded(current, pwd_hash: str):
+    assert not HashPolicy(current, []).needs_rehash(pwd_hash)
+
+
+@pytest.mark.parametrize(
+    'pwd_hash, cost',
+    [
+        (BCRYPT_HASH, '$2b$04'),
+        (ARGON2_HASH, '$argon2id$v=19$m=8,t=1,p=1'),
+        ('plain-text', 'unknown'),
+    ]
+)
+def test_cost(pwd_hash: str, cost: str):
+    assert HashPolicy.cost(pwd_hash) == cost
+
+
+@pytest.mark.parametrize(
+    'measured_ms, target_ms, min_rounds, rounds',
+    [
+        (10, 250, 10, 14),  # 10 -> 20 -> 40 -> 80 -> 160 мс
+        (10, 1, 10, 10),  # не ниже BCRYPT_MIN_ROUNDS
+        (0.001, 250, 10, 16),  # не выше BCRYPT_MAX_ROUNDS
+        (500, 250, 12, 12),  # медленный старт не понижает настроенную стоимость
+        (10, 250, 4, 14),
+    ]
+)
+def test_calibrate_bcrypt_bounds(monkeypatch, measured_ms: float, target_ms: int, min_rounds: int, rounds: int):
+    monkeypatch.setattr(password_hasher, '_measure_ms', lambda hasher: measured_ms)
+    assert calibrate_bcrypt(target_ms, min_rounds).rounds == rounds
+
+
+@pytest.mark.parametrize('min_time_cost, time_cost', [(1, 2), (3, 3)])
+def test_calibrate_argon2_bounds(monkeypatch, min_time_cost: int, time_cost: int):
+    monkeypatch.setattr(password_hasher, '_measure_ms', lambda hasher: hasher.time_cost * 100)
+    assert calibrate_argon2(250, 8, 1, min_time_cost).time_cost == time_cost
+
+
+def test_policy_calibration_keeps_configured_cost(monkeypatch):
+    monkeypatch.setattr(password_hasher, '_measure_ms', lambda hasher: 1000)
+    policy = HashPolicy(BcryptHasher(12), [])
+    policy.calibrate(250)
+    assert policy.current.rounds == 12
+
+
+class RehashSession(CountingSession):
+    def __init__(self, fail: bool) -> None:
+        super().__init__()
+        self.fail = fail
+        self.savepoints = 0
+
+    @asynccontextmanager
+    async def begin_nested(self):
+        self.savepoints += 1
+        yield
+
+    async def execute(self, statement, *args, **kwargs):
+        if self.fail:
+            raise exc.OperationalError(str(statement), {}, Exception('lock timeout'))
+        return await super().execute(statement, *args, **kwargs)
+
+
+@pytest.mark.parametrize('fail', [False, True])
+@pytest.mark.asyncio
+async def test_rehash_failure_does_not_break_login(monkeypatch, fail: bool):
+    """Ошибка UPDATE хеша откатывает только точку сохранения, вход продолжается"""
+    monkeypatch.setattr(auth, 'hash_policy', HashPolicy(bcrypt_hasher, [argon2_hasher]))
+    session = RehashSession(fail)
+    user = User(uuid=uuid4(), login='unit', password=ARGON2_HASH)
+    await AuthService(None, None, session)._rehash_if_needed(user, PASSWORD)
+    assert session.savepoints == 1
+    assert len(session.statements) == (0 if fail else 1)
@@ -0,0 +1,87 @@
+from types import SimpleNamespace
+from typing import Optional
+
+import pytest
+from fastapi import Request
+
+from core.config import rate_limit_settings
+from models.limit import LimitAlgorithm, RateLimitPolicy, RateLimitResult
+from utils import limits
+from utils.limits import LocalPreLimiter, _client_ip
+
+
+def request(forwarded_for: Optional[str] = None, client: str = '10.0.0.2') -> Request:
+    headers = [(b'x-forwarded-for', forwarded_for.encode())] if forwarded_for else []
+    return Request({'type': 'http', 'headers': headers, 'client': (client, 50000)})
+
+
+@pytest.mark.parametrize(
+    'trusted_proxies, forwarded_for, ip',
+    [
+        (0, '1.1.1.1', '10.0.0.2'),  # без прокси заголовок присылает сам клиент
+        (1, '203.0.113.7', '203.0.113.7'),
+        (1, '1.1.1.1, 203.0.113.7', '203.0.113.7'),  # левый адрес подделан клиентом
+        (2, '1.1.1.1, 203.0.113.7, 10.0.0.1', '203.0.113.7'),
+        (2, '203.0.113.7', '10.0.0.2'),  # адресов меньше, чем прокси
+        (1, None, '10.0.0.2'),
+    ]
+)
+def test_client_ip_is_taken_from_trusted_hop(monkeypatch, trusted_proxies: int, forwarded_for: str, ip: str):
+    monkeypatch.setattr(rate_limit_settings, 'trusted_proxies', trusted_proxies)
+    assert _client_ip(request(forwarded_for)) == ip
+
+
+@pytest.fixture
+def clock(monkeypatch) -> SimpleNamespace:
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(limits, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def allowed(policy: RateLimitPolicy) -> RateLimitResult:
+    return RateLimitResult(allowed=True, limit=policy.limit, remaining=0, reset=0)
+
+
+def test_pre_limiter_denies_after_local_tokens_are_spent(clock):
+    policy, limiter = RateLimitPolicy(limit=2, window=60), LocalPreLimiter(max_keys=10)
+    for _ in range(2):
+        assert limiter.check('key', policy) is None
+        limiter.record('key', policy, allowed(policy))
+    denied = limiter.check('key', policy)
+    assert (denied.allowed, denied.retry_after) == (False, 30)
+
+    clock.now += 30
+    assert limiter.check('key', policy) is None
+
+
+def test_pre_limiter_blocks_until_redis_retry_after(clock):
+    """После отказа Redis ключ отклоняется локально, пока не истечет Retry-After"""
+    policy, limiter = RateLimitPolicy(limit=100, window=60), LocalPreLimiter(max_keys=10)
+    limiter.record('key', policy, RateLimitResult(allowed=False, limit=100, remaining=0, reset=5, retry_after=5))
+    clock.now += 2
+    assert limiter.check('key', policy).retry_after == 3
+    assert limiter.check('other', policy) is None
+    clock.now += 3
+    assert limiter.check('key', policy) is None
+
+
+def test_pre_limiter_sliding_window(clock):
+    policy = RateLimitPolicy(algorithm=LimitAlgorithm.sliding_window, limit=2, window=10)
+    limiter = LocalPreLimiter(max_keys=10)
+    limiter.record('key', policy, allowed(policy))
+    clock.now += 4
+    limiter.record('key', policy, allowed(policy))
+    clock.now += 1
+    assert limiter.check('key', policy).retry_after == 5
+    clock.now += 5
+    # первый запрос вышел из окна
+    assert limiter.check('key', policy) is None
+
+
+def test_pre_limiter_evicts_least_recently_used_keys(clock):
+    policy, limiter = RateLimitPolicy(limit=2, window=60), LocalPreLimiter(max_keys=2)
+    limiter.check('a', policy)
+    limiter.check('b', policy)
+    limiter.check('a', policy)
+    limiter.check('c', policy)
+    assert list(limiter._states) == ['a', 'c']
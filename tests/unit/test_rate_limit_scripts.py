@@ -0,0 +1,129 @@
+from typing import Any, Dict, List
+
+import pytest
+from fastapi import Request
+
+from models.limit import LimitAlgorithm, RateLimitPolicy
+from utils import limits
+
+lupa = pytest.importorskip('lupa')
+
+
+class LuaRedis:
+    """
+    Runs the limiter scripts in an embedded Lua with redis.call over in-memory
+    hashes and sorted sets. Время (TIME) задается тестом.
+    """
+
+    def __init__(self) -> None:
+        self.now_ms = 1_700_000_000_000
+        self.hashes: Dict[str, Dict[str, str]] = {}
+        self.zsets: Dict[str, Dict[str, float]] = {}
+        self.ttls: Dict[str, int] = {}
+        self.lua = lupa.LuaRuntime()
+        self.lua.globals().redis = self.lua.table_from({'call': self.call})
+
+    def call(self, command: str, key: str = None, *args) -> Any:
+        command = command.upper()
+        if command == 'TIME':
+            return self.lua.table_from([str(self.now_ms // 1000), str(self.now_ms % 1000 * 1000)])
+        if command == 'HMGET':
+            fields = self.hashes.get(key, {})
+            # отсутствующее поле redis отдает в Lua как false
+            return self.lua.table_from([fields.get(name, False) for name in args])
+        if command == 'HSET':
+            fields = self.hashes.setdefault(key, {})
+            for name, value in zip(args[::2], args[1::2]):
+                fields[name] = str(value)
+            return len(args) // 2
+        if command == 'PEXPIRE':
+            self.ttls[key] = int(args[0])
+            return 1
+        zset = self.zsets.setdefault(key, {})
+        if command == 'ZREMRANGEBYSCORE':
+            low, high = float(args[0]), float(args[1])
+            removed = [member for member, score in zset.items() if low <= score <= high]
+            for member in removed:
+                del zset[member]
+            return len(removed)
+        if command == 'ZCARD':
+            return len(zset)
+        if command == 'ZADD':
+            zset[args[1]] = float(args[0])
+            return 1
+        if command == 'ZRANGE':
+            start, stop = int(args[0]), int(args[1])
+            members = sorted(zset.items(), key=lambda item: item[1])[start:stop + 1]
+            return self.lua.table_from([value for member, score in members for value in (member, str(int(score)))])
+        raise NotImplementedError(command)
+
+    def eval(self, script: str, keys: List[str], args: List[Any]) -> List[int]:
+        self.lua.globals().KEYS = self.lua.table_from(keys)
+        self.lua.globals().ARGV = self.lua.table_from([str(arg) for arg in args])
+        result = self.lua.execute(script)
+        # числа Lua redis отдает целыми, отбрасывая дробную часть
+        return [int(result[index]) for index in range(1, len(result) + 1)]
+
+    def register_script(self, script: str):
+        async def run(keys: List[str], args: List[Any], client: 'LuaRedis') -> List[int]:
+            return client.eval(script, keys, args)
+
+        return run
+
+
+@pytest.fixture
+def lua_redis(monkeypatch) -> LuaRedis:
+    redis = LuaRedis()
+    monkeypatch.setattr(limits, 'get_redis', lambda: redis)
+    monkeypatch.setattr(limits, '_registered', {})
+    monkeypatch.setattr(limits.rate_limit_settings, 'local_enabled', False)
+    return redis
+
+
+def test_token_bucket_spends_and_refills(lua_redis):
+    # 3 запроса в минуту: токен восстанавливается за 20 с
+    args = [3, 3 / 60_000]
+    results = [lua_redis.eval(limits.TOKEN_BUCKET_LUA, ['bucket'], args) for _ in range(4)]
+    assert results[:3] == [[1, 2, 0, 20_000], [1, 1, 0, 40_000], [1, 0, 0, 60_000]]
+    assert results[3] == [0, 0, 20_000, 60_000]
+    assert lua_redis.ttls['bucket'] == 60_000
+
+    lua_redis.now_ms += 10_000
+    assert lua_redis.eval(limits.TOKEN_BUCKET_LUA, ['bucket'], args)[:3] == [0, 0, 10_000]
+    lua_redis.now_ms += 10_000
+    assert lua_redis.eval(limits.TOKEN_BUCKET_LUA, ['bucket'], args)[:2] == [1, 0]
+
+
+def test_token_bucket_never_exceeds_capacity(lua_redis):
+    args = [2, 2 / 1_000]
+    lua_redis.eval(limits.TOKEN_BUCKET_LUA, ['bucket'], args)
+    lua_redis.now_ms += 3_600_000
+    assert lua_redis.eval(limits.TOKEN_BUCKET_LUA, ['bucket'], args)[:2] == [1, 1]
+
+
+def test_sliding_window_counts_requests_in_window(lua_redis):
+    allowed = [lua_redis.eval(limits.SLIDING_WINDOW_LUA, ['log'], [2, 1_000, f'req-{n}']) for n in range(2)]
+    assert allowed == [[1, 1, 0, 1_000], [1, 0, 0, 1_000]]
+
+    lua_redis.now_ms += 400
+    # отказ не попадает в журнал
+    assert lua_redis.eval(limits.SLIDING_WINDOW_LUA, ['log'], [2, 1_000, 'req-2']) == [0, 0, 600, 600]
+    assert len(lua_redis.zsets['log']) == 2
+
+    lua_redis.now_ms += 600
+    assert lua_redis.eval(limits.SLIDING_WINDOW_LUA, ['log'], [2, 1_000, 'req-3'])[:2] == [1, 1]
+    assert set(lua_redis.zsets['log']) == {'req-3'}
+    assert lua_redis.ttls['log'] == 1_000
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('algorithm', list(LimitAlgorithm))
+async def test_check_limit_runs_the_script(lua_redis, monkeypatch, algorithm: LimitAlgorithm):
+    policy = RateLimitPolicy(algorithm=algorithm, limit=2, window=60)
+    monkeypatch.setattr(limits, 'get_policy', lambda path: ('default', policy))
+    request = Request({'type': 'http', 'path': '/api/v1/auth/login', 'headers': [], 'client': ('10.0.0.2', 50000)})
+
+    results = [await limits.check_limit(request) for _ in range(3)]
+    assert [(result.allowed, result.remaining) for result in results] == [(True, 1), (True, 0), (False, 0)]
+    assert 0 < results[2].retry_after <= 60
+    assert results[2].headers()['Retry-After'] == str(results[2].retry_after)
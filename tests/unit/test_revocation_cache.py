@@ -0,0 +1,105 @@
+import asyncio
+import os
+
+import pytest
+
+from db.revocation_cache import REVOKED_CHANNEL, REVOKED_KEY_PREFIX, REVOKED_USERS_CHANNEL, BloomFilter, \
+    RevocationCache, token_digest
+
+
+def new_cache() -> RevocationCache:
+    return RevocationCache(capacity=1000, error_rate=0.01, negative_ttl=60, negative_size=10, rebuild_interval=300)
+
+
+async def wait_for(condition, timeout: float = 1.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, 'condition not reached'
+        await asyncio.sleep(0.001)
+
+
+def test_bloom_filter_sizing():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    # m = -n ln p / ln^2 2, k = m / n ln 2
+    assert bloom.size == 9586
+    assert bloom.hash_count == 7
+
+
+def test_bloom_filter_false_positive_rate():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    added = [os.urandom(16) for _ in range(1000)]
+    for digest in added:
+        bloom.add(digest)
+    assert all(digest in bloom for digest in added)
+    false_positives = sum(os.urandom(16) in bloom for _ in range(20_000))
+    assert false_positives / 20_000 < 0.02
+
+
+def test_fallback_without_subscription():
+    """Пока подписки нет, без Redis отвечает только короткий кеш проверенных токенов"""
+    cache, digest = new_cache(), token_digest('token')
+    assert not cache.is_known_valid(digest)
+    cache.remember_valid(digest)
+    assert cache.is_known_valid(digest)
+    cache.mark_revoked(digest)
+    assert not cache.is_known_valid(digest)
+
+
+@pytest.mark.asyncio
+async def test_subscription_loads_and_follows_revocations(fake_redis):
+    revoked, fresh = token_digest('revoked'), token_digest('fresh')
+    await fake_redis.set(REVOKED_KEY_PREFIX.encode('utf-8') + revoked, b'')
+    await fake_redis.set('revoked_before:user-1', 100.5)
+    cache = new_cache()
+    cache.start(fake_redis)
+    try:
+        await wait_for(lambda: cache.live)
+        assert not cache.is_known_valid(revoked)
+        assert cache.is_known_valid(fresh)
+        assert cache.user_revoked_before('user-1') == 100.5
+
+        await fake_redis.publish(REVOKED_CHANNEL, fresh)
+        await fake_redis.publish(REVOKED_USERS_CHANNEL, 'user-2:200.25')
+        await wait_for(lambda: not cache.is_known_valid(fresh))
+        await wait_for(lambda: cache.user_revoked_before('user-2') == 200.25)
+    finally:
+        await cache.stop()
+    assert not cache.live
+    assert fake_redis.pubsubs == []
+
+
+@pytest.mark.asyncio
+async def test_malformed_message_does_not_stop_the_subscription(fake_redis):
+    cache, digest = new_cache(), token_digest('token')
+    cache.start(fake_redis)
+    try:
+        await wait_for(lambda: cache.live)
+        await fake_redis.publish(REVOKED_USERS_CHANNEL, 'no-timestamp')
+        await fake_redis.publish(REVOKED_CHANNEL, digest)
+        await wait_for(lambda: not cache.is_known_valid(digest))
+        assert cache.live
+    finally:
+        await cache.stop()
+
+
+@pytest.mark.asyncio
+async def test_any_failure_resubscribes_with_backoff(fake_redis, monkeypatch):
+    cache, attempts = new_cache(), []
+    cache.RETRY_MIN = 0.001
+    listen = cache._listen
+
+    async def failing_listen():
+        attempts.append(asyncio.get_running_loop().time())
+        if len(attempts) < 3:
+            raise OSError('connection reset by peer')
+        await listen()
+
+    monkeypatch.setattr(cache, '_listen', failing_listen)
+    cache.start(fake_redis)
+    try:
+        await wait_for(lambda: cache.live)
+    finally:
+        await cache.stop()
+    assert len(attempts) == 3
+    # пауза удваивается
+    assert attempts[2] - attempts[1] >= 2 * cache.RETRY_MIN
@@ -0,0 +1,95 @@
+from uuid import uuid4
+
+import pytest
+
+from db.role_cache import RoleCache
+
+USER_ID = str(uuid4())
+ROLE_IDS = [str(uuid4()), str(uuid4())]
+
+
+def new_cache() -> RoleCache:
+    return RoleCache(enabled=True, local_ttl=60, local_size=100, redis_ttl=60, version_ttl=0)
+
+
+class Loader:
+    def __init__(self, value) -> None:
+        self.value = value
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+@pytest.mark.asyncio
+async def test_local_tier_hit(fake_redis):
+    cache, loader = new_cache(), Loader(ROLE_IDS)
+    assert await cache.get_user_role_ids(USER_ID, loader) == ROLE_IDS
+    assert await cache.get_user_role_ids(USER_ID, loader) == ROLE_IDS
+    assert loader.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_tier_is_shared_between_workers(fake_redis):
+    loader = Loader(ROLE_IDS)
+    await new_cache().get_user_role_ids(USER_ID, loader)
+    assert await new_cache().get_user_role_ids(USER_ID, loader) == ROLE_IDS
+    assert loader.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_invalidate_reaches_other_workers(fake_redis):
+    """Изменение ролей в одном воркере увеличивает версию, другой перечитывает роли из БД"""
+    worker, other = new_cache(), new_cache()
+    loader = Loader(ROLE_IDS)
+    await worker.get_user_role_ids(USER_ID, loader)
+    await other.get_user_role_ids(USER_ID, loader)
+    await worker.invalidate_user(USER_ID)
+    loader.value = ROLE_IDS[:1]
+    assert await other.get_user_role_ids(USER_ID, loader) == ROLE_IDS[:1]
+    assert loader.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidate_user_keeps_other_users_cached(fake_redis):
+    """Назначение роли одному пользователю не сбрасывает кеш остальных и справочник"""
+    cache, other_user = new_cache(), str(uuid4())
+    loader, other_loader, catalogue_loader = Loader(ROLE_IDS), Loader(ROLE_IDS[:1]), Loader({ROLE_IDS[0]: 'name'})
+    await cache.get_user_role_ids(USER_ID, loader)
+    await cache.get_user_role_ids(other_user, other_loader)
+    await cache.get_catalogue(catalogue_loader)
+    await new_cache().invalidate_user(USER_ID)
+
+    await cache.get_user_role_ids(USER_ID, loader)
+    await cache.get_user_role_ids(other_user, other_loader)
+    await cache.get_catalogue(catalogue_loader)
+    assert (loader.calls, other_loader.calls, catalogue_loader.calls) == (2, 1, 1)
+
+
+@pytest.mark.asyncio
+async def test_catalogue_change_invalidates_users(fake_redis):
+    """Удаленная роль не должна остаться в ролях пользователя"""
+    cache, loader = new_cache(), Loader(ROLE_IDS)
+    await cache.get_user_role_ids(USER_ID, loader)
+    await new_cache().invalidate()
+    loader.value = ROLE_IDS[1:]
+    assert await cache.get_user_role_ids(USER_ID, loader) == ROLE_IDS[1:]
+    assert loader.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_missing_user_is_not_cached(fake_redis):
+    cache, loader = new_cache(), Loader(None)
+    assert await cache.get_user_role_ids(USER_ID, loader) is None
+    assert await cache.get_user_role_ids(USER_ID, loader) is None
+    assert loader.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_catalogue_cached(fake_redis):
+    catalogue = {role_id: 'name' for role_id in ROLE_IDS}
+    cache, loader = new_cache(), Loader(catalogue)
+    await cache.get_catalogue(loader)
+    assert await cache.get_catalogue(loader) == catalogue
+    assert loader.calls == 1
@@ -0,0 +1,68 @@
+from http import HTTPStatus
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+
+from db.models import Role
+from services.role import RoleService
+
+ROLE = Role(uuid=uuid4(), name='premium')
+USER_ID = uuid4()
+
+pytestmark = pytest.mark.usefixtures('fake_redis')
+
+
+@pytest.mark.parametrize(
+    'method, args, rows',
+    [
+        ('create_role', ('premium',), [(ROLE,)]),
+        ('read_role', (ROLE.uuid,), [(ROLE,)]),
+        ('read_roles', (), [(ROLE,)]),
+        ('update_role', (ROLE.uuid, 'premium'), [(ROLE,)]),
+        ('delete_role', (ROLE.uuid,), [(ROLE.uuid,)]),
+        ('get_user_access_area', (USER_ID,), [(USER_ID, ROLE)]),
+        ('set_role_to_user', (USER_ID, ROLE.uuid), [(True, True, True)]),
+        ('remove_role_from_user', (USER_ID, ROLE.uuid), [(True, True, True)]),
+    ]
+)
+@pytest.mark.asyncio
+async def test_role_endpoint_is_one_statement(counting_session, method: str, args: tuple, rows: list):
+    """Каждая операция сервиса ролей - один запрос к БД"""
+    session = counting_session(rows)
+    await getattr(RoleService(session), method)(*args)
+    assert len(session.statements) == 1
+
+
+@pytest.mark.parametrize(
+    'method, args, rows, detail',
+    [
+        ('create_role', ('premium',), [], 'Role already exist'),
+        ('read_role', (ROLE.uuid,), [], 'Role does not exist'),
+        ('update_role', (ROLE.uuid, 'premium'), [], 'Role does not exist'),
+        ('delete_role', (ROLE.uuid,), [], 'Role does not exist'),
+        ('get_user_access_area', (USER_ID,), [], 'User does not exist'),
+        ('set_role_to_user', (USER_ID, ROLE.uuid), [(False, True, False)], 'User does not exist'),
+        ('set_role_to_user', (USER_ID, ROLE.uuid), [(True, False, False)], 'Role does not exist'),
+        ('remove_role_from_user', (USER_ID, ROLE.uuid), [(False, True, False)], 'User does not exist'),
+        ('remove_role_from_user', (USER_ID, ROLE.uuid), [(True, False, False)], 'Role does not exist'),
+    ]
+)
+@pytest.mark.asyncio
+async def test_role_errors_are_one_statement(counting_session, method: str, args: tuple, rows: list, detail: str):
+    """Проверка существования не требует отдельных запросов, ошибка откатывает транзакцию"""
+    session = counting_session(rows)
+    with pytest.raises(HTTPException) as err:
+        await getattr(RoleService(session), method)(*args)
+    assert err.value.detail == detail
+    assert err.value.status_code in (HTTPStatus.BAD_REQUEST, HTTPStatus.NOT_FOUND)
+    assert len(session.statements) == 1
+    assert session.commits == 0
+
+
+@pytest.mark.asyncio
+async def test_user_without_roles(counting_session):
+    """Пользователь без ролей - строка с NULL вместо роли"""
+    session = counting_session([(USER_ID, None)])
+    assert await RoleService(session).get_user_access_area(USER_ID) == []
+    assert len(session.statements) == 1
@@ -0,0 +1,78 @@
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.trace import StatusCode
+
+from core import tracer as tracer_module
+from core.tracer import traced
+from crud.role import RoleDAL
+from db.models import Role
+from utils.password_hasher import HashPolicy
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    """Spans of core.tracer.tracer go to memory"""
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(tracer_module, 'tracer', provider.get_tracer(__name__))
+    return exporter
+
+
+@pytest.mark.asyncio
+async def test_dal_call_is_child_span(exporter, counting_session):
+    role = Role(uuid=uuid4(), name='premium')
+    session = counting_session([(role,)])
+
+    @traced('request')
+    async def request():
+        return await RoleDAL(session).get_by_user_id(uuid4())
+
+    await request()
+    dal_span, request_span = exporter.get_finished_spans()
+    assert dal_span.name == 'RoleDAL.get_by_user_id'
+    assert dal_span.parent.span_id == request_span.context.span_id
+    assert dal_span.attributes['db.system'] == 'postgresql'
+
+
+@pytest.mark.asyncio
+async def test_client_error_is_not_span_error(exporter):
+    @traced()
+    async def login():
+        raise HTTPException(status_code=403, detail='Incorrect login or password')
+
+    with pytest.raises(HTTPException):
+        await login()
+    span, = exporter.get_finished_spans()
+    assert span.attributes['http.status_code'] == 403
+    assert span.status.status_code is StatusCode.UNSET
+
+
+@pytest.mark.asyncio
+async def test_failure_is_span_error(exporter):
+    @traced(attributes={'db.system': 'redis'})
+    async def put():
+        raise ConnectionError('redis is down')
+
+    with pytest.raises(ConnectionError):
+        await put()
+    span, = exporter.get_finished_spans()
+    assert span.status.status_code is StatusCode.ERROR
+    assert span.events[0].name == 'exception'
+
+
+@pytest.mark.parametrize(
+    'pwd_hash, cost',
+    [
+        ('$2b$12$' + 'a' * 53, '$2b$12'),
+        ('$argon2id$v=19$m=65536,t=3,p=4$c2FsdA$ZGlnZXN0', '$argon2id$v=19$m=65536,t=3,p=4'),
+        ('plain', 'unknown'),
+    ]
+)
+def test_hash_cost(pwd_hash: str, cost: str):
+    assert HashPolicy.cost(pwd_hash) == cost
@@ -0,0 +1,92 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from db.token import TokenDB
+from db.uow import UnitOfWork
+from models.token import AccessTokenPayload, ms_timestamp
+from services.auth import AuthService
+from utils.token_manager import TokenManager, _verify_token
+
+USER_ID = str(uuid4())
+PAYLOAD = {'sub': USER_ID, 'login': 'unit', 'role': []}
+
+
+def payload(iat: datetime) -> AccessTokenPayload:
+    return AccessTokenPayload(**PAYLOAD, exp=iat + timedelta(minutes=5), iat=iat)
+
+
+def test_watermark_is_strict_and_sub_second():
+    revoked_at = datetime(2023, 10, 17, 12, 0, 0, 500_000, tzinfo=timezone.utc)
+    watermark = ms_timestamp(revoked_at)
+    assert payload(revoked_at - timedelta(milliseconds=1)).is_issued_before(watermark)
+    assert not payload(revoked_at).is_issued_before(watermark)
+    # в ту же секунду, но после отзыва
+    assert not payload(revoked_at + timedelta(milliseconds=1)).is_issued_before(watermark)
+
+
+@pytest.mark.asyncio
+async def test_iat_keeps_milliseconds():
+    token = await TokenManager(None).generate_access_token(PAYLOAD)
+    claims = jwt.get_unverified_claims(token)
+    assert isinstance(claims['iat'], float)
+
+
+@pytest.mark.asyncio
+async def test_login_right_after_logout_all_is_valid(fake_redis):
+    """Токен, выпущенный в ту же секунду после logout_all, не отозван"""
+    token_db, token_manager = TokenDB(fake_redis), TokenManager(None)
+    old_token = await token_manager.generate_access_token(PAYLOAD)
+    await asyncio.sleep(0.002)  # отзыв различает токены с точностью до мс
+    await token_db.revoke_user_before(USER_ID, datetime.now(timezone.utc), 60)
+    new_token = await token_manager.generate_access_token(PAYLOAD)
+
+    assert await _verify_token(new_token, token_db, 'access') == new_token
+    with pytest.raises(HTTPException) as error:
+        await _verify_token(old_token, token_db, 'access')
+    assert error.value.status_code == 401
+
+
+class RecordingTokenDB:
+    def __init__(self, session) -> None:
+        self.session = session
+        self.revoked_after_commits = []
+
+    async def revoke_user_before(self, user_id: str, issued_before: datetime, expire_in_sec: int) -> None:
+        self.revoked_after_commits.append(self.session.commits)
+
+
+@pytest.mark.asyncio
+async def test_logout_all_writes_watermark_after_commit(counting_session):
+    session = counting_session([], [])
+    token_db = RecordingTokenDB(session)
+    token = await TokenManager(None).generate_access_token(PAYLOAD)
+    service = AuthService(token_db, TokenManager(None), session)
+
+    async with service.uow:
+        await service.logout_all(token)
+        # вложенный блок: до внешнего commit отметки нет
+        assert token_db.revoked_after_commits == []
+    assert token_db.revoked_after_commits == [1]
+
+
+@pytest.mark.asyncio
+async def test_rollback_drops_after_commit_callbacks(counting_session):
+    session = counting_session()
+    uow, called = UnitOfWork(session), []
+
+    async def callback():
+        called.append(True)
+
+    with pytest.raises(RuntimeError):
+        async with uow:
+            uow.after_commit(callback)
+            raise RuntimeError
+    assert (called, session.rollbacks) == ([], 1)
+    async with uow:
+        pass
+    assert called == []
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+from opentelemetry.sdk.trace.sampling import Decision, ParentBased, StaticSampler
+from opentelemetry.trace import Status, StatusCode
+
+from core.tracer import RecordingRatioSampler, TailSamplingProcessor
+
+
+@pytest.fixture
+def traced():
+    """Tracer that samples no traces by ratio, the exporter sees only what tail sampling keeps"""
+    exporter = InMemorySpanExporter()
+    sampler = ParentBased(RecordingRatioSampler(0.0), local_parent_not_sampled=StaticSampler(Decision.RECORD_ONLY))
+    provider = TracerProvider(sampler=sampler)
+    provider.add_span_processor(TailSamplingProcessor(SimpleSpanProcessor(exporter), slow_ms=50, max_traces=10))
+    return provider.get_tracer(__name__), exporter
+
+
+def test_fast_trace_is_dropped(traced):
+    tracer, exporter = traced
+    with tracer.start_as_current_span('request'):
+        with tracer.start_as_current_span('db'):
+            pass
+    assert exporter.get_finished_spans() == ()
+
+
+def test_slow_trace_is_kept_whole(traced):
+    tracer, exporter = traced
+    with tracer.start_as_current_span('request'):
+        with tracer.start_as_current_span('db'):
+            time.sleep(0.06)
+    spans = exporter.get_finished_spans()
+    assert [span.name for span in spans] == ['db', 'request']
+    assert all(span.context.trace_flags.sampled for span in spans)
+
+
+def test_failed_trace_is_kept(traced):
+    tracer, exporter = traced
+    with tracer.start_as_current_span('request'):
+        with tracer.start_as_current_span('db') as span:
+            span.set_status(Status(StatusCode.ERROR))
+    assert len(exporter.get_finished_spans()) == 2
+
+
+def test_sampled_trace_is_exported_as_is():
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider(sampler=ParentBased(RecordingRatioSampler(1.0)))
+    provider.add_span_processor(TailSamplingProcessor(SimpleSpanProcessor(exporter), slow_ms=50, max_traces=10))
+    with provider.get_tracer(__name__).start_as_current_span('request'):
+        pass
+    assert len(exporter.get_finished_spans()) == 1